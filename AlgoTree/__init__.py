@@ -1,10 +1,20 @@
 from .flattree import FlatTree
 from .flattree_node import FlatTreeNode
+from .compact_flattree import CompactFlatTree, CompactFlatTreeNode
+from .mmap_flattree import MmapFlatTree, MmapFlatTreeNode
+from .sqlite_flattree import SqliteFlatTree
 from .tree_converter import TreeConverter
 from .treenode_api import TreeNodeApi
 from .pretty_tree import PrettyTree, pretty_tree
 from .treenode import TreeNode
+from .tree_index import IntervalIndex, AncestorIndex
+from .columnar import ColumnStore
+from .tree_loader import load_ndjson, load_mapping
+from .journal import Journal, Change
+from .payload_view import PayloadView
+from .key_allocator import KeyAllocator, UuidKeys, CounterKeys, PrefixKeys
 from .utils import(
     map, visit, descendants, ancestors, siblings, leaves, height, depth,
     is_root, is_leaf, is_internal, is_ancestor, is_descendant, is_sibling,
-    breadth_first, find_nodes, find_node, find_path, node_stats, size, prune, lca)
+    breadth_first, find_nodes, find_node, find_path, node_stats, size, prune, lca,
+    batch_lca)
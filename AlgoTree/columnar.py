@@ -0,0 +1,546 @@
+"""
+Columnar Payloads
+~~~~~~~~~~~~~~~~~
+
+This module provides a columnar store for payload fields that are shared by
+many nodes of a flat tree (`FlatTree`, `CompactFlatTree`, `SqliteFlatTree`),
+such as counts, scores or timestamps. Each field is stored in a typed array
+aligned to dense node ids, so filters like `score > 0.9` are evaluated over
+whole columns instead of calling a Python predicate on one node proxy at a
+time::
+
+    store = ColumnStore(tree, ["score", "count"])
+    hot = store.find_nodes(store["score"] > 0.9)
+    store.update("count", 0, where=(store["score"] < 0.1) & store.leaf_mask())
+
+If NumPy is installed, comparisons and updates are NumPy array operations
+over zero-copy views of the columns. Otherwise, they are evaluated with the
+standard library (`map`, `itertools.compress` and big-integer bitwise
+operations), which is slower than NumPy but still avoids creating a node
+proxy per node.
+"""
+
+import itertools
+import math
+import operator
+import weakref
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from AlgoTree.flattree import FlatTree
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_DTYPES = {"d": "float64", "q": "int64"}
+_NOT = bytes.maketrans(b"\x00\x01", b"\x01\x00")
+
+
+def _fmin(x: Any, y: Any) -> Any:
+    # like `np.fmin`: NaN (a missing value) is ignored unless both are NaN
+    if x != x:
+        return y
+    return x if y != y or x <= y else y
+
+
+def _fmax(x: Any, y: Any) -> Any:
+    # like `np.fmax`
+    if x != x:
+        return y
+    return x if y != y or x >= y else y
+
+
+class Mask:
+    """
+    A boolean mask over the node ids of a `ColumnStore`, as returned by
+    comparing a `Column` with a value. Masks can be combined with `&`, `|`
+    and `~`.
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: Any):
+        """
+        :param data: A NumPy boolean array, or a bytearray of 0s and 1s.
+        """
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def _bitwise(self, other: "Mask", op: Callable) -> "Mask":
+        if np is not None:
+            return Mask(op(self.data, other.data))
+        n = len(self.data)
+        x = op(int.from_bytes(self.data, "little"),
+               int.from_bytes(other.data, "little"))
+        return Mask(bytearray(x.to_bytes(n, "little")))
+
+    def __and__(self, other: "Mask") -> "Mask":
+        return self._bitwise(other, operator.and_)
+
+    def __or__(self, other: "Mask") -> "Mask":
+        return self._bitwise(other, operator.or_)
+
+    def __invert__(self) -> "Mask":
+        if np is not None:
+            return Mask(~self.data)
+        return Mask(bytearray(self.data.translate(_NOT)))
+
+    def indices(self) -> List[int]:
+        """
+        Get the ids selected by the mask.
+
+        :return: The list of selected ids, in increasing order.
+        """
+        if np is not None:
+            return np.flatnonzero(self.data).tolist()
+        return list(itertools.compress(range(len(self.data)), self.data))
+
+    def count(self) -> int:
+        """
+        Get the number of ids selected by the mask.
+        """
+        if np is not None:
+            return int(np.count_nonzero(self.data))
+        return self.data.count(1)
+
+
+class Column:
+    """
+    A payload field of a `ColumnStore`, stored in a typed array (`array`)
+    aligned to the node ids of the store. Comparing a column with a value,
+    or with another column, gives a `Mask`.
+    """
+
+    __slots__ = ("name", "data", "type")
+
+    def __init__(self, name: str, data: array, type: Callable):
+        """
+        :param name: The name of the payload field.
+        :param data: The values, indexed by node id.
+        :param type: The Python type of the values (`float`, `int` or `bool`).
+        """
+        self.name = name
+        self.data = data
+        self.type = type
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def values(self) -> Any:
+        """
+        Get the values of the column: a zero-copy NumPy view of the array if
+        NumPy is installed, otherwise the array itself.
+        """
+        if np is not None:
+            return np.frombuffer(self.data, dtype=_DTYPES[self.data.typecode])
+        return self.data
+
+    def _compare(self, other: Any, op: Callable) -> Mask:
+        if isinstance(other, Column):
+            other = other.values() if np is not None else other.data
+        if np is not None:
+            return Mask(op(self.values(), other))
+        if isinstance(other, (int, float)):
+            other = itertools.repeat(other)
+        return Mask(bytearray(map(op, self.data, other)))
+
+    def __lt__(self, other: Any) -> Mask:
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other: Any) -> Mask:
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other: Any) -> Mask:
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other: Any) -> Mask:
+        return self._compare(other, operator.ge)
+
+    def __eq__(self, other: Any) -> Mask:
+        return self._compare(other, operator.eq)
+
+    def __ne__(self, other: Any) -> Mask:
+        return self._compare(other, operator.ne)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Column(name={self.name!r}, type={self.type.__name__}, size={len(self)})"
+
+
+class ColumnStore:
+    """
+    A columnar store of payload fields of a flat tree.
+
+    The store assigns dense ids to the nodes of the tree (in the iteration
+    order of the tree) and copies the given payload fields into typed
+    arrays: float fields into `array('d')`, where nodes without the field
+    get NaN, and integer and boolean fields into `array('q')`, where every
+    node must have the field.
+
+    The tree remains the source of truth. `update` changes the columns and
+    writes the new values through to the payloads of the updated nodes. If
+    nodes are added, removed or re-parented, the store rebuilds itself on
+    the next access (it watches the version counter of the tree).
+
+    If the mutation journal of the tree is enabled (see
+    `FlatTree.enable_journal`), payload changes made outside of the store
+    are followed through it: a field set with `tree.node(key)[field] = x`,
+    or a node value replaced with `tree[key] = value`, updates the column in
+    place. Other payload changes are not seen, and the store is a snapshot
+    of them: node values modified in place (`tree[key][field] = x`), and any
+    payload change in trees without an enabled journal. In those cases,
+    call `refresh`.
+    """
+
+    def __init__(self, tree: Any,
+                 fields: Union[Iterable[str], Dict[str, Callable]]):
+        """
+        Build the store over the nodes of `tree`.
+
+        :param tree: The flat tree.
+        :param fields: The payload fields to store, either as a list of
+                       names, in which case the type of each field is
+                       inferred from the first node that has it, or as a
+                       dictionary from names to types (`float`, `int` or
+                       `bool`).
+        :raises ValueError: If a field cannot be stored in a typed array.
+        """
+        self.tree = tree
+        self._fields = dict(fields) if isinstance(fields, dict) else \
+            dict.fromkeys(fields)
+        self._journal = self._on_change = None
+        self._writing = False
+        self.refresh()
+
+    def refresh(self) -> None:
+        """
+        Rebuild the node ids and the columns from the tree.
+        """
+        self._follow()
+        self._stale = True
+        self._built_version = getattr(self.tree, "_version", None)
+        self.keys: List[str] = list(self.tree.keys())
+        self.ids: Dict[str, int] = {key: i for i, key in enumerate(self.keys)}
+        values = [self.tree[key] for key in self.keys]
+
+        # parent ids (-1 for roots and for nodes whose parent is not a node,
+        # e.g., detached nodes)
+        self._parent = array("q", (self.ids.get(v.get(FlatTree.PARENT_KEY), -1)
+                                   for v in values))
+        self._has_children = bytearray(len(self.keys))
+        for p in self._parent:
+            if p != -1:
+                self._has_children[p] = 1
+        self._order = None
+
+        self._columns: Dict[str, Column] = {}
+        for name, type_ in self._fields.items():
+            if type_ is None:
+                type_ = next((type(v[name]) for v in values if name in v), float)
+            if type_ is float:
+                data = array("d", (float(v.get(name, math.nan)) for v in values))
+            elif type_ in (int, bool):
+                try:
+                    data = array("q", (v[name] for v in values))
+                except KeyError:
+                    raise ValueError(
+                        f"Field {name!r} is missing in some nodes; "
+                        f"store it as a float field instead") from None
+                except TypeError:
+                    raise ValueError(
+                        f"Field {name!r} has non-integer values") from None
+            else:
+                raise ValueError(
+                    f"Field {name!r} has unsupported type {type_.__name__}")
+            self._columns[name] = Column(name, data, type_)
+        self._stale = False
+
+    def _follow(self) -> None:
+        """
+        Subscribe to the journal of the tree, if it has one. The journal is
+        never enabled (or re-enabled) by the store. The subscription only
+        holds a weak reference to the store, and removes itself once the
+        store is garbage collected.
+        """
+        journal = getattr(self.tree, "journal", None)
+        if journal is self._journal:
+            return
+        if self._journal is not None:
+            self._journal.unsubscribe(self._on_change)
+            self._journal = self._on_change = None
+        if journal is None:
+            return
+        ref = weakref.ref(self)
+
+        def _on_change(change):
+            store = ref()
+            if store is None:
+                journal.unsubscribe(_on_change)
+            else:
+                store._apply(change)
+
+        journal.subscribe(_on_change)
+        self._journal, self._on_change = journal, _on_change
+
+    def _apply(self, change: Any) -> None:
+        """
+        Update the columns from a payload change published by the journal of
+        the tree. Structural changes are left to the version check.
+        """
+        i = self.ids.get(change.key)
+        if self._writing or self._stale or i is None or \
+                getattr(self.tree, "_version", None) != self._built_version:
+            return
+        if change.op in ("set", "unset"):
+            if change.field not in self._columns:
+                return
+            values = {} if change.op == "unset" else {change.field: change.new}
+            fields = [change.field]
+        elif change.op == "replace":
+            values, fields = change.new, self._columns
+        else:
+            return
+        for name in fields:
+            column = self._columns[name]
+            value = values.get(name)
+            try:
+                if column.type is float:
+                    column.data[i] = math.nan if value is None else float(value)
+                else:
+                    column.data[i] = value
+            except (TypeError, ValueError, OverflowError):
+                # e.g., a missing integer field: rebuilt (and rejected) on
+                # the next access
+                self._stale = True
+                return
+
+    def _check(self) -> None:
+        # a journal enabled or disabled since the last refresh may have
+        # missed payload changes
+        if self._stale or \
+                getattr(self.tree, "journal", None) is not self._journal:
+            self.refresh()
+        elif self._built_version is not None and \
+                getattr(self.tree, "_version", None) != self._built_version:
+            self.refresh()
+
+    def __getitem__(self, field: str) -> Column:
+        self._check()
+        return self._columns[field]
+
+    def __contains__(self, field: str) -> bool:
+        return field in self._columns
+
+    def __len__(self) -> int:
+        self._check()
+        return len(self.keys)
+
+    def leaf_mask(self) -> Mask:
+        """
+        Get the mask of the leaf nodes (nodes without children).
+        """
+        self._check()
+        return ~Mask(np.frombuffer(self._has_children, dtype=bool).copy()
+                     if np is not None else bytearray(self._has_children))
+
+    def find_keys(self, where: Mask) -> List[str]:
+        """
+        Get the keys of the nodes selected by a mask.
+
+        :param where: The mask.
+        :return: The list of keys, in the order of the store.
+        """
+        self._check()
+        return [self.keys[i] for i in where.indices()]
+
+    def find_nodes(self, where: Mask) -> List[Any]:
+        """
+        Vectorized version of `utils.find_nodes`: get the nodes selected by a
+        mask, e.g., `store.find_nodes(store["score"] > 0.9)`. Node proxies
+        are only created for the selected nodes.
+
+        :param where: The mask.
+        :return: The list of selected nodes.
+        """
+        return [self.tree.node(key) for key in self.find_keys(where)]
+
+    def leaves(self, where: Optional[Mask] = None) -> List[Any]:
+        """
+        Vectorized version of filtering `utils.leaves`: get the leaf nodes,
+        optionally only those that are also selected by a mask.
+
+        :param where: The mask (None for all the leaves).
+        :return: The list of leaf nodes.
+        """
+        mask = self.leaf_mask()
+        if where is not None:
+            mask = mask & where
+        return self.find_nodes(mask)
+
+    def update(self, field: str, value: Any,
+               where: Optional[Mask] = None) -> int:
+        """
+        Set a field of the nodes selected by a mask (or of all the nodes) to
+        a value, which is either a scalar or a sequence of values aligned to
+        the node ids. The columns are updated in one array operation, and
+        the new values are written to the payloads of the selected nodes.
+
+        :param field: The field to set.
+        :param value: The scalar value, or the sequence of values.
+        :param where: The mask (None for all the nodes).
+        :return: The number of updated nodes.
+        """
+        self._check()
+        column = self._columns[field]
+        scalar = not hasattr(value, "__len__")
+        idx = range(len(self.keys)) if where is None else where.indices()
+
+        if np is not None:
+            vals = column.values()
+            sel = slice(None) if where is None else where.data
+            vals[sel] = value if scalar else np.asarray(value)[sel]
+        else:
+            for i in idx:
+                column.data[i] = value if scalar else value[i]
+
+        # written back with a copy of the node value, since some flat trees
+        # return copies of their node values
+        self._writing = True
+        try:
+            for i in idx:
+                key = self.keys[i]
+                node_value = dict(self.tree[key])
+                node_value[field] = column.type(column.data[i])
+                self.tree[key] = node_value
+        finally:
+            self._writing = False
+        return len(idx)
+
+    def _topological(self) -> Tuple[array, List[int]]:
+        """
+        Get the node ids in breadth-first order (so parents come before their
+        children) and the offsets at which each level starts in that order.
+        Derived once from the parent ids and cached until the next refresh.
+
+        :raises ValueError: If the parent pointers contain a cycle.
+        """
+        self._check()
+        if self._order is None:
+            children: List[List[int]] = [[] for _ in self.keys]
+            order = array("q")
+            for i, p in enumerate(self._parent):
+                if p == -1:
+                    order.append(i)
+                else:
+                    children[p].append(i)
+            levels = [0]
+            start = 0
+            while start < len(order):
+                end = len(order)
+                levels.append(end)
+                for i in order[start:end]:
+                    order.extend(children[i])
+                start = end
+            if len(order) != len(self.keys):
+                raise ValueError("Cycle detected in the parent pointers")
+            self._order = (order, levels[:-1])
+        return self._order
+
+    def aggregate(self, field: Union[str, Column, Mask, None],
+                  op: Union[str, Callable] = "sum") -> Column:
+        """
+        Compute a rollup of a field over the subtree of every node at once,
+        e.g., the total size under every node, the latest timestamp under
+        every node, or (with `store.leaf_mask()` as the field) the number of
+        leaves under every node.
+
+        The value of every node is combined into all of its ancestors
+        bottom-up, one level of the tree at a time, so this is O(n) in total
+        instead of one traversal of the descendants per node. With NumPy,
+        each level is a single scatter operation (e.g., `np.add.at`).
+
+        :param field: The name of a column, a `Column`, a `Mask` (counted as
+                      0s and 1s), or None for `op="count"`.
+        :param op: "sum", "min", "max", "count" (number of nodes in the
+                   subtree), a NumPy ufunc (e.g., `np.maximum`), or any
+                   binary function on values (evaluated in Python).
+        :return: A column with the rollup of every node, aligned to the
+                 node ids.
+
+        Nodes without a value in a float column (NaN) are skipped by "sum",
+        "min" and "max", with or without NumPy, like `np.nansum`, `np.fmin`
+        and `np.fmax`: the sum of a subtree without values is 0, and its
+        minimum and maximum are NaN. Other functions get the NaNs as is.
+        """
+        order, levels = self._topological()
+        n = len(self.keys)
+        name = (op if isinstance(op, str) else getattr(op, "__name__", "op")) + \
+            f"({field if isinstance(field, str) else getattr(field, 'name', '')})"
+
+        if op == "count" or field is None:
+            op, data, type_ = "sum", array("q", [1]) * n, int
+        elif isinstance(field, Mask):
+            data, type_ = array("q", bytes(8 * n)), int
+            for i in field.indices():
+                data[i] = 1
+        else:
+            column = self[field] if isinstance(field, str) else field
+            data = array(column.data.typecode, column.data)
+            type_ = int if column.type is bool else column.type
+
+        if isinstance(op, str):
+            if op not in ("sum", "min", "max"):
+                raise ValueError(f"Unknown aggregate: {op!r}")
+            if op == "sum" and data.typecode == "d":
+                data = array("d", (0.0 if x != x else x for x in data))
+            if np is not None:
+                op = {"sum": np.add, "min": np.fmin, "max": np.fmax}[op]
+            else:
+                op = {"sum": operator.add, "min": _fmin, "max": _fmax}[op]
+
+        if np is not None and isinstance(op, np.ufunc):
+            acc = np.frombuffer(data, dtype=_DTYPES[data.typecode])
+            parent = np.frombuffer(self._parent, dtype="int64")
+            ids = np.frombuffer(order, dtype="int64")
+            for start, end in zip(reversed(levels[1:]),
+                                  reversed(levels[2:] + [len(order)])):
+                level = ids[start:end]
+                op.at(acc, parent[level], acc[level])
+        else:
+            parent = self._parent
+            for i in reversed(order):
+                p = parent[i]
+                if p != -1:
+                    data[p] = op(data[p], data[i])
+        return Column(name, data, type_)
+
+    def fold(self, value: Callable[[dict], Any],
+             combine: Callable[[Any, Any], Any]) -> Dict[str, Any]:
+        """
+        Pure-Python version of `aggregate`, for payloads that are not
+        numeric. The result of a node is `value(node_value)` combined, with
+        `combine(result, child_result)`, with the results of its children.
+
+        Example::
+
+            # the set of tags in the subtree of every node
+            store.fold(lambda v: set(v.get("tags", ())), set.union)
+
+        :param value: The function mapping a node value (the dictionary
+                      stored in the tree) to the initial result of the node.
+        :param combine: The function combining a result with the result of
+                        a child.
+        :return: A dictionary from the keys of the nodes to their results.
+        """
+        order, _ = self._topological()
+        acc = [value(self.tree[key]) for key in self.keys]
+        parent = self._parent
+        for i in reversed(order):
+            p = parent[i]
+            if p != -1:
+                acc[p] = combine(acc[p], acc[i])
+        return dict(zip(self.keys, acc))
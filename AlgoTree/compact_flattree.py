@@ -0,0 +1,755 @@
+import collections.abc
+import zlib
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Union
+from AlgoTree.flattree import FlatTree
+from AlgoTree.key_allocator import KeyAllocator, UuidKeys
+
+
+class CompactFlatTree(collections.abc.MutableMapping):
+    """
+    A memory-compact alternative to `FlatTree`.
+
+    Keys are interned to dense integer ids: the UTF-8 encoded keys are
+    concatenated in a single byte string, and found through an
+    open-addressing hash table of ids, so a key costs its encoded length plus
+    about 16 bytes instead of a string object and a dictionary entry. The
+    tree structure is stored in 32-bit arrays indexed by id: the parent of
+    each node, and the first, last and next sibling links that make up an
+    ordered list of children for every node. (Removing a child walks the
+    list of its siblings, like removing it from a `FlatTree` child list.)
+    The payloads (the node values minus the parent key) are kept in a
+    separate side table: each payload is stored as a tuple of values
+    together with the id of its interned tuple of field names (its schema),
+    so nodes with the same fields share the field names, and an empty
+    payload costs nothing more than a list slot. A node without a payload
+    takes about 50 bytes, including its key.
+
+    The class implements the same mapping contract as `FlatTree`: it maps
+    unique keys to node values of the form `{"parent": <key>, ...payload}`.
+    Reading a node value builds a fresh dictionary, so modify nodes through
+    the mapping interface (`tree[key] = value`) or through
+    `CompactFlatTreeNode`, not through the returned dictionary.
+
+    Convert from a `FlatTree` (or any mapping in the flat tree format) with
+    `CompactFlatTree(tree)` and back with `to_flattree()`.
+
+    Keys must be strings. Note: the id of a key is never reused, even if the
+    node is deleted, so a tree that undergoes a lot of churn keeps growing.
+    Copy it into a new `CompactFlatTree` to reclaim the space.
+    """
+
+    PARENT_KEY = FlatTree.PARENT_KEY
+    DETACHED_KEY = FlatTree.DETACHED_KEY
+
+    key_allocator: KeyAllocator = UuidKeys()
+    """
+    The allocator of the keys of nodes added without a name. See
+    `FlatTree.key_allocator`.
+    """
+
+    NIL = -1
+    """
+    The id used for "no node" in the sibling links.
+    """
+
+    NO_PARENT = 0
+    """
+    The id of the virtual parent of all root nodes. Root nodes are linked as
+    its children, which gives us the ordered list of roots for free.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """
+        Initialize a CompactFlatTree. Accepts the same arguments as `FlatTree`.
+
+        Examples:
+            CompactFlatTree() # empty tree
+            CompactFlatTree({'a': {'parent': None}, 'b': {'parent': 'a'}})
+            CompactFlatTree(flat_tree)
+
+        :param args: A mapping or an iterable of key-value pairs.
+        :param kwargs: Additional key-value pairs.
+        """
+        # the key of id i is _key_blob[_key_ends[i - 1]:_key_ends[i]], and
+        # id 0 (`NO_PARENT`) has no key
+        self._key_blob = bytearray()
+        self._key_ends = array("q", [0])
+        self._table = array("i", [CompactFlatTree.NIL]) * 8
+        self._parent = array("i", [CompactFlatTree.NIL])
+        self._first = array("i", [CompactFlatTree.NIL])
+        self._last = array("i", [CompactFlatTree.NIL])
+        self._next = array("i", [CompactFlatTree.NIL])
+        self._present = bytearray(1)
+        self._schema = array("i", [0])
+        self._values: List[Optional[tuple]] = [None]
+        self._schemas: List[tuple] = [()]
+        self._schema_ids: Dict[tuple, int] = {(): 0}
+        self._size = 0
+        self._version = 0
+        self.update(*args, **kwargs)
+
+    def _slot(self, encoded: bytes) -> int:
+        """
+        Find the slot of an encoded key in the hash table: the slot with its
+        id, or the empty slot where it belongs (linear probing).
+        """
+        table = self._table
+        mask = len(table) - 1
+        blob, ends = self._key_blob, self._key_ends
+        n = len(encoded)
+        h = zlib.crc32(encoded) & mask
+        while True:
+            i = table[h]
+            if i == CompactFlatTree.NIL or (
+                    ends[i] - ends[i - 1] == n
+                    and blob.startswith(encoded, ends[i - 1])):
+                return h
+            h = (h + 1) & mask
+
+    def _grow(self) -> None:
+        """
+        Double the size of the hash table.
+        """
+        table = array("i", [CompactFlatTree.NIL]) * (2 * len(self._table))
+        mask = len(table) - 1
+        blob, ends = self._key_blob, self._key_ends
+        for i in range(1, len(ends)):
+            h = zlib.crc32(blob[ends[i - 1]:ends[i]]) & mask
+            while table[h] != CompactFlatTree.NIL:
+                h = (h + 1) & mask
+            table[h] = i
+        self._table = table
+
+    def _find(self, key: Any) -> int:
+        """
+        Get the id of `key`, or `NIL` if it was never interned.
+        """
+        if not isinstance(key, str):
+            return CompactFlatTree.NIL
+        return self._table[self._slot(key.encode("utf-8"))]
+
+    def _key(self, i: int) -> str:
+        """
+        Get the key of the id `i`.
+        """
+        ends = self._key_ends
+        return self._key_blob[ends[i - 1]:ends[i]].decode("utf-8")
+
+    def _intern(self, key: str) -> int:
+        """
+        Get the id of `key`, allocating a new one if necessary.
+
+        :param key: The key to intern.
+        :return: The id of the key.
+        :raises TypeError: If the key is not a string.
+        """
+        if not isinstance(key, str):
+            raise TypeError(f"Keys must be strings: {key!r}")
+        encoded = key.encode("utf-8")
+        h = self._slot(encoded)
+        i = self._table[h]
+        if i == CompactFlatTree.NIL:
+            i = len(self._key_ends)
+            self._key_blob += encoded
+            self._key_ends.append(len(self._key_blob))
+            self._table[h] = i
+            for links in (self._parent, self._first, self._last, self._next):
+                links.append(CompactFlatTree.NIL)
+            self._present.append(0)
+            self._schema.append(0)
+            self._values.append(None)
+            if 3 * i > 2 * len(self._table):
+                self._grow()
+        return i
+
+    def _get_payload(self, i: int) -> dict:
+        """
+        Get a new dictionary with the payload of the node with id `i`.
+        """
+        values = self._values[i]
+        if values is None:
+            return {}
+        return dict(zip(self._schemas[self._schema[i]], values))
+
+    def _set_payload(self, i: int, payload: Dict) -> None:
+        """
+        Set the payload of the node with id `i`, interning its field names.
+        """
+        if not payload:
+            self._schema[i] = 0
+            self._values[i] = None
+            return
+        fields = tuple(payload.keys())
+        schema = self._schema_ids.get(fields)
+        if schema is None:
+            schema = len(self._schemas)
+            self._schemas.append(fields)
+            self._schema_ids[fields] = schema
+        self._schema[i] = schema
+        self._values[i] = tuple(payload.values())
+
+    def _id(self, key: Optional[str]) -> int:
+        """
+        Get the id of a known key.
+
+        :param key: The key.
+        :return: The id of the key.
+        :raises KeyError: If the key is not one of `unique_keys()`.
+        """
+        if key == CompactFlatTree.DETACHED_KEY:
+            return self._intern(key)
+        i = self._find(key)
+        if i == CompactFlatTree.NIL or not self._is_known(i):
+            raise KeyError(f"Key not found: {key!r}")
+        return i
+
+    def _is_known(self, i: int) -> bool:
+        return (self._present[i] or self._first[i] != CompactFlatTree.NIL
+                or self._key(i) == CompactFlatTree.DETACHED_KEY)
+
+    def _link(self, i: int, p: int) -> None:
+        self._version += 1
+        self._parent[i] = p
+        last = self._last[p]
+        self._next[i] = CompactFlatTree.NIL
+        if last == CompactFlatTree.NIL:
+            self._first[p] = i
+        else:
+            self._next[last] = i
+        self._last[p] = i
+
+    def _unlink(self, i: int) -> None:
+        self._version += 1
+        p = self._parent[i]
+        nxt = self._next[i]
+        if self._first[p] == i:
+            prv = CompactFlatTree.NIL
+            self._first[p] = nxt
+        else:
+            prv = self._first[p]
+            while self._next[prv] != i:
+                prv = self._next[prv]
+            self._next[prv] = nxt
+        if nxt == CompactFlatTree.NIL:
+            self._last[p] = prv
+
+    def _child_ids(self, i: int) -> Iterator[int]:
+        c = self._first[i]
+        while c != CompactFlatTree.NIL:
+            yield c
+            c = self._next[c]
+
+    def _parent_id(self, par_key: Optional[str]) -> int:
+        if par_key is None:
+            return CompactFlatTree.NO_PARENT
+        return self._intern(par_key)
+
+    def __getitem__(self, key: str) -> dict:
+        i = self._find(key)
+        if i == CompactFlatTree.NIL or not self._present[i]:
+            raise KeyError(key)
+        value = self._get_payload(i)
+        p = self._parent[i]
+        value[CompactFlatTree.PARENT_KEY] = (
+            None if p == CompactFlatTree.NO_PARENT else self._key(p))
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if not isinstance(value, collections.abc.Mapping):
+            raise ValueError(f"Node {key!r} does not have dictionary: {value=}")
+        payload = {k: v for k, v in value.items()
+                   if k != CompactFlatTree.PARENT_KEY}
+        p = self._parent_id(value.get(CompactFlatTree.PARENT_KEY))
+        i = self._intern(key)
+        if self._present[i]:
+            if self._parent[i] != p:
+                self._unlink(i)
+                self._link(i, p)
+        else:
+            self._present[i] = 1
+            self._size += 1
+            self._link(i, p)
+        self._set_payload(i, payload)
+
+    def __delitem__(self, key: str) -> None:
+        i = self._find(key)
+        if i == CompactFlatTree.NIL or not self._present[i]:
+            raise KeyError(key)
+        self._unlink(i)
+        self._present[i] = 0
+        self._set_payload(i, {})
+        self._size -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        present = self._present
+        for i in range(1, len(self._key_ends)):
+            if present[i]:
+                yield self._key(i)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: Any) -> bool:
+        i = self._find(key)
+        return i != CompactFlatTree.NIL and bool(self._present[i])
+
+    def __repr__(self) -> str:
+        return f"CompactFlatTree({dict(self)})"
+
+    def __str__(self) -> str:
+        return f"CompactFlatTree(name={self.name}, payload={self.payload}, num_children={len(self.children)})"
+
+    def unique_keys(self) -> List[str]:
+        """
+        Get the unique keys in the tree, even if they are not nodes in the tree
+        but only parent keys without corresponding nodes.
+
+        :return: List of unique keys in the tree.
+        """
+        keys = [self._key(i) for i in range(1, len(self._key_ends))
+                if self._is_known(i)]
+        if self._find(CompactFlatTree.DETACHED_KEY) == CompactFlatTree.NIL:
+            keys.append(CompactFlatTree.DETACHED_KEY)
+        return keys
+
+    def child_keys(self, key: str) -> List[str]:
+        """
+        Get the children keys of a node with key `key`.
+
+        :param key: The key of the node.
+        :return: List of keys of the children of the node.
+        """
+        return [self._key(c) for c in self._child_ids(self._id(key))]
+
+    def reparent(self, key: str, par_key: Optional[str]) -> None:
+        """
+        Set the parent of the node with key `key` to `par_key`. The node is
+        appended to the end of the children of its new parent.
+
+        :param key: The key of the node.
+        :param par_key: The key of the new parent (None to make it a root).
+        :raises KeyError: If the node is not found in the tree.
+        """
+        if key not in self:
+            raise KeyError(f"Node not found: {key!r}")
+        i = self._find(key)
+        p = self._parent_id(par_key)
+        if self._parent[i] != p:
+            self._unlink(i)
+            self._link(i, p)
+
+    def detach(self, key: str) -> "CompactFlatTreeNode":
+        """
+        Detach node with key `key` by setting its parent to
+        `CompactFlatTree.DETACHED_KEY`.
+
+        :param key: The key of the node to detach.
+        :return: The detached subtree rooted at the node.
+        :raises KeyError: If the node is not found in the tree.
+        """
+        self.reparent(key, CompactFlatTree.DETACHED_KEY)
+        return self.node(key)
+
+    def prune(self, node: Union[str, "CompactFlatTreeNode"]) -> List[str]:
+        """
+        Prune the subtree rooted at the given node (`node` can be a
+        unique key for the node or a `CompactFlatTreeNode` object).
+
+        :param node: The node to prune.
+        :return: The list of keys pruned (in post-order).
+        :raises KeyError: If the node is not found in the tree.
+        """
+        i = self._id(node if isinstance(node, str) else node.name)
+        order = []
+        stack = [i]
+        while stack:
+            cur = stack.pop()
+            order.append(cur)
+            stack.extend(self._child_ids(cur))
+
+        pruned = []
+        for cur in reversed(order):
+            if self._present[cur]:
+                key = self._key(cur)
+                pruned.append(key)
+                del self[key]
+        return pruned
+
+    def node(self, name: str) -> "CompactFlatTreeNode":
+        """
+        Get a proxy of the node with key `name`, in the context of the whole
+        tree (the current root is the root of the tree). See `FlatTree.node`.
+
+        :param name: The unique key of the node.
+        :return: CompactFlatTreeNode proxy representing the node.
+        :raises KeyError: If the key is not found in the tree.
+        """
+        return CompactFlatTreeNode(self, self._id(name), self._root_id())
+
+    def subtree(self, name: Optional[str] = None) -> "CompactFlatTreeNode":
+        """
+        Get sub-tree rooted at the node with the name `name` with the current
+        node also set to the node with name `name`.
+
+        :param name: The unique key of the node (None for the root).
+        :return: CompactFlatTreeNode proxy representing the node.
+        :raises KeyError: If the key is not found in the tree.
+        """
+        if name is None:
+            name = self.root_key
+        i = self._id(name)
+        return CompactFlatTreeNode(self, i, i)
+
+    def _root_id(self) -> int:
+        i = self._first[CompactFlatTree.NO_PARENT]
+        if i == CompactFlatTree.NIL:
+            raise ValueError("No root node found in tree")
+        return i
+
+    @property
+    def root_key(self) -> str:
+        """
+        Retrieve the key of the (first) root node.
+
+        :return: The key of the root node.
+        """
+        return self._key(self._root_id())
+
+    @property
+    def root_keys(self) -> List[str]:
+        """
+        Retrieve the keys of all the root nodes.
+
+        :return: The keys of the root nodes.
+        """
+        return [self._key(i) for i in self._child_ids(CompactFlatTree.NO_PARENT)]
+
+    @property
+    def forest(self) -> List["CompactFlatTreeNode"]:
+        """
+        Retrieve the trees of the forest, one subtree per root node.
+
+        :return: List of subtrees rooted at the root nodes.
+        """
+        return [CompactFlatTreeNode(self, i, i)
+                for i in self._child_ids(CompactFlatTree.NO_PARENT)]
+
+    @property
+    def root(self) -> "CompactFlatTreeNode":
+        """
+        Retrieve the root of the tree.
+
+        :return: The root node.
+        """
+        return self.subtree(self.root_key)
+
+    @property
+    def detached(self) -> "CompactFlatTreeNode":
+        """
+        Retrieve the detached tree, rooted at the logical node with the key
+        `CompactFlatTree.DETACHED_KEY`.
+
+        :return: The detached logical root node.
+        """
+        return self.subtree(CompactFlatTree.DETACHED_KEY)
+
+    @property
+    def parent(self) -> None:
+        """
+        The root of the tree has no parent.
+        """
+        return self.root.parent
+
+    @property
+    def payload(self) -> Dict:
+        """
+        Retrieve the payload of the root node.
+        """
+        return self.root.payload
+
+    @property
+    def name(self) -> str:
+        """
+        Retrieve the name of the root node.
+        """
+        return self.root_key
+
+    @property
+    def children(self) -> List["CompactFlatTreeNode"]:
+        """
+        Retrieve the children of the root node.
+        """
+        return self.root.children
+
+    def to_flattree(self) -> FlatTree:
+        """
+        Convert the tree to a `FlatTree`.
+
+        :return: A `FlatTree` with the same nodes (in the same order).
+        """
+        return FlatTree(self.items())
+
+    def to_dict(self) -> dict:
+        """
+        Convert the tree to a dictionary in the flat tree format.
+
+        :return: The tree as a dictionary.
+        """
+        return dict(self.items())
+
+
+class CompactFlatTreeNode(collections.abc.MutableMapping):
+    """
+    A node proxy for `CompactFlatTree`, with the same node-centric API as
+    `FlatTreeNode`. A proxy is just a (tree, node id, root id) triple, so it
+    is cheap to create.
+    """
+
+    __slots__ = ("_tree", "_id", "_root_id")
+
+    def __init__(self, tree: CompactFlatTree, node_id: int, root_id: int):
+        """
+        Create a proxy for the node with id `node_id`, in the subtree rooted
+        at the node with id `root_id`. Use `CompactFlatTree.node`,
+        `CompactFlatTree.subtree` or `add_child` rather than calling this
+        directly.
+
+        :param tree: The tree the node belongs to.
+        :param node_id: The id of the node.
+        :param root_id: The id of the (logical) root node.
+        """
+        self._tree = tree
+        self._id = node_id
+        self._root_id = root_id
+
+    @property
+    def name(self) -> str:
+        """
+        Get the unique name of the node.
+
+        :return: The unique name of the node.
+        """
+        return self._tree._key(self._id)
+
+    @property
+    def structure_version(self) -> int:
+        """
+        Get a counter that changes whenever the structure of the underlying
+        tree changes. Indexes over the tree use it to detect that they are
+        stale.
+
+        :return: The structure version of the tree.
+        """
+        return self._tree._version
+
+    @property
+    def tree(self) -> CompactFlatTree:
+        """
+        Get the underlying CompactFlatTree object.
+
+        :return: The CompactFlatTree object.
+        """
+        return self._tree
+
+    @property
+    def root(self) -> "CompactFlatTreeNode":
+        """
+        Get the root node of the subtree.
+
+        :return: The root node.
+        """
+        return CompactFlatTreeNode(self._tree, self._root_id, self._root_id)
+
+    @property
+    def parent(self) -> Optional["CompactFlatTreeNode"]:
+        """
+        Get the parent node of the node.
+
+        :return: The parent node.
+        """
+        if self._id == self._root_id or not self._tree._present[self._id]:
+            return None
+        p = self._tree._parent[self._id]
+        if p == CompactFlatTree.NO_PARENT:
+            return None
+        return CompactFlatTreeNode(self._tree, p, self._root_id)
+
+    @parent.setter
+    def parent(self, node: "CompactFlatTreeNode") -> None:
+        """
+        Set the parent node of the node. If the new parent is in a different
+        tree, the node (but not its children) is copied into that tree.
+
+        :param node: The new parent node.
+        """
+        if not self._tree._present[self._id]:
+            raise ValueError(f"{self.name} is an immutable logical root")
+
+        if node._tree is not self._tree:
+            if self.name in node._tree:
+                raise ValueError(f"Node {self} already exists in the tree")
+            node._tree[self.name] = self._tree[self.name]
+
+        node._tree.reparent(self.name, node.name)
+
+    @property
+    def children(self) -> List["CompactFlatTreeNode"]:
+        """
+        Get the children of the node.
+
+        :return: List of child nodes.
+        """
+        return [CompactFlatTreeNode(self._tree, c, self._root_id)
+                for c in self._tree._child_ids(self._id)]
+
+    @children.setter
+    def children(self, nodes: List["CompactFlatTreeNode"]) -> None:
+        """
+        Set the children of the node.
+
+        :param nodes: The new children nodes.
+        """
+        for node in self.children:
+            node.detach()
+
+        if nodes is None:
+            return
+
+        if not isinstance(nodes, list):
+            nodes = [nodes]
+        for node in nodes:
+            node.parent = self
+
+    @property
+    def payload(self) -> Dict:
+        """
+        Get the payload data of the node.
+
+        :return: Dictionary representing the data of the node.
+        """
+        return self._tree._get_payload(self._id)
+
+    @payload.setter
+    def payload(self, data: Dict) -> None:
+        """
+        Set the payload data of the node.
+
+        :param data: Dictionary representing the new data of the node.
+        """
+        if not isinstance(data, dict):
+            raise ValueError("Payload must be a dictionary")
+        if not self._tree._present[self._id]:
+            raise KeyError(
+                f"{self.name} is an immutable logical root without a payload")
+        if CompactFlatTree.PARENT_KEY in data:
+            raise ValueError("Cannot set parent using payload setter")
+        self._tree._set_payload(self._id, data)
+
+    def _update_payload(self, func) -> None:
+        if not self._tree._present[self._id]:
+            raise TypeError(f"{self.name} is an immutable logical root")
+        payload = self._tree._get_payload(self._id)
+        func(payload)
+        self._tree._set_payload(self._id, payload)
+
+    def __getitem__(self, key) -> Any:
+        if not self._tree._present[self._id]:
+            raise KeyError(
+                f"{self.name} is an immutable logical root without a payload")
+        if key == CompactFlatTree.PARENT_KEY:
+            return self._tree[self.name][key]
+        return self._tree._get_payload(self._id)[key]
+
+    def __getattr__(self, key) -> Any:
+        if key in ["name", "parent", "root", "tree", "payload", "children",
+                   "structure_version"] or key.startswith("_"):
+            return object.__getattribute__(self, key)
+        if key in self:
+            return self[key]
+        return None
+
+    def __setitem__(self, key, value) -> None:
+        if key == CompactFlatTree.PARENT_KEY:
+            self._tree.reparent(self.name, value)
+        else:
+            self._update_payload(lambda payload: payload.__setitem__(key, value))
+
+    def __delitem__(self, key) -> None:
+        if key == CompactFlatTree.PARENT_KEY:
+            self._tree.reparent(self.name, None)
+        else:
+            self._update_payload(lambda payload: payload.__delitem__(key))
+
+    def __iter__(self) -> Iterator[Any]:
+        values = self._tree._values[self._id]
+        if values is None:
+            return iter(())
+        return iter(self._tree._schemas[self._tree._schema[self._id]])
+
+    def __len__(self) -> int:
+        values = self._tree._values[self._id]
+        return 0 if values is None else len(values)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, CompactFlatTreeNode):
+            return False
+        return (self._tree is other._tree and self._id == other._id
+                and self._root_id == other._root_id)
+
+    def __hash__(self) -> int:
+        return hash((id(self._tree), self._id, self._root_id))
+
+    def __repr__(self) -> str:
+        par = self.parent
+        return f"{__class__.__name__}(name={self.name}, parent={None if par is None else par.name}, payload={self.payload}, root={self.root.name}, children={self._tree.child_keys(self.name)})"
+
+    def detach(self) -> "CompactFlatTreeNode":
+        """
+        Detach the node from the tree.
+
+        :return: The detached node.
+        """
+        return self._tree.detach(self.name)
+
+    def add_child(self, name: Optional[str] = None, *args, **kwargs) -> "CompactFlatTreeNode":
+        """
+        Add a child node. If the name is None, a key is allocated by the
+        `key_allocator` of the tree.
+
+        :param name: The unique name (key) for the child.
+        :param args: Positional arguments for the child's payload.
+        :param kwargs: Additional attributes for the child's payload.
+        :return: The child node, from the perspective of the subtree that
+                 contains the parent.
+        """
+        if name is None:
+            name = self._tree.key_allocator(self._tree)
+        if name in self._tree:
+            raise KeyError(f"key already exists in the tree: {name}")
+        value = dict(*args, **kwargs)
+        value[CompactFlatTree.PARENT_KEY] = self.name
+        self._tree[name] = value
+        return CompactFlatTreeNode(self._tree, self._tree._find(name), self._root_id)
+
+    def node(self, name: Optional[str] = None) -> "CompactFlatTreeNode":
+        """
+        Get the node with the given name, in the same subtree as this node.
+
+        :param name: The name of the node (None for the current node).
+        :return: The node.
+        """
+        if name is None:
+            return self
+        return CompactFlatTreeNode(self._tree, self._tree._id(name), self._root_id)
+
+    def subtree(self, name: Optional[str] = None) -> "CompactFlatTreeNode":
+        """
+        Get a subtree rooted at the node with the name `name`. If `name` is
+        None, the subtree is rooted at the current node.
+
+        :param name: The name of the root node.
+        :return: A subtree rooted at the given node.
+        """
+        i = self._id if name is None else self._tree._id(name)
+        return CompactFlatTreeNode(self._tree, i, i)
@@ -1,5 +1,10 @@
-from typing import TYPE_CHECKING, Any, List, Optional, Union
+import weakref
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
 from AlgoTree import utils
+from AlgoTree.journal import Journal
+from AlgoTree.key_allocator import KeyAllocator, UuidKeys
 
 if TYPE_CHECKING:
     from flattree_node import FlatTreeNode
@@ -14,7 +19,7 @@ class FlatTree(dict):
     The first node found that is without a  'parent' key is
     the root node. If there are multiple nodes without a 'parent' key, the
     structure is technically a forrest. You may get all of the trees
-    with the `forest` method, which returns a list of the root nodes.
+    with the `forest` property, which returns a list of the root nodes.
 
     The `FlatTree` class is a dictionary whose data represents a tree-like
     structure. It provides methods to manipulate the tree structure and
@@ -28,6 +33,17 @@ class FlatTree(dict):
     We provide a `FlatTreeNode` class which provides an interface to the
     underlying `FlatTree` object centered around nodes. See `flattree_node.py`
     for more details.
+
+    To make child lookups O(k) rather than O(n), the tree maintains an index
+    from each parent key to the ordered list of its children. The index is
+    updated by the dictionary methods (`tree[key] = value`, `del tree[key]`,
+    `update`, ...), by `detach` and `reparent`, and by the `FlatTreeNode`
+    API. Children are listed in the order in which they were attached to
+    their parent. Root nodes are indexed under the parent key None, so the
+    root key, the forest roots and the set of known keys are also available
+    in O(1). Every structural change also bumps a version counter (see
+    `FlatTreeNode.structure_version`) that derived indexes use to detect
+    that they are stale.
     """
 
     PARENT_KEY = "parent"
@@ -44,6 +60,15 @@ class FlatTree(dict):
     detached.
     """
 
+    key_allocator: KeyAllocator = UuidKeys()
+    """
+    The allocator of the keys of nodes created without a name, e.g., by
+    `FlatTreeNode(parent=...)`. Set it on the class or on a tree, e.g.,
+    `tree.key_allocator = CounterKeys()`. See `AlgoTree.key_allocator`.
+    """
+
+    _MISSING = object()
+
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         """
         Initialize a FlatTree.
@@ -63,6 +88,582 @@ class FlatTree(dict):
         :param kwargs: Keyword arguments to be passed to the dictionary constructor.
         """
         super().__init__(*args, **kwargs)
+        self._undo: Optional[Dict[str, Any]] = None
+        self._cow = False
+        self._owned: set = set()
+        self._shared_index = False
+        self._frozen = False
+        self._journal: Optional[Journal] = None
+        self._proxies: Optional[weakref.WeakValueDictionary] = None
+        self.reindex()
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[tuple],
+                   validate: bool = False) -> "FlatTree":
+        """
+        Build a tree from an iterable of `(key, parent)` or
+        `(key, parent, payload)` tuples, where `parent` is None (or "") for
+        root nodes and `payload` is a dictionary (or None).
+
+        This is a bulk constructor: the edges are consumed one at a time
+        (so `edges` may be a generator over a large file), each node value
+        is stored directly, and the child index is built while consuming
+        them, instead of going through the per-node bookkeeping of
+        `FlatTreeNode`.
+
+        Example::
+
+            FlatTree.from_edges([("a", None), ("b", "a", {"x": 1})])
+
+        :param edges: The edges.
+        :param validate: If True, reject duplicate keys while consuming the
+                         edges and check the tree with `check_valid` at the
+                         end. Otherwise, a later duplicate replaces an
+                         earlier one.
+        :return: The tree.
+        :raises ValueError: If `validate` is True and the tree is not valid.
+        """
+        def _items():
+            for key, par_key, *payload in edges:
+                value = dict(payload[0]) if payload and payload[0] else {}
+                value[FlatTree.PARENT_KEY] = par_key if par_key != "" else None
+                yield key, value
+
+        tree = cls()
+        tree._load(_items(), validate)
+        return tree
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict[str, Any]],
+                     key: str = "key", parent: str = "parent",
+                     validate: bool = False) -> "FlatTree":
+        """
+        Build a tree from an iterable of dictionary records, e.g., the rows
+        of a `csv.DictReader` or the parsed lines of an NDJSON file. Each
+        record has the key of the node in the field `key`, the key of its
+        parent in the field `parent` (None, "" or missing for root nodes),
+        and the payload in the remaining fields. See `from_edges`.
+
+        Example::
+
+            FlatTree.from_records(csv.DictReader(f), key="id", parent="parent_id")
+
+        :param records: The records.
+        :param key: The field with the key of the node.
+        :param parent: The field with the key of the parent.
+        :param validate: See `from_edges`.
+        :return: The tree.
+        :raises KeyError: If a record does not have the field `key`.
+        :raises ValueError: If `validate` is True and the tree is not valid.
+        """
+        tree = cls()
+        tree._load(FlatTree._record_items(records, key, parent), validate)
+        return tree
+
+    @staticmethod
+    def _record_items(records: Iterable[Dict[str, Any]], key: str,
+                      parent: str) -> Iterator[tuple]:
+        """
+        Map dictionary records to `(key, value)` items. See `from_records`.
+        """
+        for record in records:
+            value = {k: v for k, v in record.items()
+                     if k != key and k != parent}
+            par_key = record.get(parent)
+            value[FlatTree.PARENT_KEY] = par_key if par_key != "" else None
+            yield record[key], value
+
+    def _load(self, items: Iterable[tuple], validate: bool) -> None:
+        """
+        Insert `(key, value)` items, indexing them as they are inserted.
+
+        :param items: The items.
+        :param validate: If True, reject duplicate keys and check the tree
+                         at the end.
+        """
+        self._check_writable()
+        index = self._own_index()
+        duplicates = False
+        for key, value in items:
+            old_value = dict.get(self, key, FlatTree._MISSING)
+            if old_value is not FlatTree._MISSING:
+                if validate:
+                    raise ValueError(f"Duplicate key: {key!r}")
+                duplicates = True
+            dict.__setitem__(self, key, value)
+            index.setdefault(FlatTree._parent_of(value), []).append(key)
+            if self._journal is not None:
+                if old_value is FlatTree._MISSING:
+                    self._emit("insert", key, new=FlatTree._copy(value))
+                else:
+                    self._emit("replace", key, old=FlatTree._copy(old_value),
+                               new=FlatTree._copy(value))
+        self._version += 1
+        if duplicates:
+            # a replaced node was indexed twice
+            self.reindex()
+        if validate:
+            FlatTree.check_valid(self)
+
+    @staticmethod
+    def _parent_of(value: Any) -> Optional[str]:
+        """
+        Get the parent key stored in a node value, or None if the node
+        value has no parent key (or is not a dictionary).
+
+        :param value: The node value.
+        :return: The parent key.
+        """
+        if not isinstance(value, dict):
+            return None
+        return value.get(FlatTree.PARENT_KEY)
+
+    def reindex(self) -> None:
+        """
+        Rebuild the parent-to-children index from scratch. The index maps
+        each parent key (None for root nodes) to the ordered list of keys
+        of its children.
+
+        The index is kept up to date by the mutating methods of `FlatTree`
+        and `FlatTreeNode`. If you modify the parent key of a node value in
+        place, e.g., `tree[key]["parent"] = other`, call this method
+        afterwards (or use `reparent`).
+        """
+        self._children = {}
+        self._shared_index = False
+        self._version = getattr(self, "_version", 0) + 1
+        for key, value in self.items():
+            self._children.setdefault(FlatTree._parent_of(value), []).append(key)
+
+    def _own_index(self) -> Dict[Optional[str], List[str]]:
+        """
+        Get the parent-to-children index for modification, copying it first
+        if it is shared with a fork or snapshot.
+        """
+        if self._shared_index:
+            self._children = {k: list(v) for k, v in self._children.items()}
+            self._shared_index = False
+        return self._children
+
+    def _link(self, key: str, par_key: Optional[str]) -> None:
+        self._version += 1
+        self._own_index().setdefault(par_key, []).append(key)
+
+    def _unlink(self, key: str, par_key: Optional[str]) -> bool:
+        self._version += 1
+        try:
+            siblings = self._own_index()[par_key]
+            siblings.remove(key)
+        except (KeyError, ValueError):
+            # the index is stale, e.g., the parent key of a node value was
+            # modified in place, so we rebuild it from the current values
+            self.reindex()
+            return False
+        if not siblings:
+            del self._children[par_key]
+        return True
+
+    def _check_writable(self) -> None:
+        if self._frozen:
+            raise TypeError("A snapshot is read-only, fork it to modify it")
+
+    def _record(self, key: str, in_place: bool = True) -> None:
+        """
+        Called before the node with key `key` is modified. Inside a `batch`,
+        remember its value before it is first modified, so that the batch
+        can be rolled back. If the node value is shared with a fork or
+        snapshot and is about to be modified in place (`in_place`), replace
+        it with a private copy first.
+        """
+        self._check_writable()
+        if self._cow and key not in self._owned:
+            self._owned.add(key)
+            value = dict.get(self, key)
+            if in_place and isinstance(value, dict):
+                dict.__setitem__(self, key, dict(value))
+        if self._undo is not None and key not in self._undo:
+            value = dict.get(self, key, FlatTree._MISSING)
+            if isinstance(value, dict):
+                value = dict(value)
+            self._undo[key] = value
+
+    @staticmethod
+    def _copy(value: Any) -> Any:
+        return dict(value) if isinstance(value, dict) else value
+
+    def _emit(self, op: str, key: str, field: Optional[str] = None,
+              old: Any = None, new: Any = None) -> None:
+        """
+        Append a change to the journal, if it is enabled. See `Change`.
+        """
+        if self._journal is not None:
+            self._journal._append(op, key, field, old, new)
+
+    @property
+    def journal(self) -> Optional[Journal]:
+        """
+        The journal of the mutations of the tree, or None if it is not
+        enabled (see `enable_journal`).
+        """
+        return self._journal
+
+    def enable_journal(self, maxlen: Optional[int] = None) -> Journal:
+        """
+        Start recording the mutations of the tree (insertions, deletions,
+        re-parenting and payload changes) in an append-only `Journal`, with
+        sequence numbers and subscriber callbacks, so that consumers can
+        update derived data from the changes. If the journal is already
+        enabled, it is returned as is.
+
+        Mutations are recorded when they go through the tree API: the
+        dictionary methods, `reparent`, `detach`, `prune` and the
+        `FlatTreeNode` API. Modifying a node value in place directly, e.g.,
+        `tree[key]["x"] = 1`, is not recorded.
+
+        :param maxlen: The maximum number of changes to keep (None to keep
+                       all of them).
+        :return: The journal.
+        """
+        if self._journal is None:
+            self._journal = Journal(maxlen)
+        return self._journal
+
+    def disable_journal(self) -> None:
+        """
+        Stop recording the mutations of the tree and drop the journal.
+        """
+        self._journal = None
+
+    def enable_proxy_cache(self) -> None:
+        """
+        Reuse the `FlatTreeNode` proxies of the tree: while a proxy for a
+        `(node_key, root_key)` pair is alive, navigating to the same node
+        (`children`, `parent`, `node`, ...) returns it instead of allocating a
+        new one. The cache holds weak references, so it does not keep proxies
+        alive and costs nothing once they are released.
+
+        Proxies only hold the tree and the two keys, so a cached proxy is
+        never stale.
+        """
+        if self._proxies is None:
+            self._proxies = weakref.WeakValueDictionary()
+
+    def disable_proxy_cache(self) -> None:
+        """
+        Stop reusing the `FlatTreeNode` proxies of the tree and drop the cache.
+        """
+        self._proxies = None
+
+    @contextmanager
+    def batch(self, validate: bool = False) -> Iterator["FlatTree"]:
+        """
+        A context manager that groups many modifications into a transaction::
+
+            with tree.batch():
+                for key, par_key in moves.items():
+                    tree.reparent(key, par_key)
+
+        A batch only makes the modifications transactional: it does not
+        defer any work. The parent-to-children index is still updated
+        incrementally, so reads (`child_keys`, `root_key`, `node`, ...) stay
+        cheap inside the batch. The index is copied once, on the first structural change in
+        the batch, so that it can be restored on rollback. If `validate` is
+        True, the tree is validated with `check_valid` once at exit.
+
+        If an exception escapes the batch (including a validation error), all
+        the modifications made in the batch are rolled back. Each node value
+        is copied (shallowly) the first time it is modified in the batch, so
+        objects nested in a payload and modified in place are not restored.
+        Nested batches are merged into the outermost one.
+
+        :param validate: Whether to validate the tree at exit.
+        :return: The tree.
+        """
+        if self._undo is not None:
+            yield self
+            return
+
+        self._check_writable()
+        self._undo = {}
+        # the first structural change in the batch copies the index (see
+        # `_own_index`), so this one is kept as is for the rollback
+        children, shared_index = self._children, self._shared_index
+        self._shared_index = True
+        journal = self._journal
+        if journal is not None:
+            journal._begin()
+        try:
+            yield self
+            if validate:
+                FlatTree.check_valid(self)
+        except BaseException:
+            if journal is not None:
+                journal._rollback()
+            undo, self._undo = self._undo, None
+            for key, value in undo.items():
+                if value is FlatTree._MISSING:
+                    dict.pop(self, key, None)
+                else:
+                    dict.__setitem__(self, key, value)
+            self._children = children
+            self._shared_index = shared_index
+            self._version += 1
+            raise
+        self._undo = None
+        if journal is not None:
+            journal._commit()
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._record(key, in_place=False)
+        new_par = FlatTree._parent_of(value)
+        if key in self:
+            old_value = dict.__getitem__(self, key)
+            old_par = FlatTree._parent_of(old_value)
+            super().__setitem__(key, value)
+            if old_par != new_par and self._unlink(key, old_par):
+                self._link(key, new_par)
+            if self._journal is not None:
+                self._emit("replace", key, old=FlatTree._copy(old_value),
+                           new=FlatTree._copy(value))
+        else:
+            super().__setitem__(key, value)
+            self._link(key, new_par)
+            if self._journal is not None:
+                self._emit("insert", key, new=FlatTree._copy(value))
+
+    def __delitem__(self, key: str) -> None:
+        old_value = dict.__getitem__(self, key)
+        self._record(key, in_place=False)
+        super().__delitem__(key)
+        self._unlink(key, FlatTree._parent_of(old_value))
+        if self._journal is not None:
+            self._emit("delete", key, old=FlatTree._copy(old_value))
+
+    def __ior__(self, other: Any) -> "FlatTree":
+        self.update(other)
+        return self
+
+    def __reduce__(self):
+        # copy, deepcopy and pickle go through here, so that the index
+        # (including the order of children) is carried over to the copy.
+        # A shallow copy shares the index, so both copy it before modifying.
+        self._shared_index = True
+        state = self.__dict__.copy()
+        state["_undo"] = None
+        state["_cow"] = False
+        state["_owned"] = set()
+        state["_journal"] = None
+        state["_proxies"] = None
+        return (self.__class__, (dict(self),), state)
+
+    def __copy__(self) -> "FlatTree":
+        cls, args, state = self.__reduce__()
+        copy = cls(*args)
+        copy.__dict__.update(state)
+        if self._cow:
+            # the node values are still shared with a fork or snapshot, and
+            # now with this copy as well, so both copy them before modifying
+            copy._cow = True
+            self._owned = set()
+        return copy
+
+    def fork(self) -> "FlatTree":
+        """
+        Get a copy-on-write copy of the tree, e.g., to make a few changes for
+        an experiment without copying the whole tree.
+
+        The fork shares the node values (the payload dictionaries) and the
+        parent-to-children index with this tree. Only the pointers to the
+        node values are copied, which is a single C-level pass, and a node
+        value is copied by whichever tree first modifies it through the tree
+        API (`FlatTreeNode`, `reparent`, `detach`, ...), so each tree only
+        pays for the nodes it changes. The index is copied on the first
+        structural change. Reads are as fast as on any other `FlatTree`.
+
+        Modifying a node value in place directly, e.g.,
+        `tree[key]["x"] = 1`, bypasses the copy-on-write and is visible in
+        both trees. Use `tree.node(key)["x"] = 1` instead.
+
+        :return: The fork.
+        :raises RuntimeError: If called inside a `batch`.
+        """
+        return self._share(frozen=False)
+
+    def snapshot(self) -> "FlatTree":
+        """
+        Get a read-only copy-on-write copy of the tree, which keeps the
+        current state of the tree while the tree continues to be modified.
+        See `fork`. Modifying the snapshot raises a TypeError; fork the
+        snapshot to get a modifiable copy of it.
+
+        :return: The snapshot.
+        :raises RuntimeError: If called inside a `batch`.
+        """
+        return self._share(frozen=True)
+
+    def _share(self, frozen: bool) -> "FlatTree":
+        if self._undo is not None:
+            raise RuntimeError("Cannot fork or snapshot a tree inside a batch")
+        index = self._children
+        copy = self.__class__.__new__(self.__class__)
+        dict.update(copy, self)
+        copy.__dict__.update(self.__dict__)
+        copy._children = index
+        copy._cow = True
+        copy._owned = set()
+        copy._shared_index = True
+        copy._frozen = frozen
+        copy._journal = None
+        copy._proxies = None
+        # the node values are now shared, including those this tree owned
+        self._cow = True
+        self._owned = set()
+        self._shared_index = True
+        return copy
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, *args: Any) -> Any:
+        if key not in self:
+            return super().pop(key, *args)
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self) -> tuple:
+        self._check_writable()
+        key, value = super().popitem()
+        if self._undo is not None:
+            self._undo.setdefault(
+                key, dict(value) if isinstance(value, dict) else value)
+        self._unlink(key, FlatTree._parent_of(value))
+        if self._journal is not None:
+            self._emit("delete", key, old=FlatTree._copy(value))
+        return key, value
+
+    def clear(self) -> None:
+        self._check_writable()
+        for key in self:
+            self._record(key, in_place=False)
+        items = list(self.items()) if self._journal is not None else ()
+        super().clear()
+        self._children = {}
+        self._shared_index = False
+        self._version += 1
+        for key, value in items:
+            self._emit("delete", key, old=FlatTree._copy(value))
+
+    def reparent(self, key: str, par_key: Optional[str]) -> None:
+        """
+        Set the parent of the node with key `key` to `par_key`. The node is
+        appended to the end of the children of its new parent.
+
+        :param key: The key of the node.
+        :param par_key: The key of the new parent (None to make it a root).
+        :raises KeyError: If the node is not found in the tree.
+        """
+        old_par = FlatTree._parent_of(dict.__getitem__(self, key))
+        self._record(key)
+        dict.__getitem__(self, key)[FlatTree.PARENT_KEY] = par_key
+        if old_par != par_key:
+            if self._unlink(key, old_par):
+                self._link(key, par_key)
+            self._emit("reparent", key, FlatTree.PARENT_KEY, old_par, par_key)
+
+    def reparent_many(self, parents: Dict[str, Optional[str]]) -> None:
+        """
+        Set the parents of many nodes at once, e.g., to move tens of
+        thousands of nodes. `parents` maps node keys to the keys of their
+        new parents (None to make them roots). The nodes are appended to the
+        end of the children of their new parents, in the order of
+        `parents`, even if their parent does not change.
+
+        The whole mapping is checked for cycles once, before anything is
+        modified, and the index is updated in a single pass over the old
+        and new parents, so this is O(m + s + h), where m is the number of
+        nodes moved, s is the number of their old siblings and h is the
+        number of ancestors visited by the cycle check.
+
+        :param parents: The mapping from node keys to new parent keys.
+        :raises KeyError: If a node is not found in the tree.
+        :raises ValueError: If the new parents would create a cycle. Nothing
+                            is modified in that case.
+        """
+        self._check_writable()
+        old_parents = {}
+        for key in parents:
+            old_parents[key] = FlatTree._parent_of(dict.__getitem__(self, key))
+
+        def _parent_of(key):
+            value = dict.get(self, key, FlatTree._MISSING)
+            return value if value is FlatTree._MISSING else FlatTree._parent_of(value)
+
+        FlatTree._check_acyclic(parents, _parent_of)
+
+        for key, par_key in parents.items():
+            self._record(key)
+            dict.__getitem__(self, key)[FlatTree.PARENT_KEY] = par_key
+
+        self._version += 1
+        index = self._own_index()
+        moved = set(parents)
+        removed = 0
+        for par_key in set(old_parents.values()):
+            old_siblings = index.get(par_key, ())
+            siblings = [k for k in old_siblings if k not in moved]
+            removed += len(old_siblings) - len(siblings)
+            if siblings:
+                index[par_key] = siblings
+            else:
+                index.pop(par_key, None)
+        if removed != len(moved):
+            # the index is stale, see `_unlink`
+            self.reindex()
+        else:
+            for key, par_key in parents.items():
+                index.setdefault(par_key, []).append(key)
+
+        if self._journal is not None:
+            for key, par_key in parents.items():
+                if old_parents[key] != par_key:
+                    self._emit("reparent", key, FlatTree.PARENT_KEY,
+                               old_parents[key], par_key)
+
+    @staticmethod
+    def _check_acyclic(parents: Dict[str, Optional[str]],
+                       parent_of: Callable[[str], Any]) -> None:
+        """
+        Check that re-parenting the nodes in `parents` (see `reparent_many`)
+        does not create a cycle, by following the new parent links up from
+        each moved node until a root, a missing key or a node already known
+        to be acyclic, so each node is visited at most once.
+
+        :param parents: The mapping from node keys to new parent keys.
+        :param parent_of: Get the current parent key of a node, or
+                          `FlatTree._MISSING` if it is not a node.
+        :raises ValueError: If there would be a cycle.
+        """
+        acyclic = set()
+        for key in parents:
+            path = []
+            on_path = set()
+            cur = key
+            while cur is not None and cur not in acyclic:
+                if cur in on_path:
+                    raise ValueError(f"Re-parenting {key!r} creates a cycle")
+                path.append(cur)
+                on_path.add(cur)
+                cur = parents[cur] if cur in parents else parent_of(cur)
+                if cur is FlatTree._MISSING:
+                    break
+            acyclic.update(path)
 
     def unique_keys(self) -> List[str]:
         """
@@ -71,14 +672,24 @@ class FlatTree(dict):
 
         :return: List of unique keys in the tree.
         """
-        keys = [FlatTree.DETACHED_KEY]
-        keys += list(self.keys())
-        keys += [
-            v.get(FlatTree.PARENT_KEY)
-            for v in self.values()
-            if v.get(FlatTree.PARENT_KEY) is not None
-        ]
-        return list(set(keys))
+        keys = set(self.keys())
+        keys.update(self._children.keys())
+        keys.discard(None)
+        keys.add(FlatTree.DETACHED_KEY)
+        return list(keys)
+
+    def _is_known(self, key: Optional[str]) -> bool:
+        """
+        Check in O(1) whether `key` is one of `unique_keys()`.
+
+        :param key: The key to check.
+        :return: True if the key is a node key, a parent key or the detached
+                 key, False otherwise.
+        """
+        if key is None:
+            return False
+        return (key in self or key in self._children
+                or key == FlatTree.DETACHED_KEY)
 
     def child_keys(self, key: str) -> List[str]:
         """
@@ -88,10 +699,10 @@ class FlatTree(dict):
         :return: List of keys of the children of the node.
         """
 
-        if key not in self.unique_keys():
+        if not self._is_known(key):
             raise KeyError(f"Key not found: {key!r}")
 
-        return [k for k, v in self.items() if v.get(FlatTree.PARENT_KEY) == key]
+        return list(self._children.get(key, []))
 
     def detach(self, key: str) -> "FlatTreeNode":
         """
@@ -104,7 +715,7 @@ class FlatTree(dict):
         """
         if key not in self:
             raise KeyError(f"Node not found: {key!r}")
-        self[key][FlatTree.PARENT_KEY] = FlatTree.DETACHED_KEY
+        self.reparent(key, FlatTree.DETACHED_KEY)
         return self.node(key)
 
     def prune(self, node: Union[str, "FlatTreeNode"]) -> List[str]:
@@ -131,8 +742,82 @@ class FlatTree(dict):
         utils.visit(node=node, func=_prune, order="post")
         return pruned
 
+    def graft(self, key: str, par_key: Optional[str],
+              source: Optional[Any] = None,
+              rename: Union[None, str, Dict[str, str], Callable[[str], str]] = None,
+              deep: bool = False) -> str:
+        """
+        Copy the subtree rooted at the node with key `key` in `source` (this
+        tree by default) as a child of the node with key `par_key` in this
+        tree, e.g., to copy a part of the tree elsewhere in the same tree.
+
+        The subtree is copied in a single pass, in O(subtree size): each node
+        value is copied once, and inserted with its new parent key. The keys
+        of the copies are given by `rename`:
+
+        - None: the same keys (which must not already be in this tree).
+        - A string: the keys prefixed with the string.
+        - A dictionary: the keys it maps, and the same keys otherwise.
+        - A callable: the key it returns for each key.
+
+        :param key: The key of the root of the subtree to copy.
+        :param par_key: The key of the new parent (None to make the copy a
+                        root).
+        :param source: The tree to copy from (any tree with `child_keys`,
+                       e.g., a `FlatTree` or `SqliteFlatTree`). Defaults to
+                       this tree.
+        :param rename: How to map the keys of the copied nodes (see above).
+        :param deep: If True, deep copy the payloads. Otherwise, the copies
+                     share the payload values (the node values themselves are
+                     always new dictionaries).
+        :return: The key of the copy of the root of the subtree.
+        :raises KeyError: If `key` is not a node in `source`, or `par_key` is
+                          not a node in this tree.
+        :raises ValueError: If a new key is already in this tree, or two
+                            nodes are mapped to the same key. Nothing is
+                            copied in that case.
+        """
+        if source is None:
+            source = self
+        if key not in source:
+            raise KeyError(f"Node not found: {key!r}")
+        if par_key is not None and par_key not in self:
+            raise KeyError(f"Node not found: {par_key!r}")
+
+        if rename is None:
+            new_key = lambda k: k
+        elif isinstance(rename, str):
+            new_key = lambda k: rename + k
+        elif isinstance(rename, dict):
+            new_key = lambda k: rename.get(k, k)
+        else:
+            new_key = rename
+
+        # collect the subtree in pre-order, so parents are inserted first
+        keys = []
+        stack = [key]
+        while stack:
+            k = stack.pop()
+            keys.append(k)
+            stack.extend(reversed(source.child_keys(k)))
+
+        new_keys = {k: new_key(k) for k in keys}
+        if len(set(new_keys.values())) != len(keys):
+            raise ValueError("Two nodes are mapped to the same key")
+        for k in new_keys.values():
+            if k in self:
+                raise ValueError(f"Node {k!r} already exists in the tree")
+
+        for k in keys:
+            value = source[k]
+            value = deepcopy(value) if deep else dict(value)
+            value[FlatTree.PARENT_KEY] = (
+                par_key if k == key else new_keys[FlatTree._parent_of(value)])
+            self[new_keys[k]] = value
+        return new_keys[key]
+
     @staticmethod
-    def check_valid(tree) -> None:
+    def check_valid(tree, collect: bool = False) -> Optional[List[dict]]:
         """
         Validate the tree structure to ensure the structural integrity of the tree.
 
@@ -142,43 +827,91 @@ class FlatTree(dict):
          2) All keys (unique node identifiers) map to dictionary values.
          3) All nodes have a parent key that is either None or a valid key
             in the tree.
+         4) There is at most one root node.
 
         Note: This function ignores detached nodes, since they are not part of
         the tree structure and represent a separate tree structure rooted
         under `FlatTree.DETACHED_KEY`.
 
-        Raises a ValueError if the tree structure is invalid.
+        The check is a single iterative pass over the nodes in O(n): we follow
+        the parent keys up from each node, marking nodes as in progress (gray)
+        while on the current path and as done (black) afterwards, so that every
+        node is walked over once, and reaching a gray node means we found a
+        cycle.
+
+        By default, the first violation raises an exception: a ValueError for
+        cycles, non-dictionary nodes and multiple roots, and a KeyError for
+        parent keys that are not in the tree. If `collect` is True, we
+        instead report every violation, as a list of dictionaries of the form::
+
+            {"error": "cycle", "keys": [...], "message": "..."}
+
+        where `error` is one of `"invalid_node"`, `"missing_parent"`,
+        `"cycle"` or `"multiple_roots"`, and `keys` are the keys involved.
+
+        :param tree: The tree (a mapping in the flat tree format) to validate.
+        :param collect: If True, collect all the violations instead of raising
+                        an exception at the first one.
+        :return: The list of violations if `collect` is True (empty if the
+                 tree is valid), otherwise None.
         """
+        violations = []
 
-        def _check_cycle(key, visited):
-            if key in visited:
-                raise ValueError(f"Cycle detected: {visited}")
-            visited.add(key)
-            par_key = tree[key].get(FlatTree.PARENT_KEY, None)
-            if par_key is not None and par_key != FlatTree.DETACHED_KEY:
-                _check_cycle(par_key, visited)
+        def _violation(error, exc_type, message, keys):
+            if not collect:
+                raise exc_type(message)
+            violations.append({"error": error, "keys": keys, "message": message})
 
-        root_count = 0
+        GRAY, BLACK = 1, 2
+        color = {}
+        roots = []
         for key, value in tree.items():
             if not isinstance(value, dict):
-                raise ValueError(
-                    f"Node {key!r} does not have dictionary: {value=}")
+                _violation("invalid_node", ValueError,
+                           f"Node {key!r} does not have dictionary: {value=}",
+                           [key])
+                continue
 
             par_key = value.get(FlatTree.PARENT_KEY)
             if par_key == FlatTree.DETACHED_KEY:
                 continue
 
             if par_key is None:
-                root_count = root_count + 1
-                if root_count > 1:
-                    raise ValueError(
-                        "Multiple root nodes found in tree: {root_count}")
+                roots.append(key)
+                if len(roots) == 2 and not collect:
+                    _violation("multiple_roots", ValueError,
+                               f"Multiple root nodes found in tree: {roots}",
+                               roots)
 
             if par_key is not None and par_key not in tree:
-                raise KeyError(
-                    f"Parent {par_key!r} not in tree for node {key!r}")
+                _violation("missing_parent", KeyError,
+                           f"Parent {par_key!r} not in tree for node {key!r}",
+                           [key, par_key])
+
+            path = []
+            cur = key
+            while cur not in color:
+                color[cur] = GRAY
+                path.append(cur)
+                cur_value = tree[cur]
+                if not isinstance(cur_value, dict):
+                    break
+                cur = cur_value.get(FlatTree.PARENT_KEY)
+                if cur is None or cur == FlatTree.DETACHED_KEY or cur not in tree:
+                    break
+            else:
+                if color[cur] == GRAY:
+                    cycle = path[path.index(cur):]
+                    _violation("cycle", ValueError,
+                               f"Cycle detected: {cycle}", cycle)
+            for k in path:
+                color[k] = BLACK
+
+        if len(roots) > 1 and collect:
+            _violation("multiple_roots", ValueError,
+                       f"Multiple root nodes found in tree: {roots}", roots)
 
-            _check_cycle(key, set())
+        return violations if collect else None
 
     def node(self, name: str) -> "FlatTreeNode":
         """
@@ -198,7 +931,7 @@ class FlatTree(dict):
         """
         from .flattree_node import FlatTreeNode
 
-        if name not in self.unique_keys():
+        if not self._is_known(name):
             raise KeyError(f"Key not found: {name!r}")
 
         return FlatTreeNode.proxy(
@@ -215,12 +948,12 @@ class FlatTree(dict):
         """
         from .flattree_node import FlatTreeNode
 
-        if name not in self.unique_keys():
-            raise KeyError(f"Name (unique key) not found: {name!r}")
-
         if name is None:
             name = self.root_key
 
+        if not self._is_known(name):
+            raise KeyError(f"Name (unique key) not found: {name!r}")
+
         return FlatTreeNode.proxy(tree=self, node_key=name, root_key=name)
 
     @property
@@ -240,13 +973,30 @@ class FlatTree(dict):
 
         :return: The key of the root node.
         """
-        # find the first node without a parent key or a parent key
-        # that is None
-        for key, value in self.items():
-            if value.get(FlatTree.PARENT_KEY) is None:
-                return key
-            
-        raise ValueError("No root node found in tree")
+        roots = self._children.get(None)
+        if not roots:
+            raise ValueError("No root node found in tree")
+        return roots[0]
+
+    @property
+    def root_keys(self) -> List[str]:
+        """
+        Retrieve the keys of all the root nodes (nodes without a parent key or
+        with a parent key that is None). If there is more than one, the
+        structure is a forest.
+
+        :return: The keys of the root nodes.
+        """
+        return list(self._children.get(None, []))
+
+    @property
+    def forest(self) -> List["FlatTreeNode"]:
+        """
+        Retrieve the trees of the forest, one subtree per root node.
+
+        :return: List of subtrees rooted at the root nodes.
+        """
+        return [self.subtree(key) for key in self.root_keys]
     
     @property
     def parent(self) -> "FlatTreeNode":
@@ -1,12 +1,22 @@
 import collections.abc
-import uuid
 from typing import Any, Dict, Iterator, List, Optional
 from copy import deepcopy
 from AlgoTree.flattree import FlatTree
 from AlgoTree.utils import is_descendant
+from AlgoTree.payload_view import PayloadView
+
+_HIDDEN = (FlatTree.PARENT_KEY,)
+
 
 class FlatTreeNode(collections.abc.MutableMapping):
-    __slots__ = ("_tree", "_key", "_root_key")
+    __slots__ = ("_tree", "_key", "_root_key", "__weakref__")
+
+    structural_eq = False
+    """
+    If False (the default), nodes compare equal only if they are in the same
+    tree object, so that equality, `in` tests and sets of nodes are O(1). If
+    True, nodes in different tree objects with equal contents compare equal.
+    """
 
     def __deepcopy__(self, memo):
         """
@@ -31,25 +41,49 @@ class FlatTreeNode(collections.abc.MutableMapping):
         the parent to be set to a new parent node to facilitate flexible
         cloning of nodes into new tree structures.
 
+        The subtree is cloned in a single pass (see `FlatTree.graft`), with
+        deep copies of the payloads.
+
         :return: A new node (or subtree rooted at the node if `clone_children`
                  is True)
         """
-        new_node = FlatTreeNode.__new__(FlatTreeNode)
         if parent is None:
-            new_node._tree = FlatTree({ self._key: deepcopy(self._tree[self._key]) })
-            new_node._root_key = self._key
+            tree = FlatTree()
+            root_key = self._key
         else:
             if self._key in parent._tree:
                 raise ValueError(f"Node {self} already exists in the tree")
-            new_node._tree = parent._tree
-            new_node._tree[self._key] = deepcopy(self._tree[self._key])
-            new_node._root_key = parent._root_key
+            tree = parent._tree
+            root_key = parent._root_key
 
         if clone_children:
-            for child in self.children:
-                child.clone(parent=new_node, clone_children=True)
-        new_node._key = self._key
-        return new_node
+            tree.graft(self._key, None if parent is None else parent._key,
+                       source=self._tree, deep=True)
+        else:
+            value = deepcopy(self._tree[self._key])
+            value[FlatTree.PARENT_KEY] = None if parent is None else parent._key
+            tree[self._key] = value
+        return FlatTreeNode.proxy(tree=tree, node_key=self._key,
+                                  root_key=root_key)
+
+    def graft(self, node: "FlatTreeNode", rename=None,
+              deep: bool = False) -> "FlatTreeNode":
+        """
+        Copy the subtree rooted at `node`, which may be in this tree or in
+        another one, as a child of this node. See `FlatTree.graft` for
+        `rename` and `deep`.
+
+        :param node: The root of the subtree to copy.
+        :param rename: How to map the keys of the copied nodes.
+        :param deep: If True, deep copy the payloads.
+        :return: The copy of `node`, in the context of this subtree.
+        """
+        if self._key not in self._tree:
+            raise TypeError(f"{self._key} is an immutable logical root")
+        key = self._tree.graft(node._key, self._key, source=node._tree,
+                               rename=rename, deep=deep)
+        return FlatTreeNode.proxy(tree=self._tree, node_key=key,
+                                  root_key=self._root_key)
 
     @classmethod
     def proxy(
@@ -63,16 +97,28 @@ class FlatTreeNode(collections.abc.MutableMapping):
         with caution. For instance, if `node_key` is not a descendent of
         `root_key`, the proxy node will not behave as expected.
 
+        The proxy is constructed without going through `__init__`. If the
+        tree has a proxy cache (see `FlatTree.enable_proxy_cache`), a live
+        proxy for the same `(node_key, root_key)` is returned instead of a
+        new one.
+
         :param tree: The tree in which the proxy node exists (or logically exists).
         :param node_key: The key of the node.
         :param root_key: The key of the (logical) root node.
         """
-        node = cls()
-        node._tree = tree
-        node._key = node_key
         if root_key is None:
             root_key = node_key
+        cache = getattr(tree, "_proxies", None)
+        if cache is not None:
+            node = cache.get((node_key, root_key))
+            if node is not None and node.__class__ is cls:
+                return node
+        node = cls.__new__(cls)
+        node._tree = tree
+        node._key = node_key
         node._root_key = root_key
+        if cache is not None:
+            cache[node_key, root_key] = node
         return node
 
     def __init__(
@@ -84,7 +130,7 @@ class FlatTreeNode(collections.abc.MutableMapping):
         **kwargs,
     ):
         """
-        Create a new node. If the key is None, a UUID is generated.
+        Create a new node. If the key is None, a new key is allocated.
 
         If a parent is provided, the node is created as a child of the parent.
         Otherwise, we create a new tree and it will be the single child of a
@@ -94,27 +140,34 @@ class FlatTreeNode(collections.abc.MutableMapping):
         FlatTree may be accessed via the `tree` property.
 
         :param parent: The parent node. If None, new tree created.
-        :param name: The unique name (key) for the node. If None, UUID generated.
+        :param name: The unique name (key) for the node. If None, a key is
+                     allocated by the `key_allocator` of the tree (a UUID by
+                     default, see `AlgoTree.key_allocator`).
         :param args: Positional arguments for the node.
         :param kwargs: Additional attributes for the node.
         """
-        self._key = str(uuid.uuid4()) if name is None else name
         if parent is not None:
             if children is not None:
                 raise ValueError("Cannot specify both parent and children.")
             self._tree = parent._tree
+        elif children is not None and len(children) > 0:
+            self._tree = children[0]._tree
+        else:
+            self._tree = FlatTree()
+        self._key = (self._tree.key_allocator(self._tree)
+                     if name is None else name)
+
+        if parent is not None:
             if self._key in self._tree:
                 raise KeyError(f"key already exists in the tree: {self._key}")
             kwargs[FlatTree.PARENT_KEY] = parent._key
             self._root_key = parent._root_key
         elif children is not None and len(children) > 0:
-            self._tree = children[0]._tree
             if self._key in self._tree:
                 raise KeyError(f"key already exists in the tree: {self._key}")
             self._root_key = children[0]._root_key
             self.children = children
         else:
-            self._tree = FlatTree()
             self._root_key = self._key
             if FlatTree.PARENT_KEY in kwargs:
                 del kwargs[FlatTree.PARENT_KEY]
@@ -166,12 +219,23 @@ class FlatTreeNode(collections.abc.MutableMapping):
         if self._key not in self._tree:
             raise ValueError(f"{self._key} is an immutable logical root")
 
-        if node._tree != self._tree:
+        if node._tree is not self._tree:
             if self._key in node._tree:
                 raise ValueError(f"Node {self} already exists in the tree")
             node._tree[self._key] = self._tree[self._key].copy()
 
-        node._tree[self._key][FlatTree.PARENT_KEY] = node._key
+        node._tree.reparent(self._key, node._key)
+
+    @property
+    def structure_version(self) -> int:
+        """
+        Get a counter that changes whenever the structure of the underlying
+        tree changes (nodes added, removed or re-parented). Indexes over the
+        tree use it to detect that they are stale.
+
+        :return: The structure version of the tree.
+        """
+        return self._tree._version
 
     @property
     def tree(self) -> FlatTree:
@@ -199,16 +263,31 @@ class FlatTreeNode(collections.abc.MutableMapping):
         if self._key not in self._tree:
             raise TypeError(f"{self._key} is an immutable logical root")
 
-        self._tree[self._key][key] = value
+        if key == FlatTree.PARENT_KEY:
+            self._tree.reparent(self._key, value)
+        else:
+            self._tree._record(self._key)
+            data = self._tree[self._key]
+            old = data.get(key)
+            data[key] = value
+            self._tree._emit("set", self._key, key, old, value)
 
     def __delitem__(self, key) -> None:
         if self._key not in self._tree:
             raise TypeError(f"{self._key} is an immutable logical root")
 
-        del self._tree[self._key][key]
+        if key == FlatTree.PARENT_KEY:
+            self._tree.reparent(self._key, None)
+        self._tree._record(self._key)
+        data = self._tree[self._key]
+        old = data[key]
+        del data[key]
+        if key != FlatTree.PARENT_KEY:
+            self._tree._emit("unset", self._key, key, old)
 
     def __getattr__(self, key) -> Any:
-        if key in ["name", "parent", "root", "tree", "payload", "children"]:
+        if key in ["name", "parent", "root", "tree", "payload", "payload_view",
+                   "children", "structure_version"]:
             return object.__getattribute__(self, key)
         if key in self:
             return self[key]
@@ -236,6 +315,19 @@ class FlatTreeNode(collections.abc.MutableMapping):
         data.pop(FlatTree.PARENT_KEY, None)
         return data
 
+    @property
+    def payload_view(self) -> PayloadView:
+        """
+        Get a read-only view of the payload data of the node, without
+        copying it. See `PayloadView`. The view reads through to the current
+        node value; if the node value is replaced (e.g., by the `payload`
+        setter, or a copy-on-write in a forked tree), get a new view.
+
+        :return: The payload view.
+        """
+        data = self._tree.get(self._key)
+        return PayloadView({} if data is None else data, _HIDDEN)
+
     @payload.setter
     def payload(self, data: Dict) -> None:
         """
@@ -260,7 +352,7 @@ class FlatTreeNode(collections.abc.MutableMapping):
         return iter([] if self._key not in self._tree else self._tree[self._key])
 
     def __len__(self) -> int:
-        return len(self.payload)
+        return len(self.payload_view)
 
     def add_child(self, name: Optional[str] = None, *args, **kwargs) -> "FlatTreeNode":
         """
@@ -271,6 +363,31 @@ class FlatTreeNode(collections.abc.MutableMapping):
         """
         return FlatTreeNode(name=name, parent=self, *args, **kwargs)
 
+    def _descendants(self) -> Optional[List["FlatTreeNode"]]:
+        """
+        Hook for `utils.descendants`: get the descendants in pre-order with
+        a single query if the tree supports it (`SqliteFlatTree`), or None
+        to fall back to visiting the children one node at a time.
+        """
+        query = getattr(self._tree, "descendant_keys", None)
+        if query is None:
+            return None
+        return [
+            FlatTreeNode.proxy(tree=self._tree, node_key=key, root_key=self._root_key)
+            for key in query(self._key, order="pre")
+        ]
+
+    def _size(self) -> Optional[int]:
+        """
+        Hook for `utils.size`: get the size of the subtree with a single
+        query if the tree supports it (`SqliteFlatTree`), or None.
+        """
+        query = getattr(self._tree, "subtree_size", None)
+        if query is None:
+            return None
+        # the node itself is counted even if it is a logical node
+        return query(self._key) + (self._key not in self._tree)
+
     @property
     def children(self) -> List["FlatTreeNode"]:
         """
@@ -292,23 +409,62 @@ class FlatTreeNode(collections.abc.MutableMapping):
 
         :param nodes: The new children nodes.
         """
-        for node in self.children:
-            node.detach()
-
         if nodes is None:
-            return
-
-        if not isinstance(nodes, list):
+            nodes = []
+        elif not isinstance(nodes, list):
             nodes = [nodes]
+
+        # move the nodes of this tree in one `reparent_many`; nodes of other
+        # trees are copied over one at a time, see the `parent` setter
+        old_keys = (self._tree.child_keys(self._key)
+                    if self._tree._is_known(self._key) else [])
+        parents = {key: FlatTree.DETACHED_KEY for key in old_keys}
+        for node in nodes:
+            if node._tree is self._tree:
+                parents.pop(node._key, None)
         for node in nodes:
-            node.parent = self
+            if node._tree is self._tree:
+                parents[node._key] = self._key
+        self._tree.reparent_many(parents)
+        for node in nodes:
+            if node._tree is not self._tree:
+                node.parent = self
 
     def __eq__(self, other):
+        """
+        Two nodes are equal if they are the same node in the same (sub)tree:
+        they have the same key and root key, and they are in the same tree
+        object, which is checked in O(1). If `structural_eq` is True, nodes
+        in different tree objects with equal contents are also equal (which
+        compares the whole trees); see `structurally_equal`.
+        """
+        if not isinstance(other, FlatTreeNode):
+            return False
+        if self._key != other._key or self._root_key != other._root_key:
+            return False
+        if self._tree is other._tree:
+            return True
+        return self.structural_eq and self._tree == other._tree
+
+    def __hash__(self) -> int:
+        # consistent with both identity and structural equality
+        return hash((self._key, self._root_key))
+
+    def structurally_equal(self, other: "FlatTreeNode") -> bool:
+        """
+        Check if `other` is the same node in the same (sub)tree, where the
+        trees may be different objects with equal contents, e.g., a node and
+        its counterpart in a deep copy of the tree. This compares the whole
+        trees.
+
+        :param other: The other node.
+        :return: True if the nodes are structurally equal.
+        """
         if not isinstance(other, FlatTreeNode):
             return False
         return (self._key == other._key and
                 self._root_key == other._root_key and
-                self._tree == other._tree)
+                (self._tree is other._tree or self._tree == other._tree))
 
     def node(self, name: Optional[str] = None) -> "FlatTreeNode":
         """
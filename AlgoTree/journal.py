@@ -0,0 +1,141 @@
+"""
+Mutation Journal
+~~~~~~~~~~~~~~~~
+
+This module provides an append-only journal of the mutations of a
+`FlatTree`, so that data derived from the tree (search indexes, rendered
+views, aggregates, ...) can be updated incrementally from the changes
+instead of being recomputed from scratch after every edit.
+
+The journal is opt-in::
+
+    journal = tree.enable_journal()
+    journal.subscribe(lambda change: print(change))
+    tree.node("a")["x"] = 1
+    # Change(seq=1, op='set', key='a', field='x', old=None, new=1)
+
+Consumers either subscribe to be called with every change as it is
+published, or poll with `since(seq)` for the changes after the last sequence
+number they have seen.
+"""
+
+import itertools
+from collections import deque
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional
+
+
+class Change(NamedTuple):
+    """
+    A mutation of a tree. `op` is one of:
+
+    - "insert": node `key` was added with value `new`.
+    - "delete": node `key` with value `old` was removed.
+    - "replace": the value of node `key` was replaced, from `old` to `new`
+      (which may also change its parent).
+    - "reparent": the parent of node `key` changed from `old` to `new`.
+    - "set": payload field `field` of node `key` was set from `old` (None
+      if it was not set) to `new`.
+    - "unset": payload field `field` of node `key`, with value `old`, was
+      removed.
+
+    Node values (`old` and `new` of "insert", "delete" and "replace") are
+    copies of the values at the time of the change.
+    """
+
+    seq: int
+    op: str
+    key: str
+    field: Optional[str]
+    old: Any
+    new: Any
+
+
+class Journal:
+    """
+    An append-only journal of the mutations of a tree, with monotonically
+    increasing sequence numbers (starting at 1) and subscriber callbacks.
+
+    Changes made inside a `FlatTree.batch` are published (numbered, stored
+    and passed to the subscribers) when the batch succeeds, and discarded if
+    it is rolled back.
+    """
+
+    def __init__(self, maxlen: Optional[int] = None):
+        """
+        :param maxlen: The maximum number of changes to keep. Older changes
+                       are dropped (None to keep all of them).
+        """
+        self._changes: deque = deque(maxlen=maxlen)
+        self._subscribers: List[Callable[[Change], None]] = []
+        self._pending: Optional[List[tuple]] = None
+        self.seq = 0
+
+    def subscribe(self, callback: Callable[[Change], None]) -> Callable[[Change], None]:
+        """
+        Call `callback` with every change published from now on.
+
+        :param callback: The callback.
+        :return: The callback (so this can be used as a decorator).
+        """
+        self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[Change], None]) -> None:
+        """
+        Stop calling `callback`.
+
+        :param callback: The callback.
+        :raises ValueError: If the callback is not subscribed.
+        """
+        self._subscribers.remove(callback)
+
+    def since(self, seq: int) -> List[Change]:
+        """
+        Get the changes with a sequence number greater than `seq`.
+
+        :param seq: The last sequence number the consumer has seen (0 for
+                    all of the changes).
+        :return: The list of changes.
+        :raises ValueError: If some of those changes were already dropped
+                            (see `maxlen`), in which case the consumer has
+                            to rebuild from the tree.
+        """
+        first = self._changes[0].seq if self._changes else self.seq + 1
+        if seq < first - 1:
+            raise ValueError(f"Changes after {seq} were dropped from the journal")
+        return list(itertools.islice(self._changes, max(seq - first + 1, 0), None))
+
+    def __iter__(self) -> Iterator[Change]:
+        return iter(self._changes)
+
+    def __len__(self) -> int:
+        return len(self._changes)
+
+    def __repr__(self) -> str:
+        return f"Journal(seq={self.seq}, size={len(self)})"
+
+    def _append(self, op: str, key: str, field: Optional[str],
+                old: Any, new: Any) -> None:
+        if self._pending is not None:
+            self._pending.append((op, key, field, old, new))
+        else:
+            self._publish(op, key, field, old, new)
+
+    def _publish(self, op: str, key: str, field: Optional[str],
+                 old: Any, new: Any) -> None:
+        self.seq += 1
+        change = Change(self.seq, op, key, field, old, new)
+        self._changes.append(change)
+        for callback in list(self._subscribers):
+            callback(change)
+
+    def _begin(self) -> None:
+        self._pending = []
+
+    def _commit(self) -> None:
+        pending, self._pending = self._pending, None
+        for args in pending:
+            self._publish(*args)
+
+    def _rollback(self) -> None:
+        self._pending = None
@@ -0,0 +1,110 @@
+"""
+Key Allocators
+~~~~~~~~~~~~~~
+
+This module provides strategies for allocating the keys of anonymous nodes
+(nodes created without a name), e.g., by `FlatTreeNode(parent=...)`,
+`TreeConverter` and `paths_to_tree`.
+
+An allocator is called with the tree the key is for (or None) and returns a
+new key that is not already in the tree. The allocator of a tree is its
+`key_allocator` attribute, which may be set on the class, e.g.,
+`FlatTree.key_allocator = CounterKeys()`, or on a single tree.
+"""
+
+import itertools
+import uuid
+from typing import Any, Optional
+
+
+class KeyAllocator:
+    """
+    Base class of the key allocators.
+    """
+
+    def __call__(self, tree: Optional[Any] = None) -> str:
+        """
+        Allocate a new key.
+
+        :param tree: The tree (a mapping from keys to nodes) the key is for,
+                     or None.
+        :return: A key that is not in `tree`.
+        """
+        raise NotImplementedError
+
+
+class UuidKeys(KeyAllocator):
+    """
+    Allocate random UUID4 keys, e.g., "1b4e28ba-2fa1-11d2-883f-0016d3cca427".
+    They are unique across trees and processes, but slow to generate and
+    large. This is the default.
+    """
+
+    def __call__(self, tree: Optional[Any] = None) -> str:
+        return str(uuid.uuid4())
+
+    def __repr__(self) -> str:
+        return "UuidKeys()"
+
+
+class CounterKeys(KeyAllocator):
+    """
+    Allocate compact keys from a per-tree counter, in hexadecimal: "0", "1",
+    ..., "a", "b", ..., "10", ... (with an optional prefix). Keys that are
+    already in the tree are skipped.
+
+    The counter is stored on the tree (or on the allocator if there is no
+    tree), so the keys are unique within a tree but not across trees: use
+    `PrefixKeys` or `UuidKeys` for nodes that are moved between trees.
+    """
+
+    def __init__(self, prefix: str = ""):
+        """
+        :param prefix: The prefix of the keys.
+        """
+        self.prefix = prefix
+
+    def __call__(self, tree: Optional[Any] = None) -> str:
+        state = getattr(tree, "__dict__", None)
+        if state is None:
+            state = self.__dict__
+        n = state.get("_key_counter", 0)
+        key = self.prefix + format(n, "x")
+        n += 1
+        if tree is not None:
+            while key in tree:
+                key = self.prefix + format(n, "x")
+                n += 1
+        state["_key_counter"] = n
+        return key
+
+    def __repr__(self) -> str:
+        return f"CounterKeys(prefix={self.prefix!r})"
+
+
+class PrefixKeys(KeyAllocator):
+    """
+    Allocate the keys `prefix + "0"`, `prefix + "1"`, ... from a counter of
+    the allocator. Keys that are already in the tree are skipped.
+
+    Since the counter is shared by every tree the allocator is used for, the
+    keys do not collide across those trees (e.g., when grafting one into
+    another), and keys with different prefixes never collide.
+    """
+
+    def __init__(self, prefix: str):
+        """
+        :param prefix: The prefix of the keys.
+        """
+        self.prefix = prefix
+        self._counter = itertools.count()
+
+    def __call__(self, tree: Optional[Any] = None) -> str:
+        key = f"{self.prefix}{next(self._counter)}"
+        if tree is not None:
+            while key in tree:
+                key = f"{self.prefix}{next(self._counter)}"
+        return key
+
+    def __repr__(self) -> str:
+        return f"PrefixKeys(prefix={self.prefix!r})"
@@ -0,0 +1,530 @@
+import collections.abc
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+from AlgoTree.flattree import FlatTree
+
+_SWAP = sys.byteorder != "little"
+"""
+Whether the integer arrays must be byte-swapped to and from the
+little-endian file format, i.e., whether this is a big-endian machine.
+"""
+
+
+def _to_le(a: array) -> bytes:
+    if _SWAP:
+        a = array(a.typecode, a)
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_le(buf: memoryview, start: int, count: int,
+             typecode: str) -> memoryview:
+    view = buf[start:start + 8 * count].cast(typecode)
+    if not _SWAP:
+        return view
+    # the file is little-endian, so a big-endian machine has to copy
+    a = array(typecode, view)
+    view.release()
+    a.byteswap()
+    return memoryview(a)
+
+
+class MmapFlatTree(collections.abc.Mapping):
+    """
+    A read-only flat tree stored in a binary file and memory-mapped, so that
+    opening it does not parse or copy anything, navigation only touches the
+    pages it needs, and several processes reading the same file share the
+    operating system's page cache.
+
+    The file consists of a header followed by these sections, each aligned to
+    8 bytes (integers are little-endian on every machine; big-endian
+    machines byte-swap them when writing, and copy and byte-swap the integer
+    sections when opening, instead of mapping them)::
+
+        parent           int64[n]    id of the parent of each node (-1: none)
+        first_child      int64[n]    id of the first child of each node
+        num_children     int64[n]    number of children of each node
+        flags            uint8[n]    1 if the node is in the mapping, 0 if it
+                                     is a logical node (a parent key without
+                                     a node, e.g., `FlatTree.DETACHED_KEY`)
+        key_offsets      uint64[n+1] offsets of the keys in the key blob
+        key_blob         bytes       the UTF-8 encoded keys
+        payload_offsets  uint64[n+1] offsets of the payloads in the payload blob
+        payload_blob     bytes       the JSON encoded payloads
+        sorted_ids       int64[n]    the ids sorted by (UTF-8 encoded) key
+
+    Nodes are numbered in breadth-first order, so the children of a node
+    have consecutive ids. Keys are looked up with a binary search over the
+    sorted ids.
+
+    Write a file with `MmapFlatTree.write(path, tree)` and open it with
+    `MmapFlatTree(path)`. The tree implements the read-only part of the
+    `FlatTree` API (mapping access, `node`, `subtree`, `root`, `child_keys`,
+    ...), and `MmapFlatTreeNode` implements the node-centric API.
+    """
+
+    MAGIC = b"ALGOTREE"
+    VERSION = 1
+    _HEADER = struct.Struct("<8sIIQ9Q")
+    _SECTIONS = ("parent", "first_child", "num_children", "flags",
+                 "key_offsets", "key_blob", "payload_offsets",
+                 "payload_blob", "sorted_ids")
+
+    PARENT_KEY = FlatTree.PARENT_KEY
+    DETACHED_KEY = FlatTree.DETACHED_KEY
+
+    @staticmethod
+    def write(path: str, tree: Any) -> None:
+        """
+        Write a tree to a file in the binary format.
+
+        :param path: The path of the file to write.
+        :param tree: A mapping in the flat tree format (e.g., a `FlatTree`),
+                     or a `TreeNode`, which is converted to a `FlatTree`
+                     first (unnamed nodes get unique generated names).
+        :raises ValueError: If the tree contains a cycle.
+        """
+        from AlgoTree.treenode import TreeNode
+        if isinstance(tree, TreeNode):
+            from AlgoTree.flattree_node import FlatTreeNode
+            from AlgoTree.tree_converter import TreeConverter
+            tree = TreeConverter.convert(
+                tree, FlatTreeNode,
+                node_name=lambda n: str(n.name)).tree
+
+        children: Dict[Optional[str], List[str]] = {}
+        roots: List[str] = []
+        logical: Dict[str, None] = {}
+        for key, value in tree.items():
+            par_key = value.get(FlatTree.PARENT_KEY)
+            if par_key is None:
+                roots.append(key)
+            else:
+                children.setdefault(par_key, []).append(key)
+                if par_key not in tree:
+                    logical[par_key] = None
+        roots.extend(logical)
+
+        # breadth-first numbering, so that siblings are contiguous
+        order = list(roots)
+        ids = {key: i for i, key in enumerate(order)}
+        first_child = array("q")
+        num_children = array("q")
+        parent = array("q", [-1] * len(roots))
+        i = 0
+        while i < len(order):
+            kids = children.get(order[i], ())
+            first_child.append(len(order))
+            num_children.append(len(kids))
+            for kid in kids:
+                ids[kid] = len(order)
+                order.append(kid)
+                parent.append(i)
+            i += 1
+
+        n = len(order)
+        if n != len(tree) + len(logical):
+            raise ValueError(
+                "Cycle detected: some nodes are not reachable from a root")
+
+        flags = bytes(1 if key in tree else 0 for key in order)
+        encoded_keys = [key.encode("utf-8") for key in order]
+        sorted_ids = array("q", sorted(range(n), key=encoded_keys.__getitem__))
+
+        with open(path, "wb") as f:
+            offsets = [0] * len(MmapFlatTree._SECTIONS)
+            f.write(bytes(MmapFlatTree._HEADER.size))
+
+            def _section(index, data):
+                pos = f.tell()
+                pad = -pos % 8
+                f.write(bytes(pad))
+                offsets[index] = pos + pad
+                f.write(data)
+
+            def _blob(index, items):
+                # writes the blob and returns the offsets of its items
+                pos = f.tell()
+                pad = -pos % 8
+                f.write(bytes(pad))
+                offsets[index] = pos + pad
+                item_offsets = array("Q", [0])
+                size = 0
+                for item in items:
+                    f.write(item)
+                    size += len(item)
+                    item_offsets.append(size)
+                return item_offsets
+
+            _section(0, _to_le(parent))
+            _section(1, _to_le(first_child))
+            _section(2, _to_le(num_children))
+            _section(3, flags)
+            key_offsets = _blob(5, encoded_keys)
+            _section(4, _to_le(key_offsets))
+            payload_offsets = _blob(7, (
+                json.dumps({k: v for k, v in tree[key].items()
+                            if k != FlatTree.PARENT_KEY}).encode("utf-8")
+                if key in tree else b""
+                for key in order))
+            _section(6, _to_le(payload_offsets))
+            _section(8, _to_le(sorted_ids))
+
+            f.seek(0)
+            f.write(MmapFlatTree._HEADER.pack(
+                MmapFlatTree.MAGIC, MmapFlatTree.VERSION, 0, n, *offsets))
+
+    def __init__(self, path: str) -> None:
+        """
+        Open a tree file written with `MmapFlatTree.write`.
+
+        :param path: The path of the file.
+        :raises ValueError: If the file is not in the expected format.
+        """
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, n, *offsets = MmapFlatTree._HEADER.unpack_from(self._mmap)
+        if magic != MmapFlatTree.MAGIC or version != MmapFlatTree.VERSION:
+            self._mmap.close()
+            raise ValueError(f"Not a tree file (version {MmapFlatTree.VERSION}): {path!r}")
+
+        buf = memoryview(self._mmap)
+        self._buf = buf
+        self._n = n
+        sec = dict(zip(MmapFlatTree._SECTIONS, offsets))
+        self._parent = _from_le(buf, sec["parent"], n, "q")
+        self._first_child = _from_le(buf, sec["first_child"], n, "q")
+        self._num_children = _from_le(buf, sec["num_children"], n, "q")
+        self._flags = buf[sec["flags"]:sec["flags"] + n]
+        self._key_offsets = _from_le(buf, sec["key_offsets"], n + 1, "Q")
+        self._key_blob = sec["key_blob"]
+        self._payload_offsets = _from_le(buf, sec["payload_offsets"], n + 1, "Q")
+        self._payload_blob = sec["payload_blob"]
+        self._sorted_ids = _from_le(buf, sec["sorted_ids"], n, "q")
+        self._size = n - self._flags.tobytes().count(0)
+
+    def close(self) -> None:
+        """
+        Close the file. Nodes of the tree must not be used afterwards.
+        """
+        for view in (self._parent, self._first_child, self._num_children,
+                     self._flags, self._key_offsets, self._payload_offsets,
+                     self._sorted_ids, self._buf):
+            view.release()
+        self._mmap.close()
+
+    def __enter__(self) -> "MmapFlatTree":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _key_bytes(self, i: int) -> bytes:
+        start = self._key_blob + self._key_offsets[i]
+        return self._mmap[start:self._key_blob + self._key_offsets[i + 1]]
+
+    def _key(self, i: int) -> str:
+        return self._key_bytes(i).decode("utf-8")
+
+    def _find(self, key: Any) -> int:
+        """
+        Find the id of a key with a binary search over the sorted ids.
+
+        :return: The id, or -1 if the key is not in the file.
+        """
+        if not isinstance(key, str):
+            return -1
+        target = key.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(self._sorted_ids[mid]) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._n and self._key_bytes(self._sorted_ids[lo]) == target:
+            return self._sorted_ids[lo]
+        return -1
+
+    def _id(self, key: Optional[str]) -> int:
+        i = self._find(key)
+        if i == -1:
+            raise KeyError(f"Key not found: {key!r}")
+        return i
+
+    def _payload(self, i: int) -> dict:
+        if not self._flags[i]:
+            return {}
+        start = self._payload_blob + self._payload_offsets[i]
+        return json.loads(
+            self._mmap[start:self._payload_blob + self._payload_offsets[i + 1]])
+
+    def _child_ids(self, i: int) -> range:
+        first = self._first_child[i]
+        return range(first, first + self._num_children[i])
+
+    def __getitem__(self, key: str) -> dict:
+        i = self._find(key)
+        if i == -1 or not self._flags[i]:
+            raise KeyError(key)
+        value = self._payload(i)
+        p = self._parent[i]
+        value[MmapFlatTree.PARENT_KEY] = None if p == -1 else self._key(p)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._n):
+            if self._flags[i]:
+                yield self._key(i)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __contains__(self, key: Any) -> bool:
+        i = self._find(key)
+        return i != -1 and bool(self._flags[i])
+
+    def __repr__(self) -> str:
+        return f"MmapFlatTree({dict(self)})"
+
+    def unique_keys(self) -> List[str]:
+        """
+        Get the unique keys in the tree, including the parent keys without
+        corresponding nodes.
+
+        :return: List of unique keys in the tree.
+        """
+        keys = [self._key(i) for i in range(self._n)]
+        if self._find(MmapFlatTree.DETACHED_KEY) == -1:
+            keys.append(MmapFlatTree.DETACHED_KEY)
+        return keys
+
+    def child_keys(self, key: str) -> List[str]:
+        """
+        Get the children keys of a node with key `key`.
+
+        :param key: The key of the node.
+        :return: List of keys of the children of the node.
+        """
+        if key == MmapFlatTree.DETACHED_KEY and self._find(key) == -1:
+            return []
+        return [self._key(c) for c in self._child_ids(self._id(key))]
+
+    @property
+    def root_keys(self) -> List[str]:
+        """
+        Retrieve the keys of all the root nodes.
+
+        :return: The keys of the root nodes.
+        """
+        return [self._key(i) for i in range(self._n)
+                if self._parent[i] == -1 and self._flags[i]]
+
+    @property
+    def root_key(self) -> str:
+        """
+        Retrieve the key of the (first) root node.
+
+        :return: The key of the root node.
+        """
+        if self._n == 0 or self._parent[0] != -1 or not self._flags[0]:
+            raise ValueError("No root node found in tree")
+        return self._key(0)
+
+    def node(self, name: str) -> "MmapFlatTreeNode":
+        """
+        Get a proxy of the node with key `name`, in the context of the whole
+        tree. See `FlatTree.node`.
+
+        :param name: The unique key of the node.
+        :return: MmapFlatTreeNode proxy representing the node.
+        :raises KeyError: If the key is not found in the tree.
+        """
+        return MmapFlatTreeNode(self, self._id(name), self._id(self.root_key))
+
+    def subtree(self, name: Optional[str] = None) -> "MmapFlatTreeNode":
+        """
+        Get sub-tree rooted at the node with the name `name` with the current
+        node also set to the node with name `name`.
+
+        :param name: The unique key of the node (None for the root).
+        :return: MmapFlatTreeNode proxy representing the node.
+        :raises KeyError: If the key is not found in the tree.
+        """
+        i = self._id(self.root_key if name is None else name)
+        return MmapFlatTreeNode(self, i, i)
+
+    @property
+    def root(self) -> "MmapFlatTreeNode":
+        """
+        Retrieve the root of the tree.
+
+        :return: The root node.
+        """
+        return self.subtree(self.root_key)
+
+    @property
+    def children(self) -> List["MmapFlatTreeNode"]:
+        """
+        Retrieve the children of the root node.
+        """
+        return self.root.children
+
+    def to_flattree(self) -> FlatTree:
+        """
+        Load the tree into a `FlatTree`.
+
+        :return: A `FlatTree` with the same nodes.
+        """
+        return FlatTree(self.items())
+
+    def to_treenode(self) -> Any:
+        """
+        Load the tree rooted at `root_key` into a `TreeNode`.
+
+        :return: The root `TreeNode`.
+        """
+        from AlgoTree.treenode import TreeNode
+
+        root = TreeNode(self._payload(0), name=self.root_key)
+        q = deque([(0, root)])
+        while q:
+            i, node = q.popleft()
+            for c in self._child_ids(i):
+                q.append((c, TreeNode(self._payload(c), parent=node,
+                                      name=self._key(c))))
+        return root
+
+
+class MmapFlatTreeNode(collections.abc.Mapping):
+    """
+    A read-only node proxy for `MmapFlatTree`, with the node-centric API of
+    `FlatTreeNode`.
+    """
+
+    __slots__ = ("_tree", "_id", "_root_id")
+
+    def __init__(self, tree: MmapFlatTree, node_id: int, root_id: int):
+        """
+        Create a proxy for the node with id `node_id`, in the subtree rooted
+        at the node with id `root_id`.
+
+        :param tree: The tree the node belongs to.
+        :param node_id: The id of the node.
+        :param root_id: The id of the (logical) root node.
+        """
+        self._tree = tree
+        self._id = node_id
+        self._root_id = root_id
+
+    @property
+    def name(self) -> str:
+        """
+        Get the unique name of the node.
+        """
+        return self._tree._key(self._id)
+
+    @property
+    def tree(self) -> MmapFlatTree:
+        """
+        Get the underlying MmapFlatTree object.
+        """
+        return self._tree
+
+    @property
+    def structure_version(self) -> int:
+        """
+        The tree is read-only, so its structure never changes.
+        """
+        return 0
+
+    @property
+    def root(self) -> "MmapFlatTreeNode":
+        """
+        Get the root node of the subtree.
+        """
+        return MmapFlatTreeNode(self._tree, self._root_id, self._root_id)
+
+    @property
+    def parent(self) -> Optional["MmapFlatTreeNode"]:
+        """
+        Get the parent node of the node.
+        """
+        if self._id == self._root_id:
+            return None
+        p = self._tree._parent[self._id]
+        if p == -1:
+            return None
+        return MmapFlatTreeNode(self._tree, p, self._root_id)
+
+    @property
+    def children(self) -> List["MmapFlatTreeNode"]:
+        """
+        Get the children of the node.
+        """
+        return [MmapFlatTreeNode(self._tree, c, self._root_id)
+                for c in self._tree._child_ids(self._id)]
+
+    @property
+    def payload(self) -> Dict:
+        """
+        Get the payload data of the node.
+        """
+        return self._tree._payload(self._id)
+
+    def __getitem__(self, key) -> Any:
+        return self.payload[key]
+
+    def __getattr__(self, key) -> Any:
+        if key in ["name", "parent", "root", "tree", "payload", "children",
+                   "structure_version"] or key.startswith("_"):
+            return object.__getattribute__(self, key)
+        if key in self:
+            return self[key]
+        return None
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.payload)
+
+    def __len__(self) -> int:
+        return len(self.payload)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, MmapFlatTreeNode):
+            return False
+        return (self._tree is other._tree and self._id == other._id
+                and self._root_id == other._root_id)
+
+    def __hash__(self) -> int:
+        return hash((id(self._tree), self._id, self._root_id))
+
+    def __repr__(self) -> str:
+        par = self.parent
+        return f"{__class__.__name__}(name={self.name}, parent={None if par is None else par.name}, payload={self.payload}, root={self.root.name}, children={self._tree.child_keys(self.name)})"
+
+    def node(self, name: Optional[str] = None) -> "MmapFlatTreeNode":
+        """
+        Get the node with the given name, in the same subtree as this node.
+
+        :param name: The name of the node (None for the current node).
+        :return: The node.
+        """
+        if name is None:
+            return self
+        return MmapFlatTreeNode(self._tree, self._tree._id(name), self._root_id)
+
+    def subtree(self, name: Optional[str] = None) -> "MmapFlatTreeNode":
+        """
+        Get a subtree rooted at the node with the name `name`. If `name` is
+        None, the subtree is rooted at the current node.
+
+        :param name: The name of the root node.
+        :return: A subtree rooted at the given node.
+        """
+        i = self._id if name is None else self._tree._id(name)
+        return MmapFlatTreeNode(self._tree, i, i)
@@ -0,0 +1,67 @@
+import collections.abc
+from copy import deepcopy
+from typing import Any, Iterator, Mapping, Tuple
+
+
+class PayloadView(collections.abc.Mapping):
+    """
+    A read-only view of the payload of a node: the node's data minus its
+    structural keys (e.g., the parent key of a `FlatTree` node value, or the
+    children and name keys of a `TreeNode`).
+
+    The view does not copy the data. It reads through to the node, so it
+    reflects later changes to the node. Use `copy()` (or `dict(view)`) to get
+    an independent dictionary.
+    """
+
+    __slots__ = ("_data", "_hidden")
+
+    def __init__(self, data: Mapping, hidden: Tuple[str, ...] = ()):
+        """
+        :param data: The node data.
+        :param hidden: The structural keys to hide.
+        """
+        self._data = data
+        self._hidden = hidden
+
+    def __getitem__(self, key: Any) -> Any:
+        if key in self._hidden:
+            raise KeyError(key)
+        return self._data[key]
+
+    def __contains__(self, key: Any) -> bool:
+        return key not in self._hidden and key in self._data
+
+    def __iter__(self) -> Iterator[Any]:
+        hidden = self._hidden
+        return (k for k in self._data if k not in hidden)
+
+    def __len__(self) -> int:
+        data = self._data
+        return len(data) - sum(1 for k in self._hidden if k in data)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key in self._hidden:
+            return default
+        return self._data.get(key, default)
+
+    def copy(self) -> dict:
+        """
+        Get a shallow copy of the payload as a new dictionary.
+
+        :return: The dictionary.
+        """
+        hidden = self._hidden
+        return {k: v for k, v in self._data.items() if k not in hidden}
+
+    def __deepcopy__(self, memo) -> dict:
+        # a single pass, without an intermediate shallow copy
+        hidden = self._hidden
+        return {k: deepcopy(v, memo) for k, v in self._data.items()
+                if k not in hidden}
+
+    def __reduce__(self):
+        return (dict, (self.copy(),))
+
+    def __repr__(self) -> str:
+        return repr(self.copy())
@@ -44,6 +44,20 @@ class PrettyTree:
         self.marked_nodes = mark if mark is not None else []
         self.indent = indent
 
+    @staticmethod
+    def payload_details(node) -> str:
+        """
+        Node details that show the payload of a node, e.g.,
+        `PrettyTree(node_details=PrettyTree.payload_details)`. Nodes with a
+        `payload_view` property (see `PayloadView`) are read without copying
+        their payload.
+
+        :param node: The node.
+        :return: The payload of the node as a string.
+        """
+        view = getattr(node, "payload_view", None)
+        return str(node.payload if view is None else view)
+
     @staticmethod
     def mark(name: str, markers: List[str]) -> str:
         """
@@ -0,0 +1,600 @@
+import collections.abc
+import json
+import sqlite3
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Union
+from AlgoTree.flattree import FlatTree
+from AlgoTree.key_allocator import KeyAllocator, UuidKeys
+
+if TYPE_CHECKING:
+    from flattree_node import FlatTreeNode
+
+
+class _Record(dict):
+    """
+    The value of a node in a `SqliteFlatTree`. It is a copy of the row, and
+    modifying it writes the change through to the database, so that code
+    written against `FlatTree` (e.g., `FlatTreeNode`), which modifies node
+    values in place, works unchanged.
+    """
+
+    __slots__ = ("_tree", "_key")
+
+    def __init__(self, tree: "SqliteFlatTree", key: str, value: dict):
+        super().__init__(value)
+        self._tree = tree
+        self._key = key
+
+    def _flush(self) -> None:
+        self._tree[self._key] = dict(self)
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self._flush()
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self._flush()
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self._flush()
+
+    def setdefault(self, key, default=None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *args) -> Any:
+        value = super().pop(key, *args)
+        self._flush()
+        return value
+
+    def popitem(self) -> tuple:
+        item = super().popitem()
+        self._flush()
+        return item
+
+    def clear(self) -> None:
+        super().clear()
+        self._flush()
+
+    def __reduce__(self):
+        # copies are plain dictionaries that are detached from the database
+        return (dict, (dict(self),))
+
+    def __deepcopy__(self, memo) -> dict:
+        return deepcopy(dict(self), memo)
+
+
+class SqliteFlatTree(collections.abc.MutableMapping):
+    """
+    A flat tree stored in an SQLite database, for trees that do not fit in
+    memory.
+
+    It implements the same contract as `FlatTree`: it is a mutable mapping
+    from unique node keys to node values (dictionaries with an optional
+    `FlatTree.PARENT_KEY`), and provides the same tree methods (`node`,
+    `subtree`, `root`, `child_keys`, `detach`, `prune`, `graft`, `batch`,
+    ...), so `FlatTreeNode`, the functions in `AlgoTree.utils` and
+    `PrettyTree` work over it unchanged.
+
+    The nodes are stored in a table with the columns `key`, `parent`
+    (indexed, so child lookups are a single index scan) and `payload` (the
+    rest of the node value, encoded as JSON, so payloads must be JSON
+    serializable). Descendant queries (`descendant_keys`, `subtree_size`,
+    `prune`) are recursive common table expressions evaluated by SQLite,
+    and `utils.descendants` and `utils.size` use them for the nodes of this
+    tree instead of querying the children one node at a time. Mutation
+    journals are not supported: the tree has no `enable_journal`, since
+    changes can also be made to the database outside of the tree API.
+
+    The values returned by `tree[key]` are copies of the rows, but modifying
+    them writes the change back to the database. Unlike `FlatTree`, this
+    includes modifying the parent key in place.
+
+    Every statement is committed immediately, except inside `batch` (and
+    `update`), which groups the statements into a single transaction.
+
+    Example::
+
+        tree = SqliteFlatTree("tree.db")
+        tree["a"] = {"value": 1}
+        tree.root.add_child(name="b", value=2)
+        print(pretty_tree(tree.root))
+    """
+
+    PARENT_KEY = FlatTree.PARENT_KEY
+    DETACHED_KEY = FlatTree.DETACHED_KEY
+    key_allocator: KeyAllocator = UuidKeys()
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS nodes (
+            key TEXT PRIMARY KEY,
+            parent TEXT,
+            ord INTEGER NOT NULL,
+            payload TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS nodes_parent ON nodes (parent, ord);
+    """
+
+    _DESCENDANTS = """
+        WITH RECURSIVE sub(key) AS (
+            SELECT key FROM nodes WHERE parent = ?
+            UNION
+            SELECT nodes.key FROM nodes JOIN sub ON nodes.parent = sub.key
+        )
+    """
+
+    # the path of sibling positions from `key` sorts the rows in pre-order;
+    # a cycle below `key` has to go through `key`, so excluding it stops
+    # the recursion
+    _PREORDER = """
+        WITH RECURSIVE sub(key, path) AS (
+            SELECT key, printf('%020d', ord) FROM nodes
+            WHERE parent = ?1 AND key != ?1
+            UNION ALL
+            SELECT nodes.key, sub.path || printf('%020d', nodes.ord)
+            FROM nodes JOIN sub ON nodes.parent = sub.key
+            WHERE nodes.key != ?1
+        )
+        SELECT key FROM sub ORDER BY path
+    """
+
+    def __init__(self, database: str = ":memory:", *args: Any, **kwargs: Any) -> None:
+        """
+        Open (or create) a tree stored in an SQLite database.
+
+        Examples:
+            SqliteFlatTree() # empty in-memory tree
+            SqliteFlatTree("tree.db") # tree stored in the file tree.db
+            SqliteFlatTree("tree.db", {'a': {}, 'b': {'parent': 'a'}})
+
+        :param database: The database file (":memory:" for an in-memory database).
+        :param args: Positional arguments with initial nodes, as for `FlatTree`.
+        :param kwargs: Keyword arguments with initial nodes, as for `FlatTree`.
+        """
+        self.database = database
+        self._conn = sqlite3.connect(database, isolation_level=None)
+        self._conn.executescript(SqliteFlatTree._SCHEMA)
+        self._depth = 0
+        self._version = 0
+        self._ord = self._conn.execute(
+            "SELECT coalesce(max(ord), 0) FROM nodes").fetchone()[0]
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def close(self) -> None:
+        """
+        Close the database connection.
+        """
+        self._conn.close()
+
+    def __enter__(self) -> "SqliteFlatTree":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _next_ord(self) -> int:
+        self._ord += 1
+        return self._ord
+
+    def _record(self, key: str) -> None:
+        """
+        Part of the `FlatTree` contract. A `batch` is rolled back by the
+        database, so there is nothing to remember here.
+        """
+
+    def _emit(self, op: str, key: str, field: Optional[str] = None,
+              old: Any = None, new: Any = None) -> None:
+        """
+        Part of the `FlatTree` contract. Mutation journals are not supported
+        (there is no `enable_journal`), so there is no journal to append the
+        change to.
+        """
+
+    @contextmanager
+    def batch(self, validate: bool = False) -> Iterator["SqliteFlatTree"]:
+        """
+        A context manager that groups many modifications into a single
+        transaction, which is rolled back if an exception is raised inside
+        the block (or if `validate` is True and `FlatTree.check_valid` fails
+        at the end of the block). Nested batches are savepoints inside the
+        outer transaction. See `FlatTree.batch`.
+
+        :param validate: If True, validate the tree at the end of the batch.
+        :return: The tree.
+        """
+        name = f"batch{self._depth}"
+        self._conn.execute(f"SAVEPOINT {name}")
+        self._depth += 1
+        try:
+            yield self
+            if validate:
+                FlatTree.check_valid(self)
+        except BaseException:
+            self._conn.execute(f"ROLLBACK TO {name}")
+            self._conn.execute(f"RELEASE {name}")
+            self._version += 1
+            raise
+        finally:
+            self._depth -= 1
+        self._conn.execute(f"RELEASE {name}")
+
+    def __getitem__(self, key: str) -> dict:
+        row = self._conn.execute(
+            "SELECT parent, payload FROM nodes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = json.loads(row[1])
+        value[FlatTree.PARENT_KEY] = row[0]
+        return _Record(self, key, value)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if not isinstance(value, collections.abc.Mapping):
+            raise ValueError(f"Node {key!r} does not have dictionary: {value=}")
+        value = dict(value)
+        par_key = value.pop(FlatTree.PARENT_KEY, None)
+        payload = json.dumps(value)
+        row = self._conn.execute(
+            "SELECT parent FROM nodes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._conn.execute(
+                "INSERT INTO nodes (key, parent, ord, payload) VALUES (?, ?, ?, ?)",
+                (key, par_key, self._next_ord(), payload))
+            self._version += 1
+        elif row[0] != par_key:
+            self._conn.execute(
+                "UPDATE nodes SET parent = ?, ord = ?, payload = ? WHERE key = ?",
+                (par_key, self._next_ord(), payload, key))
+            self._version += 1
+        else:
+            self._conn.execute(
+                "UPDATE nodes SET payload = ? WHERE key = ?", (payload, key))
+
+    def __delitem__(self, key: str) -> None:
+        if self._conn.execute(
+                "DELETE FROM nodes WHERE key = ?", (key,)).rowcount == 0:
+            raise KeyError(key)
+        self._version += 1
+
+    def __iter__(self) -> Iterator[str]:
+        for (key,) in self._conn.execute("SELECT key FROM nodes ORDER BY rowid"):
+            yield key
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT count(*) FROM nodes").fetchone()[0]
+
+    def __contains__(self, key: Any) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM nodes WHERE key = ?", (key,)).fetchone() is not None
+
+    def __eq__(self, other: Any) -> bool:
+        if other is self:
+            return True
+        return super().__eq__(other)
+
+    def __repr__(self) -> str:
+        return f"SqliteFlatTree({self.database!r})"
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        with self.batch():
+            super().update(*args, **kwargs)
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM nodes")
+        self._version += 1
+
+    def reparent(self, key: str, par_key: Optional[str]) -> None:
+        """
+        Set the parent of the node with key `key` to `par_key`. The node is
+        appended to the end of the children of its new parent.
+
+        :param key: The key of the node.
+        :param par_key: The key of the new parent (None to make it a root).
+        :raises KeyError: If the node is not found in the tree.
+        """
+        row = self._conn.execute(
+            "SELECT parent FROM nodes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        if row[0] != par_key:
+            self._conn.execute(
+                "UPDATE nodes SET parent = ?, ord = ? WHERE key = ?",
+                (par_key, self._next_ord(), key))
+            self._version += 1
+
+    def reparent_many(self, parents: Dict[str, Optional[str]]) -> None:
+        """
+        Set the parents of many nodes at once, checking the whole mapping
+        for cycles before anything is modified. See `FlatTree.reparent_many`.
+
+        :param parents: The mapping from node keys to new parent keys.
+        :raises KeyError: If a node is not found in the tree.
+        :raises ValueError: If the new parents would create a cycle.
+        """
+        for key in parents:
+            if key not in self:
+                raise KeyError(key)
+
+        def _parent_of(key):
+            row = self._conn.execute(
+                "SELECT parent FROM nodes WHERE key = ?", (key,)).fetchone()
+            return FlatTree._MISSING if row is None else row[0]
+
+        FlatTree._check_acyclic(parents, _parent_of)
+        self._conn.executemany(
+            "UPDATE nodes SET parent = ?, ord = ? WHERE key = ?",
+            [(par_key, self._next_ord(), key) for key, par_key in parents.items()])
+        self._version += 1
+
+    def unique_keys(self) -> List[str]:
+        """
+        Get the unique keys in the tree, even if they are not nodes in the tree
+        but only parent keys without corresponding nodes.
+
+        :return: List of unique keys in the tree.
+        """
+        keys = [key for (key,) in self._conn.execute(
+            "SELECT key FROM nodes UNION "
+            "SELECT parent FROM nodes WHERE parent IS NOT NULL")]
+        if FlatTree.DETACHED_KEY not in keys:
+            keys.append(FlatTree.DETACHED_KEY)
+        return keys
+
+    def _is_known(self, key: Optional[str]) -> bool:
+        """
+        Check whether `key` is one of `unique_keys()`, using the primary key
+        and the parent index.
+
+        :param key: The key to check.
+        :return: True if the key is a node key, a parent key or the detached
+                 key, False otherwise.
+        """
+        if key is None:
+            return False
+        return key == FlatTree.DETACHED_KEY or self._conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM nodes WHERE key = ?) "
+            "OR EXISTS (SELECT 1 FROM nodes WHERE parent = ?)",
+            (key, key)).fetchone()[0] == 1
+
+    def child_keys(self, key: str) -> List[str]:
+        """
+        Get the children keys of a node with key `key`.
+
+        :param key: The key of the node.
+        :return: List of keys of the children of the node.
+        """
+        keys = [k for (k,) in self._conn.execute(
+            "SELECT key FROM nodes WHERE parent = ? ORDER BY ord", (key,))]
+        if not keys and not self._is_known(key):
+            raise KeyError(f"Key not found: {key!r}")
+        return keys
+
+    def descendant_keys(self, key: str, order: str = "level") -> List[str]:
+        """
+        Get the keys of the descendants of the node with key `key`, with a
+        single recursive query.
+
+        :param key: The key of the node.
+        :param order: "level" for breadth-first order, or "pre" for
+                      pre-order (the order of `utils.descendants`).
+        :return: List of keys of the descendants of the node.
+        """
+        if not self._is_known(key):
+            raise KeyError(f"Key not found: {key!r}")
+        if order == "level":
+            query = SqliteFlatTree._DESCENDANTS + "SELECT key FROM sub"
+        elif order == "pre":
+            query = SqliteFlatTree._PREORDER
+        else:
+            raise ValueError(f"Unknown order: {order!r}")
+        return [k for (k,) in self._conn.execute(query, (key,))]
+
+    def subtree_size(self, key: str) -> int:
+        """
+        Get the number of nodes in the subtree rooted at the node with key
+        `key`, including the node itself if it is in the tree (a logical
+        node, e.g., `FlatTree.DETACHED_KEY`, is not counted).
+
+        :param key: The key of the node.
+        :return: The size of the subtree.
+        """
+        if not self._is_known(key):
+            raise KeyError(f"Key not found: {key!r}")
+        count = self._conn.execute(
+            SqliteFlatTree._DESCENDANTS + "SELECT count(*) FROM sub",
+            (key,)).fetchone()[0]
+        return count + (key in self)
+
+    def detach(self, key: str) -> "FlatTreeNode":
+        """
+        Detach node with key `key` by setting its parent to `FlatTree.DETACHED_KEY`
+        which refers to a special key that we assume doesn't exist in the tree.
+
+        :param key: The key of the node to detach.
+        :return: The detached subtree rooted at the node.
+        :raises KeyError: If the node is not found in the tree.
+        """
+        if key not in self:
+            raise KeyError(f"Node not found: {key!r}")
+        self.reparent(key, FlatTree.DETACHED_KEY)
+        return self.node(key)
+
+    def prune(self, node: Union[str, "FlatTreeNode"]) -> List[str]:
+        """
+        Prune the subtree rooted at the given node (`node` can be a
+        unique key for the node or a `FlatTreeNode` object).
+
+        :param node: The node to prune.
+        :return: The list of keys pruned (children before their parents).
+        :raises KeyError: If the node is not found in the tree.
+        """
+        key = node if isinstance(node, str) else node.name
+        with self.batch():
+            pruned = self.descendant_keys(key)
+            self._conn.execute(
+                SqliteFlatTree._DESCENDANTS +
+                "DELETE FROM nodes WHERE key IN (SELECT key FROM sub)", (key,))
+            pruned.reverse()
+            if key in self:
+                del self[key]
+                pruned.append(key)
+            self._version += 1
+        return pruned
+
+    def graft(self, key: str, par_key: Optional[str],
+              source: Optional[Any] = None,
+              rename: Union[None, str, Dict[str, str], Callable[[str], str]] = None,
+              deep: bool = False) -> str:
+        """
+        Copy the subtree rooted at the node with key `key` in `source` (this
+        tree by default) as a child of the node with key `par_key` in this
+        tree, in a single transaction. See `FlatTree.graft`.
+
+        :param key: The key of the root of the subtree to copy.
+        :param par_key: The key of the new parent (None to make the copy a
+                        root).
+        :param source: The tree to copy from. Defaults to this tree.
+        :param rename: How to map the keys of the copied nodes.
+        :param deep: If True, deep copy the payloads.
+        :return: The key of the copy of the root of the subtree.
+        """
+        with self.batch():
+            return FlatTree.graft(self, key, par_key, source, rename, deep)
+
+    def node(self, name: str) -> "FlatTreeNode":
+        """
+        Get a proxy of the node with key `name`, in the context of the whole
+        tree. See `FlatTree.node`.
+
+        :param name: The unique key of the node.
+        :return: FlatTreeNode proxy representing the node.
+        :raises KeyError: If the key is not found in the tree.
+        """
+        from .flattree_node import FlatTreeNode
+
+        if not self._is_known(name):
+            raise KeyError(f"Key not found: {name!r}")
+
+        return FlatTreeNode.proxy(
+            tree=self, node_key=name, root_key=self.root_key
+        )
+
+    def subtree(self, name: Optional[str] = None) -> "FlatTreeNode":
+        """
+        Get sub-tree rooted at the node with the name `name` with the current
+        node also set to the node with name `name`.
+
+        :param name: The unique key of the node.
+        :return: FlatTreeNode proxy representing the node.
+        """
+        from .flattree_node import FlatTreeNode
+
+        if name is None:
+            name = self.root_key
+
+        if not self._is_known(name):
+            raise KeyError(f"Name (unique key) not found: {name!r}")
+
+        return FlatTreeNode.proxy(tree=self, node_key=name, root_key=name)
+
+    @property
+    def root(self) -> "FlatTreeNode":
+        """
+        Retrive the root of the tree.
+
+        :return: The root node.
+        """
+        return self.subtree(self.root_key)
+
+    @property
+    def root_key(self) -> str:
+        """
+        Retrieve the key of the (first) root node.
+
+        :return: The key of the root node.
+        """
+        row = self._conn.execute(
+            "SELECT key FROM nodes WHERE parent IS NULL ORDER BY ord LIMIT 1"
+        ).fetchone()
+        if row is None:
+            raise ValueError("No root node found in tree")
+        return row[0]
+
+    @property
+    def root_keys(self) -> List[str]:
+        """
+        Retrieve the keys of all the root nodes.
+
+        :return: The keys of the root nodes.
+        """
+        return [k for (k,) in self._conn.execute(
+            "SELECT key FROM nodes WHERE parent IS NULL ORDER BY ord")]
+
+    @property
+    def forest(self) -> List["FlatTreeNode"]:
+        """
+        Retrieve the trees of the forest, one subtree per root node.
+
+        :return: List of subtrees rooted at the root nodes.
+        """
+        return [self.subtree(key) for key in self.root_keys]
+
+    @property
+    def parent(self) -> "FlatTreeNode":
+        """
+        Retrieve the parent of the root node (always None).
+        """
+        return self.root.parent
+
+    @property
+    def payload(self) -> Any:
+        """
+        Retrieve the payload of the root node.
+        """
+        return self.root.payload
+
+    @property
+    def name(self) -> str:
+        """
+        Retrieve the name of the root node.
+        """
+        return self.root_key
+
+    @property
+    def detached(self) -> "FlatTreeNode":
+        """
+        Retrieve the detached tree, rooted at the logical node with the key
+        `FlatTree.DETACHED_KEY`.
+
+        :return: The detached logical root node.
+        """
+        return self.subtree(FlatTree.DETACHED_KEY)
+
+    @property
+    def children(self) -> List["FlatTreeNode"]:
+        """
+        Retrieve the children of the root node.
+
+        :return: List of children nodes.
+        """
+        return self.root.children
+
+    def to_dict(self) -> dict:
+        """
+        Load the tree into a dictionary.
+
+        :return: The tree as a dictionary.
+        """
+        return {key: dict(value) for key, value in self.items()}
+
+    def to_flattree(self) -> FlatTree:
+        """
+        Load the tree into a `FlatTree`.
+
+        :return: A `FlatTree` with the same nodes.
+        """
+        return FlatTree(self.to_dict())
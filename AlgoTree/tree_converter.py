@@ -1,8 +1,9 @@
-import uuid
 from copy import deepcopy
 from typing import Any, Callable, Type, Dict
 
 from AlgoTree.flattree import FlatTree
+from AlgoTree.key_allocator import KeyAllocator, UuidKeys
+from AlgoTree.payload_view import PayloadView
 
 
 class TreeConverter:
@@ -10,6 +11,12 @@ class TreeConverter:
     Utility class for converting between tree representations.
     """
 
+    key_allocator: KeyAllocator = UuidKeys()
+    """
+    The allocator of the keys of nodes without a `name` attribute, used by
+    `default_node_name`. See `AlgoTree.key_allocator`.
+    """
+
     @staticmethod
     def default_extract(node):
         """
@@ -21,17 +28,52 @@ class TreeConverter:
         return node.payload if hasattr(node, "payload") else {}
 
     @staticmethod
-    def default_node_name(node):
+    def default_node_name(node, tree=None):
         """
         Default function to map nodes to unique keys. If the node has a
         `name` attribute, then it is used as the unique key. Otherwise,
-        a random UUID is generated.
+        a new key is allocated by `TreeConverter.key_allocator` (a random
+        UUID by default).
 
         :param node: The node to map to a unique key.
+        :param tree: The tree the node is copied into, if any, so that the
+                     allocator can skip the keys already in it.
         :return: The unique key for the node.
         """
-        return node.name if hasattr(node, "name") else str(uuid.uuid4())
+        if hasattr(node, "name"):
+            return node.name
+        return TreeConverter.key_allocator(tree)
+
+    @staticmethod
+    def _bind_extract(extract: Callable) -> Callable:
+        """
+        If `extract` is `default_extract`, read the payloads through their
+        views instead (see `PayloadView`), since the converter copies them
+        anyway. Other functions are used as is.
+        """
+        if getattr(extract, "__func__", extract) is not \
+                TreeConverter.default_extract:
+            return extract
+
+        def _extract(node):
+            view = getattr(node, "payload_view", None)
+            if isinstance(view, PayloadView):
+                return view
+            return TreeConverter.default_extract(node)
+
+        return _extract
 
+    @staticmethod
+    def _bind_node_name(node_name: Callable, under) -> Callable:
+        """
+        If `node_name` is `default_node_name`, bind it to the tree of
+        `under`. Other functions are called with the node only.
+        """
+        if getattr(node_name, "__func__", node_name) is not \
+                TreeConverter.default_node_name:
+            return node_name
+        tree = getattr(under, "tree", None)
+        return lambda node: TreeConverter.default_node_name(node, tree)
 
     @staticmethod
     def copy_under(
@@ -48,7 +90,9 @@ class TreeConverter:
 
         :param node: The subtree rooted at `node` to copy.
         :param under: The node to copy the subtree under.
-        :param node_name: The function to map nodes to names.
+        :param node_name: The function to map nodes to names. The keys
+                          allocated by `default_node_name` are not already
+                          in the tree of `under`.
         :param extract: A callable to extract relevant data from a node.
         :return: A subtree extending `under` with the copied nodes.
         """
@@ -57,6 +101,8 @@ class TreeConverter:
             raise ValueError("Node must have a children attribute")
 
         node_type = type(under)
+        node_name = TreeConverter._bind_node_name(node_name, under)
+        extract = TreeConverter._bind_extract(extract)
         tries: int = 0
         def _build(cur, und):
             nonlocal tries
@@ -101,6 +147,7 @@ class TreeConverter:
         if source is None:
             return None
 
+        extract = TreeConverter._bind_extract(extract)
         root = target_type(
             name=node_name(source.root),
             parent=None,
@@ -126,9 +173,12 @@ class TreeConverter:
         """
 
         def _build(node):
+            payload = extract(node, **kwargs)
+            if isinstance(payload, PayloadView):
+                payload = payload.copy()
             return {
                 "name": node_name(node),
-                "payload": extract(node, **kwargs),
+                "payload": payload,
                 "children": [_build(child, **kwargs) for child in node.children]
             }
         
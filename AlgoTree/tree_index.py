@@ -0,0 +1,325 @@
+"""
+Tree Indexes
+~~~~~~~~~~~~
+
+This module provides indexes that are built over a (sub)tree in a single
+traversal and then answer structural queries much faster than the
+free-standing functions in `AlgoTree.utils`, which have to walk the tree for
+every query.
+
+The indexes work with any node that models the node-centric API (see
+`TreeNodeApi`). Nodes are identified by their name if they are proxies into a
+flat tree (`FlatTreeNode`, `CompactFlatTreeNode`, `MmapFlatTreeNode`), where
+names are unique and proxies are created on the fly, and by object identity
+otherwise (e.g., `TreeNode`). Pass a `key` callable to override this.
+
+If the nodes provide a `structure_version` property, the index notices when
+the tree structure has changed and rebuilds itself on the next query.
+Otherwise, call `invalidate` after changing the tree.
+"""
+
+from array import array
+from typing import Any, Callable, Dict, List, Optional
+from AlgoTree.compact_flattree import CompactFlatTreeNode
+from AlgoTree.flattree_node import FlatTreeNode
+from AlgoTree.mmap_flattree import MmapFlatTreeNode
+
+
+def node_key(node: Any) -> Any:
+    """
+    The default function to map nodes to the keys that identify them in an
+    index.
+
+    :param node: The node.
+    :return: The name of the node for flat tree proxies, otherwise the id of
+             the node object.
+    """
+    if isinstance(node, (FlatTreeNode, CompactFlatTreeNode, MmapFlatTreeNode)):
+        return node.name
+    return id(node)
+
+
+class _TreeIndex:
+    """
+    Base class for indexes built over the subtree rooted at a node. Handles
+    the mapping of nodes to their pre-order numbers and the detection of
+    stale indexes. Subclasses implement `_build`.
+    """
+
+    def __init__(self, root: Any, key: Callable[[Any], Any] = node_key):
+        """
+        Build the index over the subtree rooted at `root`.
+
+        :param root: The root of the subtree to index.
+        :param key: The function to map nodes to the keys that identify them.
+        """
+        self.root = root
+        self.key = key
+        self._build()
+
+    def _version(self) -> Optional[int]:
+        return getattr(self.root, "structure_version", None)
+
+    def _build(self) -> None:
+        raise NotImplementedError
+
+    def invalidate(self) -> None:
+        """
+        Rebuild the index. Only needed if the nodes do not provide a
+        `structure_version`, or if the tree was modified in a way that does
+        not update it.
+        """
+        self._build()
+
+    def _check(self) -> None:
+        if self._built_version is not None and \
+                self._version() != self._built_version:
+            self._build()
+
+    def _pre(self, node: Any) -> int:
+        try:
+            return self._enter[self.key(node)]
+        except KeyError:
+            raise KeyError(f"Node not in index: {node!r}") from None
+
+    def __contains__(self, node: Any) -> bool:
+        self._check()
+        return self.key(node) in self._enter
+
+    def __len__(self) -> int:
+        self._check()
+        return len(self._nodes)
+
+
+class IntervalIndex(_TreeIndex):
+    """
+    An Euler-tour (pre-order interval) index over the subtree rooted at a
+    node.
+
+    Each node is numbered in pre-order, and since the descendants of a node
+    are numbered contiguously right after it, the subtree of a node is the
+    interval `[enter, exit]` of pre-order numbers. Ancestor and descendant
+    tests, subtree membership and subtree sizes are then O(1) comparisons.
+
+    Example::
+
+        index = IntervalIndex(tree.root)
+        index.is_ancestor(a, b)
+        index.size(a)
+    """
+
+    def _build(self) -> None:
+        self._built_version = self._version()
+        self._nodes: List[Any] = []
+        self._enter: Dict[Any, int] = {}
+        self._exit: List[int] = []
+        self._depth: List[int] = []
+
+        # iterative DFS, where a None entry marks the end of the subtree of
+        # the node whose pre-order number is on top of `open_nodes`
+        stack: List[Any] = [(self.root, 0)]
+        open_nodes: List[int] = []
+        while stack:
+            item = stack.pop()
+            if item is None:
+                self._exit[open_nodes.pop()] = len(self._nodes) - 1
+                continue
+            node, depth = item
+            pre = len(self._nodes)
+            self._enter[self.key(node)] = pre
+            self._nodes.append(node)
+            self._exit.append(pre)
+            self._depth.append(depth)
+            open_nodes.append(pre)
+            stack.append(None)
+            stack.extend((c, depth + 1) for c in reversed(node.children))
+
+    def preorder(self, node: Any) -> int:
+        """
+        Get the pre-order number of a node.
+
+        :param node: The node.
+        :return: The pre-order number of the node (the root is 0).
+        """
+        self._check()
+        return self._pre(node)
+
+    def is_ancestor(self, node: Any, other: Any) -> bool:
+        """
+        Check if `node` is a (proper) ancestor of `other`.
+
+        :param node: The node to check.
+        :param other: The other node.
+        :return: True if the node is an ancestor of the other node.
+        """
+        self._check()
+        a, b = self._pre(node), self._pre(other)
+        return a < b <= self._exit[a]
+
+    def is_descendant(self, node: Any, other: Any) -> bool:
+        """
+        Check if `node` is a (proper) descendant of `other`.
+
+        :param node: The node to check for being a descendant.
+        :param other: The node to check for being a descendant of.
+        :return: True if `node` is a descendant of `other`.
+        """
+        return self.is_ancestor(other, node)
+
+    def in_subtree(self, node: Any, root: Any) -> bool:
+        """
+        Check if `node` is in the subtree rooted at `root`, i.e., if it is
+        `root` or one of its descendants.
+
+        :param node: The node to check.
+        :param root: The root of the subtree.
+        :return: True if the node is in the subtree.
+        """
+        self._check()
+        a, b = self._pre(root), self._pre(node)
+        return a <= b <= self._exit[a]
+
+    def size(self, node: Any) -> int:
+        """
+        Get the size of the subtree under `node` (including `node`).
+
+        :param node: The node.
+        :return: The number of nodes in the subtree.
+        """
+        self._check()
+        pre = self._pre(node)
+        return self._exit[pre] - pre + 1
+
+    def depth(self, node: Any) -> int:
+        """
+        Get the depth of a node relative to the root of the index.
+
+        :param node: The node.
+        :return: The depth of the node.
+        """
+        self._check()
+        return self._depth[self._pre(node)]
+
+    def descendants(self, node: Any) -> List[Any]:
+        """
+        Get the descendants of a node, in pre-order.
+
+        :param node: The node.
+        :return: List of descendant nodes.
+        """
+        self._check()
+        pre = self._pre(node)
+        return self._nodes[pre + 1:self._exit[pre] + 1]
+
+
+class AncestorIndex(_TreeIndex):
+    """
+    A binary-lifting ancestor table over the subtree rooted at a node.
+
+    For every node, we store its 2^j-th ancestor for j = 0, 1, ..., log2(h),
+    where h is the height of the tree. Jumping up k levels then takes at most
+    log2(k) table lookups, which gives O(log n) lowest common ancestor,
+    k-th ancestor and distance queries after an O(n log n) build. This is
+    intended for issuing many queries against a tree that does not change.
+
+    Example::
+
+        index = AncestorIndex(tree.root)
+        index.lca(a, b)
+        index.distance(a, b)
+    """
+
+    def _build(self) -> None:
+        self._built_version = self._version()
+        self._nodes: List[Any] = []
+        self._enter: Dict[Any, int] = {}
+        self._depth = array("q")
+        parent = array("q")
+
+        stack: List[Any] = [(self.root, 0, 0)]
+        while stack:
+            node, par, depth = stack.pop()
+            pre = len(self._nodes)
+            self._enter[self.key(node)] = pre
+            self._nodes.append(node)
+            parent.append(par)
+            self._depth.append(depth)
+            stack.extend((c, pre, depth + 1) for c in reversed(node.children))
+
+        # the root is its own parent, so jumps past the root stop at the root
+        self._up = [parent]
+        height = max(self._depth, default=0)
+        while (1 << len(self._up)) <= height:
+            prev = self._up[-1]
+            self._up.append(array("q", (prev[p] for p in prev)))
+
+    def _lift(self, v: int, k: int) -> int:
+        j = 0
+        while k:
+            if k & 1:
+                v = self._up[j][v]
+            k >>= 1
+            j += 1
+        return v
+
+    def _lca(self, a: int, b: int) -> int:
+        if self._depth[a] < self._depth[b]:
+            a, b = b, a
+        a = self._lift(a, self._depth[a] - self._depth[b])
+        if a == b:
+            return a
+        for up in reversed(self._up):
+            if up[a] != up[b]:
+                a, b = up[a], up[b]
+        return self._up[0][a]
+
+    def depth(self, node: Any) -> int:
+        """
+        Get the depth of a node relative to the root of the index.
+
+        :param node: The node.
+        :return: The depth of the node.
+        """
+        self._check()
+        return self._depth[self._pre(node)]
+
+    def kth_ancestor(self, node: Any, k: int) -> Optional[Any]:
+        """
+        Get the ancestor `k` levels above `node`. The 0-th ancestor is the
+        node itself and the 1st ancestor is its parent.
+
+        :param node: The node.
+        :param k: The number of levels to go up.
+        :return: The ancestor, or None if `k` exceeds the depth of the node.
+        """
+        if k < 0:
+            raise ValueError(f"k must be non-negative: {k}")
+        self._check()
+        v = self._pre(node)
+        if k > self._depth[v]:
+            return None
+        return self._nodes[self._lift(v, k)]
+
+    def lca(self, node1: Any, node2: Any) -> Any:
+        """
+        Find the lowest common ancestor of two nodes.
+
+        :param node1: The first node.
+        :param node2: The second node.
+        :return: The lowest common ancestor of the two nodes.
+        """
+        self._check()
+        return self._nodes[self._lca(self._pre(node1), self._pre(node2))]
+
+    def distance(self, node1: Any, node2: Any) -> int:
+        """
+        Find the distance (number of edges) between two nodes.
+
+        :param node1: The first node.
+        :param node2: The second node.
+        :return: The distance between the two nodes.
+        """
+        self._check()
+        a, b = self._pre(node1), self._pre(node2)
+        return (self._depth[a] + self._depth[b]
+                - 2 * self._depth[self._lca(a, b)])
@@ -0,0 +1,289 @@
+"""
+Incremental Tree Loading
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module loads flat trees from JSON files incrementally, instead of
+parsing the whole document with `json.load` first. The file is read in
+chunks of `buffer_size` characters (or bytes), node records are parsed as
+soon as they are complete and fed into the tree, and the consumed part of
+the buffer is dropped. The memory used by the loader itself is therefore
+bounded by the buffer size and the size of the largest single node record,
+independently of the size of the file (the tree still holds every node,
+unless it is out-of-core, e.g., a `SqliteFlatTree`).
+
+Two layouts are supported:
+
+- Newline-delimited JSON (NDJSON), one node record per line::
+
+    {"key": "a", "parent": null, "value": 1}
+    {"key": "b", "parent": "a", "value": 2}
+
+- A JSON object that maps node keys to node values (the flat tree format),
+  optionally nested under a key of the top-level object, as in the
+  `{"mapping": {...}}` documents of the `bin/json-tree*.py` tools::
+
+    {"meta": "...", "mapping": {"a": {"value": 1}, "b": {"parent": "a"}}}
+
+A `progress` callback, if given, is called after every chunk with the number
+of node records loaded so far and the number of characters (or bytes) read
+so far.
+"""
+
+import codecs
+import json
+from contextlib import nullcontext
+from typing import IO, Any, Callable, Iterator, Optional, Tuple, Union
+from AlgoTree.flattree import FlatTree
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+Progress = Callable[[int, int], None]
+
+
+class _Reader:
+    """
+    A buffered reader over a file of JSON text, which drops the consumed part
+    of the buffer whenever it reads the next chunk.
+    """
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, file: IO, buffer_size: int,
+                 progress: Optional[Progress]):
+        self.file = file
+        self.buffer_size = buffer_size
+        self.progress = progress
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.read = 0
+        self.records = 0
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def fill(self) -> bool:
+        """
+        Read the next chunk into the buffer.
+
+        :return: False if the end of the file was reached.
+        """
+        chunk = self.file.read(self.buffer_size)
+        if not chunk:
+            self.eof = True
+            if isinstance(chunk, bytes):
+                # raises if the file ends in the middle of a character
+                self._utf8.decode(b"", final=True)
+            return False
+        self.read += len(chunk)
+        if isinstance(chunk, bytes):
+            # a character may be split across chunks
+            chunk = self._utf8.decode(chunk)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        if self.progress is not None:
+            self.progress(self.records, self.read)
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and get the next character ("" at the end of the file).
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r}, found {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """
+        Parse the next JSON value, reading more chunks until it is complete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # a number at the end of the buffer may continue in the
+                # next chunk
+                if end < len(self.buf) or self.eof or not self.fill():
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+
+
+def _open(file: Union[str, IO]) -> Tuple[IO, bool]:
+    if isinstance(file, str):
+        return open(file, "rb"), True
+    return file, False
+
+
+def iter_ndjson(file: Union[str, IO],
+                buffer_size: int = DEFAULT_BUFFER_SIZE,
+                progress: Optional[Progress] = None) -> Iterator[dict]:
+    """
+    Iterate over the records of a newline-delimited JSON file. Blank lines
+    are skipped.
+
+    :param file: The path of the file, or a file object (text or binary).
+    :param buffer_size: The number of characters (or bytes) to read at once.
+    :param progress: A callback called with the number of records and
+                     characters (or bytes) read so far, after every chunk.
+    :return: An iterator over the records.
+    :raises ValueError: If a line is not valid JSON.
+    """
+    f, close = _open(file)
+    try:
+        reader = _Reader(f, buffer_size, progress)
+        while True:
+            nl = reader.buf.find("\n", reader.pos)
+            if nl == -1:
+                if reader.fill():
+                    continue
+                nl = len(reader.buf)
+                if reader.pos >= nl:
+                    break
+            line = reader.buf[reader.pos:nl]
+            reader.pos = nl + 1
+            if line.strip():
+                reader.records += 1
+                yield json.loads(line)
+    finally:
+        if close:
+            f.close()
+
+
+def iter_mapping(file: Union[str, IO], mapping_key: Optional[str] = None,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 progress: Optional[Progress] = None) -> Iterator[Tuple[str, Any]]:
+    """
+    Iterate over the `(key, value)` items of a JSON object that maps node
+    keys to node values, parsing one item at a time.
+
+    :param file: The path of the file, or a file object (text or binary).
+    :param mapping_key: If not None, the mapping is the value of this key in
+                        the top-level object (the other values of the
+                        top-level object are parsed and skipped).
+    :param buffer_size: The number of characters (or bytes) to read at once.
+    :param progress: A callback called with the number of items and
+                     characters (or bytes) read so far, after every chunk.
+    :return: An iterator over the items.
+    :raises ValueError: If the file is not valid JSON (including data after
+                        the top-level object), or if `mapping_key` is not
+                        found.
+    """
+    f, close = _open(file)
+    try:
+        reader = _Reader(f, buffer_size, progress)
+
+        def _items():
+            reader.expect("{")
+            if reader.peek() == "}":
+                reader.pos += 1
+                return
+            while True:
+                key = reader.value()
+                reader.expect(":")
+                yield key
+                sep = reader.peek()
+                reader.expect("}" if sep == "}" else ",")
+                if sep == "}":
+                    return
+
+        outer = None
+        if mapping_key is not None:
+            outer = _items()
+            for key in outer:
+                if key == mapping_key:
+                    break
+                reader.value()
+            else:
+                raise ValueError(f"Mapping key not found: {mapping_key!r}")
+
+        for key in _items():
+            value = reader.value()
+            reader.records += 1
+            yield key, value
+
+        if outer is not None:
+            # the rest of the top-level object
+            for _ in outer:
+                reader.value()
+        extra = reader.peek()
+        if extra:
+            raise ValueError(f"Extra data after the JSON value: {extra!r}")
+    finally:
+        if close:
+            f.close()
+
+
+def _feed(items: Iterator[Tuple[str, Any]], tree: Any,
+          validate: bool) -> Any:
+    if tree is None:
+        tree = FlatTree()
+        tree._load(items, validate)
+        return tree
+    batch = getattr(tree, "batch", None)
+    with batch() if batch is not None else nullcontext():
+        for key, value in items:
+            if validate and key in tree:
+                raise ValueError(f"Duplicate key: {key!r}")
+            tree[key] = value
+    if validate:
+        FlatTree.check_valid(tree)
+    return tree
+
+
+def load_ndjson(file: Union[str, IO], tree: Any = None, key: str = "key",
+                parent: str = "parent", validate: bool = False,
+                buffer_size: int = DEFAULT_BUFFER_SIZE,
+                progress: Optional[Progress] = None) -> Any:
+    """
+    Load a tree from a newline-delimited JSON file of node records (see
+    `FlatTree.from_records` for the format of the records).
+
+    :param file: The path of the file, or a file object (text or binary).
+    :param tree: The tree to load the nodes into (e.g., a `SqliteFlatTree`),
+                 or None to load them into a new `FlatTree`.
+    :param key: The field with the key of the node.
+    :param parent: The field with the key of the parent.
+    :param validate: If True, reject duplicate keys and check the tree with
+                     `FlatTree.check_valid` at the end.
+    :param buffer_size: The number of characters (or bytes) to read at once.
+    :param progress: A callback called with the number of records and
+                     characters (or bytes) read so far, after every chunk.
+    :return: The tree.
+    """
+    records = iter_ndjson(file, buffer_size, progress)
+    return _feed(FlatTree._record_items(records, key, parent), tree, validate)
+
+
+def load_mapping(file: Union[str, IO], tree: Any = None,
+                 mapping_key: Optional[str] = None, validate: bool = False,
+                 buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 progress: Optional[Progress] = None) -> Any:
+    """
+    Load a tree from a JSON file in the flat tree format (an object that maps
+    node keys to node values), one node at a time.
+
+    :param file: The path of the file, or a file object (text or binary).
+    :param tree: The tree to load the nodes into (e.g., a `SqliteFlatTree`),
+                 or None to load them into a new `FlatTree`.
+    :param mapping_key: If not None, the mapping is the value of this key in
+                        the top-level object.
+    :param validate: If True, reject duplicate keys and check the tree with
+                     `FlatTree.check_valid` at the end.
+    :param buffer_size: The number of characters (or bytes) to read at once.
+    :param progress: A callback called with the number of nodes and
+                     characters (or bytes) read so far, after every chunk.
+    :return: The tree.
+    """
+    return _feed(iter_mapping(file, mapping_key, buffer_size, progress),
+                 tree, validate)
@@ -1,7 +1,37 @@
 from typing import Dict, List, Optional, Union, Any, Callable
 import copy
+import itertools
 from AlgoTree.utils import find_node
 from AlgoTree.node_hash import NodeHash
+from AlgoTree.payload_view import PayloadView
+
+_versions = itertools.count(1)
+"""
+The source of the structure versions of `TreeNode` trees. Each bump takes a
+new value from it, so a version is never reused, even by another tree.
+"""
+
+
+class _Clock:
+    """
+    The structure version shared by the nodes of a `TreeNode` tree. Each
+    node holds a reference to the clock of its tree, so the version is read
+    and bumped in O(1), without walking up to the root. When a subtree is
+    attached to another tree, its clock is merged into the clock of that
+    tree (it forwards to it), and the nodes of the subtree switch to the
+    merged clock the next time they use it (`TreeNode._tree_clock`).
+    """
+
+    __slots__ = ("version", "merged")
+
+    def __init__(self):
+        self.version = 0
+        self.merged: Optional["_Clock"] = None
+
+
+def _is_at(children: List["TreeNode"], pos: int, child: "TreeNode") -> bool:
+    return 0 <= pos < len(children) and children[pos] is child
+
 
 class TreeNode(dict):
     """
@@ -27,6 +57,11 @@ class TreeNode(dict):
     The key used to store the children of a node.
     """
 
+    _HASHING = object()
+    """
+    Marks the cached hash of a node while it is being computed.
+    """
+
     @classmethod
     def check_valid(cls, node: "TreeNode") -> None:
         """
@@ -47,6 +82,44 @@ class TreeNode(dict):
 
         _check_cycle(node, set())
 
+    @classmethod
+    def lazy(cls, data: Dict,
+             hash_fn: Callable[["TreeNode"], int] = None) -> "TreeNode":
+        """
+        Create a tree over nested data, e.g., a large JSON document, without
+        wrapping the nested children: they are kept as the raw dictionaries,
+        and the children of a node are wrapped into (lazy) `TreeNode`
+        objects, with their parent set, when they are first accessed through
+        `children`. So a traversal that only visits a few branches only
+        wraps the nodes along them.
+
+        Each wrapped node is a shallow copy of its raw dictionary (with its
+        own list of children), so `data` itself is not modified. Children
+        assigned to a lazy node are also kept raw until accessed.
+
+        :param data: The data of the root node, with nested children.
+        :param hash_fn: The hash function of the root node. See `__init__`.
+        :return: The root node.
+        """
+        node = cls(hash_fn=hash_fn)
+        node._lazy = True
+        for key, value in data.items():
+            node[key] = value
+        return node
+
+    def _materialize(self, children: List) -> None:
+        """
+        Wrap the raw children of a lazy node. See `lazy`.
+        """
+        for i, child in enumerate(children):
+            if not isinstance(child, TreeNode):
+                child = TreeNode.lazy(child)
+                child._parent = self
+                child._clock = self._clock
+                child._pos = i
+                children[i] = child
+        self._raw = 0
+
     def clone(self, parent=None) -> "TreeNode":
         """
         Clone the current node and all its children.
@@ -73,8 +146,18 @@ class TreeNode(dict):
         :param args: Positional arguments to initialize the TreeNode.
         :param parent: The parent node of the current node. Default is None.
         :param name: The name of the node. Default is None.
+        :param hash_fn: The hash function of the node. Default is
+                        `NodeHash.node_hash`. The hash is cached, see
+                        `__hash__`.
         :param kwargs: Additional keyword arguments to initialize the TreeNode.
         """
+        self._hash = None
+        self._pos = None
+        self._removed = 0
+        self._lazy = False
+        self._raw = 0
+        self._parent = None
+        self._clock = _Clock()
         # Initialize the dict part with data and kwargs
         super().__init__(*args, **kwargs)
 
@@ -96,7 +179,6 @@ class TreeNode(dict):
                 TreeNode(child) if not isinstance(child, TreeNode) else child
                 for child in children
             ]
-        self._parent = None
         self.parent = parent
 
     @property
@@ -114,19 +196,144 @@ class TreeNode(dict):
         Set the parent of the node.
 
         :param parent: The new parent of the node.
+        :raises ValueError: If the new parent is the node or one of its
+                            descendants.
         """
         #if self._root == self:
         #    raise ValueError("Cannot set parent of root node of subtree")
 
+        if parent is None and self._parent is None:
+            return
+        # only a node with children can have a descendant, and only in the
+        # same tree (with the same clock), so the walk up from the new
+        # parent is skipped when a new node is attached
+        if parent is self:
+            raise ValueError("Cannot set the parent of a node to itself")
+        if parent is not None and self.get(TreeNode.CHILDREN_KEY) and \
+                parent._tree_clock() is self._tree_clock():
+            node = parent
+            while node is not None:
+                if node is self:
+                    raise ValueError("Cannot set the parent of a node to one "
+                                     "of its descendants")
+                node = node._parent
         if self._parent is not None:
-            self._parent.children = [
-                child for child in self._parent.children if child != self
-            ]
+            self._parent._remove_child(self)
         self._parent = parent
         if parent is not None:
             if TreeNode.CHILDREN_KEY not in parent:
                 parent[TreeNode.CHILDREN_KEY] = []
-            parent[TreeNode.CHILDREN_KEY].append(self)
+            children = parent[TreeNode.CHILDREN_KEY]
+            self._pos = len(children)
+            children.append(self)
+            parent._hash = None
+            clock = parent._tree_clock()
+            own = self._tree_clock()
+            if own is not clock:
+                own.merged = clock
+                self._clock = clock
+        self._bump()
+
+    def _tree_clock(self) -> _Clock:
+        """
+        Get the clock of the tree of the node, following (and shortening)
+        the chain of merged clocks. See `_Clock`.
+        """
+        clock = self._clock
+        if clock.merged is None:
+            return clock
+        head = clock
+        while head.merged is not None:
+            head = head.merged
+        while clock.merged is not head:
+            clock.merged, clock = head, clock.merged
+        self._clock = head
+        return head
+
+    def _bump(self) -> None:
+        """
+        Give the tree of the node a new structure version, in O(1) (amortized
+        over the merges of clocks). See `structure_version`.
+        """
+        self._tree_clock().version = next(_versions)
+
+    def _number_children(self) -> None:
+        """
+        Set the position hints of the children of the node.
+        """
+        for i, child in enumerate(self.get(TreeNode.CHILDREN_KEY, ())):
+            if isinstance(child, TreeNode):
+                child._pos = i
+        self._removed = 0
+
+    def _find_child(self, children: List["TreeNode"],
+                    child: "TreeNode") -> Optional[int]:
+        """
+        Find `child` in `children` from its position hint, or return None if
+        the hints should be recomputed.
+        """
+        pos = child._pos
+        if pos is None:
+            return None
+        removed = self._removed
+        if _is_at(children, pos, child):
+            return pos
+        if _is_at(children, pos - removed, child):
+            return pos - removed
+        # scan the window of possible positions while it is small compared
+        # to the number of children, so random removals cost O(sqrt(n))
+        if removed * removed > len(children):
+            return None
+        for i in range(min(pos, len(children)) - 1, max(pos - removed, 0) - 1, -1):
+            if children[i] is child:
+                return i
+        return None
+
+    def _remove_child(self, child: "TreeNode") -> None:
+        """
+        Remove `child` (by identity) from the children of the node.
+
+        Each child keeps a hint of its position, which is exact when it is
+        set and can only be too large by the number of children removed
+        since (`_removed`). So the hint, or the hint minus `_removed`, finds
+        the child in O(1) for the common patterns (e.g., moving children from
+        the front or the back), and otherwise a scan of the window between
+        them does, until the window gets large and the hints are recomputed
+        in a single pass. The children are never compared with `==`.
+
+        :param child: The child to remove.
+        """
+        children = self.get(TreeNode.CHILDREN_KEY)
+        if not children:
+            return
+        pos = self._find_child(children, child)
+        if pos is None:
+            self._number_children()
+            pos = child._pos
+            if pos is None or not _is_at(children, pos, child):
+                return
+        del children[pos]
+        child._pos = None
+        self._removed += 1
+        self._hash = None
+
+    @property
+    def structure_version(self) -> int:
+        """
+        Get a counter that changes whenever the structure of the tree changes
+        through the `TreeNode` API. Indexes over the tree use it to detect that
+        they are stale. Modifying a `children` list in place is not detected.
+
+        The version is kept per tree, in a clock object shared by its nodes,
+        so getting it is O(1) and changes to other trees do not affect it. A
+        detached subtree keeps sharing the clock of the tree it was detached
+        from, and a subtree attached to another tree shares its clock from
+        then on, so changes to trees that were ever joined may change each
+        other's versions (which only makes indexes rebuild).
+
+        :return: The structure version.
+        """
+        return self._tree_clock().version
 
     @property
     def root(self) -> "TreeNode":
@@ -153,6 +360,16 @@ class TreeNode(dict):
             if k != TreeNode.CHILDREN_KEY and k != TreeNode.NAME_KEY
         }
 
+    @property
+    def payload_view(self) -> PayloadView:
+        """
+        Get a read-only view of the data (minus the children and the name)
+        stored in the node, without copying it. See `PayloadView`.
+
+        :return: The payload view.
+        """
+        return PayloadView(self, (TreeNode.CHILDREN_KEY, TreeNode.NAME_KEY))
+
     @payload.setter
     def payload(self, data: Dict) -> None:
         """
@@ -173,22 +390,65 @@ class TreeNode(dict):
         self.update(data)
 
     def __setitem__(self, key, value):
+        self._hash = None
         if key == TreeNode.CHILDREN_KEY:
             if not isinstance(value, list):
                 value = [value]
-            value = [
-                TreeNode(child) if not isinstance(child, TreeNode) else child
-                for child in value
-            ]
+            if self._lazy:
+                value = list(value)
+                raw = sum(1 for child in value if not isinstance(child, TreeNode))
+            else:
+                value = [
+                    TreeNode(child) if not isinstance(child, TreeNode) else child
+                    for child in value
+                ]
+                raw = 0
+            super().__setitem__(key, value)
+            self._number_children()
+            self._raw = raw
+            self._bump()
+            return
         super().__setitem__(key, value)
 
     def __getitem__(self, key):
         if key == TreeNode.CHILDREN_KEY:
-            return self.get(key, [])
+            return self.children
         return super().__getitem__(key)
 
+    # the dict methods that modify the node bypass `__setitem__`, so they
+    # invalidate the cached hash themselves
+
+    def __delitem__(self, key):
+        self._hash = None
+        super().__delitem__(key)
+
+    def pop(self, key, *args):
+        self._hash = None
+        return super().pop(key, *args)
+
+    def popitem(self):
+        self._hash = None
+        return super().popitem()
+
+    def clear(self):
+        self._hash = None
+        super().clear()
+
+    def update(self, *args, **kwargs):
+        self._hash = None
+        super().update(*args, **kwargs)
+
+    def setdefault(self, key, default=None):
+        self._hash = None
+        return super().setdefault(key, default)
+
+    def __ior__(self, other):
+        self._hash = None
+        return super().__ior__(other)
+
     def __getattr__(self, key):
-        if key in ["parent", "root", "payload", "name", "children"]:
+        if key in ["parent", "root", "payload", "payload_view", "name",
+                   "children", "structure_version"]:
             return object.__getattribute__(self, key)
         if key in self:
             return self[key]
@@ -212,23 +472,40 @@ class TreeNode(dict):
     @property
     def name(self) -> Optional[str]:
         """
-        Get the name of the node.
+        Get the name of the node. An unnamed node is named by its hash.
 
         :return: The name of the node.
         """
         if TreeNode.NAME_KEY in self:
             return self[TreeNode.NAME_KEY]
-        
-        return self.__hash__()  
+        if self._hash is TreeNode._HASHING:
+            # the hash of an unnamed node is being computed (from its name)
+            return None
+        return self.__hash__()
 
     def __hash__(self) -> int:
         """
-        Get the hash of the node. The hash is based on the hash of the name
-        of the node.
+        Get the hash of the node, computed by its hash function (by default,
+        `NodeHash.node_hash`, which hashes the name and payload).
+
+        The hash is cached, and invalidated when the node is modified through
+        the dictionary methods or the `TreeNode` API. Modifying a value of
+        the node in place, e.g., `node["tags"].append(x)`, is not detected,
+        and neither are changes to other nodes, so hash functions that depend
+        on them (e.g., `NodeHash.tree_hash`) are cached until the node itself
+        is modified.
 
         :return: The hash of the node.
         """
-        return self._hash_fn(self)
+        h = self._hash
+        if h is None or h is TreeNode._HASHING:
+            self._hash = TreeNode._HASHING
+            try:
+                h = self._hash_fn(self)
+            finally:
+                self._hash = None
+            self._hash = h
+        return h
 
     def __deepcopy__(self, memo):
         """
@@ -244,6 +521,8 @@ class TreeNode(dict):
         new_node[TreeNode.CHILDREN_KEY] = [copy.deepcopy(child, memo) for child in self.children]
         # Set the parent of the new node
         new_node._parent = self._parent
+        if self._parent is not None:
+            new_node._clock = self._parent._tree_clock()
         return new_node
     
     @name.setter
@@ -262,7 +541,10 @@ class TreeNode(dict):
 
         :return: List of child nodes (TreeNode objects).
         """
-        return self.get(TreeNode.CHILDREN_KEY, [])
+        children = self.get(TreeNode.CHILDREN_KEY, [])
+        if self._raw:
+            self._materialize(children)
+        return children
 
     @children.setter
     def children(self, nodes: List["TreeNode"]) -> None:
@@ -273,13 +555,9 @@ class TreeNode(dict):
         """
         if nodes is None:
             self.pop(TreeNode.CHILDREN_KEY, None)
+            self._bump()
         else:
-            if not isinstance(nodes, list):
-                nodes = [nodes]
-            self[TreeNode.CHILDREN_KEY] = [
-                TreeNode(child) if not isinstance(child, TreeNode) else child
-                for child in nodes
-            ]
+            self[TreeNode.CHILDREN_KEY] = nodes
 
     def add_child(self, name: Optional[str] = None, *args, **kwargs) -> "TreeNode":
         """
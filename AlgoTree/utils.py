@@ -1,5 +1,6 @@
 from collections import deque
-from typing import Any, Callable, Deque, List, Tuple, Type
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Tuple, Type
+from AlgoTree.payload_view import PayloadView
 from AlgoTree.treenode_api import TreeNodeApi
 
 def visit(node: Any,
@@ -125,8 +126,13 @@ def descendants(node) -> List:
     Get the descendants of a node.
 
     :param node: The root node.
-    :return: List of descendant nodes.
+    :return: List of descendant nodes, in pre-order.
     """
+    hook = getattr(type(node), "_descendants", None)
+    if hook is not None:
+        results = hook(node)
+        if results is not None:
+            return results
     results = []
     visit(node, lambda n: results.append(n) or False, order="pre")
     return results[1:]
@@ -174,13 +180,18 @@ def height(node) -> int:
     return _height(node)
 
 
-def depth(node) -> int:
+def depth(node, index=None) -> int:
     """
     Get the depth of a node in its subtree view.
 
     :param node: The node.
+    :param index: An optional `IntervalIndex` or `AncestorIndex` containing
+                  the node. The depth is then relative to the root of the
+                  index and is looked up in O(1).
     :return: The depth of the node.
     """
+    if index is not None:
+        return index.depth(node)
     return 0 if is_root(node) else 1 + depth(node.parent)
 
 
@@ -214,25 +225,33 @@ def is_internal(node) -> bool:
     return len(node.children) > 0
 
 
-def is_ancestor(node, other) -> bool:
+def is_ancestor(node, other, index=None) -> bool:
     """
     Check if `node` is an ancestor of `other`.
 
     :param node: The node to check.
     :param other: The other node.
+    :param index: An optional `IntervalIndex` containing both nodes, which
+                  answers the query in O(1).
     :return: True if the node is an ancestor of the other node, False otherwise.
     """
+    if index is not None:
+        return index.is_ancestor(node, other)
     return other in descendants(node)
 
 
-def is_descendant(node, other) -> bool:
+def is_descendant(node, other, index=None) -> bool:
     """
     Check if node `node` is a descendant of node `other`.
 
     :param node: The node to check for being a descendant.
     :param other: The node to check for being a descendant of.
+    :param index: An optional `IntervalIndex` containing both nodes, which
+                  answers the query in O(1).
     :return: True if `node` is a descendant of `other`, False otherwise.
     """
+    if index is not None:
+        return index.is_descendant(node, other)
     return node in descendants(other)
 
 
@@ -486,23 +505,36 @@ def path(node: Any) -> List:
     """
     return find_path(node.root, node)
 
-def size(node: Any) -> int:
+def size(node: Any, index=None) -> int:
     """
     Get the size of the subtree under the current node.
 
     :param node: The node.
+    :param index: An optional `IntervalIndex` containing the node, which
+                  answers the query in O(1).
     :return: The number of descendents of the node.
     """
+    if index is not None:
+        return index.size(node)
+    hook = getattr(type(node), "_size", None)
+    if hook is not None:
+        result = hook(node)
+        if result is not None:
+            return result
     return len(descendants(node)) + 1
 
-def lca(node1: Any, node2: Any) -> Any:
+def lca(node1: Any, node2: Any, index=None) -> Any:
     """
     Find the lowest common ancestor of two nodes.
 
     :param node1: The first node.
     :param node2: The second node.
+    :param index: An optional `AncestorIndex` containing both nodes, which
+                  answers the query in O(log n).
     :return: The lowest common ancestor of the two nodes.
     """
+    if index is not None:
+        return index.lca(node1, node2)
     path1 = path(node1)
     path2 = path(node2)
     lca_node = None
@@ -513,17 +545,143 @@ def lca(node1: Any, node2: Any) -> Any:
             break
     return lca_node
 
-def distance(node1: Any, node2: Any) -> int:
+def distance(node1: Any, node2: Any, index=None) -> int:
     """
     Find the distance between two nodes.
 
     :param node1: The first node.
     :param node2: The second node.
+    :param index: An optional `AncestorIndex` containing both nodes, which
+                  answers the query in O(log n).
     :return: The distance between the two nodes.
     """
+    if index is not None:
+        return index.distance(node1, node2)
     return depth(node1) + depth(node2) - 2 * depth(lca(node1, node2))
 
-def subtree_rooted_at(node: Any, max_lvl: int) -> Any:
+def _lca_offline(pairs: Iterable[Tuple[Any, Any]],
+                 root: Any = None,
+                 key: Callable[[Any], Any] = None) -> Iterator[Tuple[int, int, int, List, List]]:
+    """
+    Tarjan's offline lowest common ancestor algorithm. Answers all the
+    queries in a single DFS over the tree rooted at `root`, using a
+    union-find structure over the nodes visited so far.
+
+    :return: For each pair, in input order, a tuple `(a, b, l, nodes, depths)`
+             of the DFS numbers of the two nodes and of their LCA, together
+             with the lists that map DFS numbers to nodes and depths.
+    """
+    if key is None:
+        from AlgoTree.tree_index import node_key as key
+
+    pairs = iter(pairs)
+    first = next(pairs, None)
+    if first is None:
+        return
+    if root is None:
+        root = first[0].root
+
+    keys = [(key(first[0]), key(first[1]))]
+    keys.extend((key(a), key(b)) for a, b in pairs)
+    queries: Dict[Any, List[Tuple[Any, int]]] = {}
+    for qi, (a, b) in enumerate(keys):
+        queries.setdefault(a, []).append((b, qi))
+        if a != b:
+            queries.setdefault(b, []).append((a, qi))
+
+    ids: Dict[Any, int] = {}
+    nodes: List[Any] = []
+    depths: List[int] = []
+    uf: List[int] = []
+    ancestor: List[int] = []
+    done: List[bool] = []
+    answers: List[Any] = [None] * len(keys)
+
+    def _find(x):
+        r = x
+        while uf[r] != r:
+            r = uf[r]
+        while uf[x] != r:
+            uf[x], x = r, uf[x]
+        return r
+
+    def _visit(node, depth):
+        u = len(nodes)
+        k = key(node)
+        ids[k] = u
+        nodes.append(node)
+        depths.append(depth)
+        uf.append(u)
+        ancestor.append(u)
+        done.append(False)
+        return u, k
+
+    u, k = _visit(root, 0)
+    stack = [(u, k, iter(root.children))]
+    while stack:
+        u, k, children = stack[-1]
+        child = next(children, None)
+        if child is not None:
+            c, ck = _visit(child, depths[u] + 1)
+            stack.append((c, ck, iter(child.children)))
+            continue
+
+        stack.pop()
+        done[u] = True
+        for other, qi in queries.get(k, ()):
+            w = ids.get(other)
+            if w is not None and done[w]:
+                answers[qi] = ancestor[_find(w)]
+        if stack:
+            p = stack[-1][0]
+            uf[_find(u)] = _find(p)
+            ancestor[_find(p)] = p
+
+    for qi, (a, b) in enumerate(keys):
+        if answers[qi] is None:
+            missing = a if a not in ids else b
+            raise KeyError(f"Node not in tree: {missing!r}")
+        yield ids[a], ids[b], answers[qi], nodes, depths
+
+
+def batch_lca(pairs: Iterable[Tuple[Any, Any]],
+              root: Any = None,
+              key: Callable[[Any], Any] = None) -> Iterator[Any]:
+    """
+    Find the lowest common ancestors of many pairs of nodes at once, using
+    Tarjan's offline algorithm. All the pairs are read first, and then a
+    single traversal of the tree answers all of them in near-linear time,
+    instead of one `lca` call (and tree walk) per pair.
+
+    :param pairs: An iterable of pairs of nodes.
+    :param root: The root of the tree containing the nodes. Defaults to the
+                 root of the first node of the first pair.
+    :param key: A function to map nodes to the keys that identify them. See
+                `AlgoTree.tree_index.node_key` for the default.
+    :return: An iterator over the lowest common ancestors, in input order.
+    :raises KeyError: If a node is not in the tree.
+    """
+    for _, _, l, nodes, _ in _lca_offline(pairs, root, key):
+        yield nodes[l]
+
+
+def batch_distance(pairs: Iterable[Tuple[Any, Any]],
+                   root: Any = None,
+                   key: Callable[[Any], Any] = None) -> Iterator[int]:
+    """
+    Find the distances between many pairs of nodes at once. See `batch_lca`.
+
+    :param pairs: An iterable of pairs of nodes.
+    :param root: The root of the tree containing the nodes. Defaults to the
+                 root of the first node of the first pair.
+    :param key: A function to map nodes to the keys that identify them.
+    :return: An iterator over the distances, in input order.
+    :raises KeyError: If a node is not in the tree.
+    """
+    for a, b, l, _, depths in _lca_offline(pairs, root, key):
+        yield depths[a] + depths[b] - 2 * depths[l]
+
+def subtree_rooted_at(node: Any, max_lvl: int, index=None) -> Any:
     """
     Get the subtree centered at a node within a certain number of hops
     from the node. We return a subtree rooted at some ancestor of the node,
@@ -531,20 +689,34 @@ def subtree_rooted_at(node: Any, max_lvl: int) -> Any:
     from the node.
 
     :param node: The node.
+    :param index: An optional `IntervalIndex` containing the node, which
+                  makes the membership test for each node O(1).
     :return: The subtree centered at the node.
     """
-    
-    within_hops = []
-    def _helper(node, **kwargs):
-        within_hops.append(node)
-        return False
-    breadth_first(node, _helper, max_lvl)
+
+    if index is not None:
+        # look up the nodes up front, since cloning may change the tree
+        # structure and invalidate the index
+        max_depth = index.depth(node) + max_lvl
+        keep = {index.key(n) for n in index.descendants(node)
+                if index.depth(n) <= max_depth}
+        def _within_hops(n):
+            return index.key(n) in keep
+    else:
+        within_hops = []
+        def _helper(node, **kwargs):
+            within_hops.append(node)
+            return False
+        breadth_first(node, _helper, max_lvl)
+
+        def _within_hops(n):
+            return n in within_hops
 
     def _build(n, par):
         #new_node = type(n)(name=n.name, payload=n.payload, parent=par)
         new_node = n.clone(par)
         for c in n.children:
-            if c in within_hops:
+            if _within_hops(c):
                 _build(c, new_node)
         return new_node
     
@@ -579,9 +751,20 @@ def subtree_centered_at(node: Any, max_hops: int) -> Any:
     return _build(root, None)
 
 
+def _payload_copy(node) -> Dict:
+    """
+    Get a copy of the payload of a node, made in a single pass over its
+    payload view if it has one (see `PayloadView`), otherwise its `payload`.
+    """
+    view = getattr(node, "payload_view", None)
+    if isinstance(view, PayloadView):
+        return view.copy()
+    return node.payload
+
+
 def node_stats(node,
                node_name: Callable = lambda node: node.name,
-               payload: Callable = lambda node: node.payload):
+               payload: Callable = _payload_copy):
     """
     Gather statistics about the current node and its subtree.
 
@@ -589,7 +772,8 @@ def node_stats(node,
     :param node_name: A function that returns the name of a node. Defaults to
                       returning the node's `name` property.
     :param payload: A function that returns the payload of a node. Defaults to
-                    returning the node's `payload` property.
+                    a copy of the payload of the node (the only copy made, so
+                    the statistics do not alias the node).
     :return: A dictionary containing the statistics.
     """
     #TreeNodeApi.check(node)
@@ -624,7 +808,8 @@ def paths_to_tree(paths: List,
                   type: Type,
                   node_name: Callable = None,
                   payload: Callable = None,
-                  max_tries: int = float("inf")) -> type:
+                  max_tries: int = float("inf"),
+                  key_allocator: Callable = None) -> type:
     """
     Convert a list of paths to a tree structure. Each path is a list of nodes
     from the root to a leaf node. (A tree can be uniquely identified by
@@ -653,8 +838,21 @@ def paths_to_tree(paths: List,
         └── C
             └── F
 
+    If a name is already taken in the tree (the node type raises a KeyError,
+    e.g., `FlatTreeNode`), the node is given a new key: one allocated by
+    `key_allocator` if it is given (see `AlgoTree.key_allocator`), which
+    takes a single try, and otherwise the first free one of `name_0`,
+    `name_1`, ..., up to `max_tries` tries.
+
     :param paths: The list of paths.
     :param type: The type of the tree node.
+    :param node_name: A function that returns the name of a node.
+    :param payload: A function that returns the payload of a node.
+    :param max_tries: The maximum number of tries to find a free name.
+    :param key_allocator: The allocator of the keys of nodes whose name is
+                          taken.
+    :return: The root of the tree.
+    :raises ValueError: If no free name was found in `max_tries` tries.
     """
     nodes = { }
     if node_name is None:
@@ -662,28 +860,35 @@ def paths_to_tree(paths: List,
     if payload is None:
         payload = lambda n: n.payload if hasattr(n, "payload") else {}
 
+    def _names(name, parent):
+        yield name
+        if key_allocator is not None:
+            yield key_allocator(getattr(parent, "tree", None))
+            return
+        tries = 0
+        while tries < max_tries:
+            yield f"{name}_{tries}"
+            tries += 1
+
     for p in paths:
         parent = None
         path = []
         for n in p:
             path.append(n)
             path_tuple = tuple(path)
-            name = node_name(n)
-            data = payload(n)
-            if not isinstance(data, dict):
-                data = { "payload": data }
-
             if path_tuple not in nodes:
-                for tries in range(max_tries):
+                name = node_name(n)
+                data = payload(n)
+                if not isinstance(data, dict):
+                    data = { "payload": data }
+                for key in _names(name, parent):
                     try:
-                        new_node = type(name=f"{name}_{tries}", parent=parent, **data)
+                        nodes[path_tuple] = type(name=key, parent=parent, **data)
                         break
-                    except KeyError as e:
+                    except KeyError:
                         pass
-
-                if tries == max_tries:
+                else:
                     raise ValueError(f"Failed to create node with prefix {name}.")
-                nodes[path_tuple] = new_node
             parent = nodes[path_tuple]
     return parent.root
 
@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
 import logging
 import sys
 import textwrap
 
-from AlgoTree.dicttree import DictTree
+from AlgoTree.tree_loader import load_mapping
 
 
 def main():
@@ -51,7 +50,6 @@ def main():
         "--mapping-key",
         default="mapping",
         type=str,
-        nargs=1,
         metavar="KEY",
         help="The key in the JSON that maps to the structure of the tree",
     )
@@ -172,10 +170,7 @@ def main():
             parser.print_usage()
             sys.exit(1)
 
-        tree = DictTree(
-            data=json.load(args.file), mapping_key=args.mapping_key
-        )
-        tree.verify_integrity()
+        tree = load_mapping(args.file, mapping_key=args.mapping_key, validate=True)
 
         if args.size:
             print(len(tree))
@@ -6,7 +6,7 @@ import logging
 import sys
 import textwrap
 
-from AlgoTree.dicttree import DictTree
+from AlgoTree.tree_loader import load_mapping
 
 
 def show_json_spec():
@@ -69,6 +69,13 @@ def main():
         help="Print the specification of the JSON data structure",
     )
     parser.add_argument("--version", action="version", version="%(prog)s 1.0")
+    parser.add_argument(
+        "--mapping-key",
+        default="mapping",
+        type=str,
+        metavar="KEY",
+        help="The key in the JSON that maps to the structure of the tree",
+    )
     parser.add_argument(
         "--size", action="store_true", help="Print the size of the tree"
     )
@@ -215,10 +222,7 @@ def main():
             parser.print_usage()
             sys.exit(1)
 
-        tree = DictTree(
-            data=json.load(args.file), mapping_key=args.mapping_key
-        )
-        tree.verify_integrity()
+        tree = load_mapping(args.file, mapping_key=args.mapping_key, validate=True)
 
         if args.size:
             print(len(tree))
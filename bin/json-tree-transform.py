@@ -7,6 +7,7 @@ import sys
 import textwrap
 
 from AlgoTree.flattree import FlatTree
+from AlgoTree.tree_loader import load_mapping
 from AlgoTree.treenode import TreeNode
 from AlgoTree import utils
 
@@ -47,6 +48,13 @@ def main():
         help="Print the specification of the JSON data structure",
     )
     parser.add_argument("--version", action="version", version="%(prog)s 1.0")
+    parser.add_argument(
+        "--mapping-key",
+        default="mapping",
+        type=str,
+        metavar="KEY",
+        help="The key in the JSON that maps to the structure of the tree",
+    )
     parser.add_argument(
         "--add-node",
         metavar=("PARENT_NODE", "NODE_KEY", "NODE_DATA"),
@@ -111,10 +119,7 @@ def main():
             parser.print_usage()
             sys.exit(1)
 
-        tree = DictTree(
-            data=json.load(args.file), mapping_key=args.mapping_key
-        )
-        tree.verify_integrity()
+        tree = load_mapping(args.file, mapping_key=args.mapping_key, validate=True)
 
         if args.size:
             print(len(tree))
@@ -1,11 +1,12 @@
 #!/usr/bin/env python3
 
 import argparse
-import json
 import logging
 import sys
 
 from AlgoTree.flattree import FlatTree
+from AlgoTree.pretty_tree import pretty_tree
+from AlgoTree.tree_loader import load_mapping
 
 
 def main():
@@ -41,19 +42,23 @@ def main():
         help="Print the specification of the JSON data structure",
     )
     parser.add_argument("--version", action="version", version="%(prog)s 1.0")
+    parser.add_argument(
+        "--mapping-key",
+        default="mapping",
+        type=str,
+        metavar="KEY",
+        help="The key in the JSON that maps to the structure of the tree",
+    )
 
     args = parser.parse_args()
 
     try:
         if args.schema:
-            FlatTree.schema()
+            print(FlatTree.__doc__)
             sys.exit(0)
 
         # Caution: eval can be risky with untrusted input
         node_name = eval(args.node_name)
-        fallback_node_name = (
-            eval(args.fallback_node_name) if args.fallback_node_name else None
-        )
 
         if args.file == sys.stdin and sys.stdin.isatty():
             print(
@@ -62,23 +67,14 @@ def main():
             )
             parser.print_usage()
             sys.exit(1)
-        tree = DictTree(
-            data=json.load(args.file), mapping_key=args.mapping_key
-        )
-        tree.verify_integrity()
+        tree = load_mapping(args.file, mapping_key=args.mapping_key, validate=True)
 
+        text = pretty_tree(tree.root, node_name=node_name)
         if args.output:
-            tree.save(
-                outfile=args.output,
-                node_name=node_name,
-                fallback_node_name=fallback_node_name,
-            )
+            with open(args.output, "w") as f:
+                f.write(text)
         else:
-            print(
-                tree.to_string(
-                    node_name=node_name, fallback_node_name=fallback_node_name
-                )
-            )
+            print(text)
 
     except Exception as e:
         logging.error(e)
@@ -6,7 +6,7 @@ import logging
 import sys
 import textwrap
 
-from AlgoTree.dicttree import DictTree
+from AlgoTree.tree_loader import load_mapping
 
 
 def show_json_spec():
@@ -82,7 +82,6 @@ def main():
         "--mapping-key",
         default="mapping",
         type=str,
-        nargs=1,
         metavar="KEY",
         help="The key in the JSON that maps to the structure of the tree",
     )
@@ -232,10 +231,7 @@ def main():
             parser.print_usage()
             sys.exit(1)
 
-        tree = DictTree(
-            data=json.load(args.file), mapping_key=args.mapping_key
-        )
-        tree.verify_integrity()
+        tree = load_mapping(args.file, mapping_key=args.mapping_key, validate=True)
 
         if args.size:
             print(len(tree))
@@ -6,7 +6,7 @@ import logging
 import sys
 import textwrap
 
-from AlgoTree.dicttree import DictTree
+from AlgoTree.tree_loader import load_mapping
 
 
 def show_json_spec():
@@ -150,10 +150,7 @@ def main():
             parser.print_usage()
             sys.exit(1)
 
-        tree = DictTree(
-            data=json.load(args.file), mapping_key=args.mapping_key
-        )
-        tree.verify_integrity()
+        tree = load_mapping(args.file, mapping_key=args.mapping_key, validate=True)
 
         if args.size:
             print(len(tree))
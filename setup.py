@@ -18,6 +18,7 @@ setup(
             'sphinxcontrib-napoleon',
             'coverage',
         ],
+        'numpy': ['numpy'],
     },
     test_suite="tests",
     #    entry_points={
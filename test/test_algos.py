@@ -1,5 +1,6 @@
 import unittest
-from AlgoTree.utils import node_to_leaf_paths, prune
+from AlgoTree.utils import (
+    batch_distance, batch_lca, distance, lca, node_to_leaf_paths, prune)
 from AlgoTree.treenode import TreeNode
 from AlgoTree.flattree_node import FlatTreeNode
 
@@ -66,6 +67,24 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(len(pruned_tree.children[0].children), 1)
         self.assertEqual(pruned_tree.children[0].children[0].name, "G")
 
+    def test_batch_lca(self):
+        pairs = [
+            (self.node_e, self.node_h),
+            (self.node_h, self.node_g),
+            (self.node_b, self.node_h),
+            (self.node_d, self.node_d),
+            (self.node_a, self.node_g),
+            (self.node_g, self.node_c),
+        ]
+        expected = ["B", "A", "B", "D", "A", "C"]
+        result = batch_lca(pairs)
+        self.assertEqual([n.name for n in result], expected)
+        self.assertEqual([n.name for n in batch_lca(iter(pairs))],
+                         [lca(a, b).name for a, b in pairs])
+        self.assertEqual(list(batch_distance(pairs)),
+                         [distance(a, b) for a, b in pairs])
+        self.assertEqual(list(batch_lca([])), [])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,187 @@
+import math
+import unittest
+
+from AlgoTree import columnar
+from AlgoTree.columnar import ColumnStore
+from AlgoTree.compact_flattree import CompactFlatTree
+from AlgoTree.flattree import FlatTree
+from AlgoTree.utils import descendants, find_nodes, leaves
+
+
+class TestColumnStore(unittest.TestCase):
+    def setUp(self):
+        self.tree = FlatTree({
+            "a": {"parent": None, "score": 0.5, "count": 1},
+            "b": {"parent": "a", "score": 0.95, "count": 2},
+            "c": {"parent": "a", "count": 3},
+            "d": {"parent": "b", "score": 0.99, "count": 4},
+            "e": {"parent": "b", "score": 0.1, "count": 5},
+            "f": {"parent": "c", "score": 0.92, "count": 6},
+        })
+        self.store = ColumnStore(self.tree, ["score", "count"])
+
+    def test_columns(self):
+        self.assertEqual(self.store["count"].type, int)
+        self.assertEqual(list(self.store["count"].values()), [1, 2, 3, 4, 5, 6])
+        self.assertTrue(math.isnan(self.store["score"].values()[2]))
+
+    def test_find_nodes(self):
+        expected = find_nodes(self.tree.root, lambda n: n.score is not None and n.score > 0.9)
+        found = self.store.find_nodes(self.store["score"] > 0.9)
+        self.assertEqual([n.name for n in found], [n.name for n in expected])
+        mask = (self.store["score"] > 0.9) & (self.store["count"] >= 4)
+        self.assertEqual(self.store.find_keys(mask), ["d", "f"])
+        self.assertEqual(self.store.find_keys(~mask | (self.store["count"] == 6)),
+                         ["a", "b", "c", "e", "f"])
+        self.assertEqual(mask.count(), 2)
+
+    def test_leaves(self):
+        self.assertCountEqual([n.name for n in self.store.leaves()],
+                              [n.name for n in leaves(self.tree.root)])
+        self.assertEqual([n.name for n in self.store.leaves(self.store["score"] < 0.5)],
+                         ["e"])
+
+    def test_update(self):
+        n = self.store.update("count", 0, where=self.store["score"] > 0.9)
+        self.assertEqual(n, 3)
+        self.assertEqual(self.tree["b"]["count"], 0)
+        self.assertEqual(self.tree["a"]["count"], 1)
+        self.assertEqual(list(self.store["count"].values()), [1, 0, 3, 0, 5, 0])
+        self.store.update("score", [0.0, 0.1, 0.2, 0.3, 0.4, 0.5])
+        self.assertEqual(self.tree["f"]["score"], 0.5)
+        FlatTree.check_valid(self.tree)
+
+    def test_refresh_on_structure_change(self):
+        self.tree.root.add_child(name="g", score=0.97, count=7)
+        self.assertEqual(self.store.find_keys(self.store["score"] > 0.96),
+                         ["d", "g"])
+
+    def test_follow_payload_changes(self):
+        self.tree.enable_journal()
+        self.tree.node("c")["score"] = 0.97
+        self.tree.node("b")["count"] = 8
+        self.assertEqual(self.store.find_keys(self.store["score"] > 0.96),
+                         ["c", "d"])
+        self.assertEqual(self.store["count"].values()[1], 8)
+        del self.tree.node("d")["score"]
+        self.tree["e"] = {"parent": "b", "score": 0.98, "count": 5}
+        self.assertEqual(self.store.find_keys(self.store["score"] > 0.96),
+                         ["c", "e"])
+        # a missing integer field is rejected on the next access
+        del self.tree.node("a")["count"]
+        with self.assertRaises(ValueError):
+            self.store["count"]
+        self.tree.node("a")["count"] = 1
+        self.store.refresh()
+        self.assertEqual(self.store["count"].values()[0], 1)
+        # the subscription does not keep the store alive
+        store = ColumnStore(self.tree, ["score"])
+        subscribers = len(self.tree.journal._subscribers)
+        del store
+        self.tree.node("a")["score"] = 0.4
+        self.assertEqual(len(self.tree.journal._subscribers), subscribers - 1)
+
+    def test_journal_not_enabled(self):
+        # the store does not enable the journal of the tree...
+        self.assertEqual(list(self.store["count"].values()), [1, 2, 3, 4, 5, 6])
+        self.assertIsNone(self.tree.journal)
+        # ...nor re-enable it after it is disabled
+        self.tree.enable_journal()
+        self.store["count"]
+        self.tree.disable_journal()
+        self.tree.node("b")["count"] = 8
+        self.assertEqual(self.store["count"].values()[1], 8)
+        self.assertIsNone(self.tree.journal)
+        self.tree.node("b")["count"] = 9
+        self.assertEqual(self.store["count"].values()[1], 8)
+        self.store.refresh()
+        self.assertEqual(self.store["count"].values()[1], 9)
+
+    def test_compact_flattree(self):
+        tree = CompactFlatTree(self.tree)
+        store = ColumnStore(tree, {"count": int})
+        store.update("count", 9, where=store["count"] > 4)
+        self.assertEqual(tree["e"]["count"], 9)
+        self.assertEqual(store.find_keys(store["count"] == 9), ["e", "f"])
+
+    def test_invalid_fields(self):
+        self.tree["c"]["count"] = 2.5
+        with self.assertRaises(ValueError):
+            ColumnStore(self.tree, {"count": int})
+        del self.tree["c"]["count"]
+        with self.assertRaises(ValueError):
+            ColumnStore(self.tree, {"count": int})
+        with self.assertRaises(ValueError):
+            ColumnStore(self.tree, {"count": str})
+
+    def test_aggregate(self):
+        total = self.store.aggregate("count")
+        self.assertEqual(total.type, int)
+        self.assertEqual(list(total.values()), [21, 11, 9, 4, 5, 6])
+        for key in self.tree:
+            node = self.tree.node(key)
+            self.assertEqual(
+                total.values()[self.store.ids[key]],
+                node["count"] + sum(d["count"] for d in descendants(node)))
+        self.assertEqual(list(self.store.aggregate("count", "max").values()),
+                         [6, 5, 6, 4, 5, 6])
+        self.assertEqual(list(self.store.aggregate("count", "min").values()),
+                         [1, 2, 3, 4, 5, 6])
+        self.assertEqual(list(self.store.aggregate(None, "count").values()),
+                         [6, 3, 2, 1, 1, 1])
+        self.assertEqual(
+            list(self.store.aggregate(self.store.leaf_mask()).values()),
+            [3, 2, 1, 1, 1, 1])
+        self.assertEqual(self.store.find_keys(self.store.aggregate("count") > 10),
+                         ["a", "b"])
+        self.assertEqual(
+            list(self.store.aggregate("count", lambda x, y: x * y).values()),
+            [720, 40, 18, 4, 5, 6])
+        with self.assertRaises(ValueError):
+            self.store.aggregate("count", "median")
+
+    def test_aggregate_missing_values(self):
+        self.tree["g"] = {"parent": "e", "count": 7}
+        nan = math.nan
+        expected = {
+            "sum": [3.46, 2.04, 0.92, 0.99, 0.1, 0.92, 0.0],
+            "min": [0.1, 0.1, 0.92, 0.99, 0.1, 0.92, nan],
+            "max": [0.99, 0.99, 0.92, 0.99, 0.1, 0.92, nan],
+        }
+        # the same results with and without NumPy
+        np = columnar.np
+        paths = [None] if np is None else [None, np]
+        try:
+            for columnar.np in paths:
+                store = ColumnStore(self.tree, ["score"])
+                for op, values in expected.items():
+                    with self.subTest(numpy=columnar.np is not None, op=op):
+                        result = list(store.aggregate("score", op).values())
+                        self.assertEqual([math.isnan(x) for x in result],
+                                         [math.isnan(x) for x in values])
+                        for x, y in zip(result, values):
+                            if not math.isnan(y):
+                                self.assertAlmostEqual(x, y)
+        finally:
+            columnar.np = np
+
+    def test_aggregate_detached_and_cycle(self):
+        self.tree.detach("b")
+        self.assertEqual(list(self.store.aggregate("count").values()),
+                         [10, 11, 9, 4, 5, 6])
+        self.tree["a"]["parent"] = "f"
+        self.store.refresh()
+        with self.assertRaises(ValueError):
+            self.store.aggregate("count")
+
+    def test_fold(self):
+        self.tree["d"]["tags"] = ["x"]
+        self.tree["f"]["tags"] = ["y", "z"]
+        tags = self.store.fold(lambda v: set(v.get("tags", ())), set.union)
+        self.assertEqual(tags["a"], {"x", "y", "z"})
+        self.assertEqual(tags["b"], {"x"})
+        self.assertEqual(tags["e"], set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+import tracemalloc
+import unittest
+
+from AlgoTree.compact_flattree import CompactFlatTree, CompactFlatTreeNode
+from AlgoTree.flattree import FlatTree
+from AlgoTree.utils import depth, descendants, lca, leaves
+
+
+class TestCompactFlatTree(unittest.TestCase):
+    def setUp(self):
+        self.flat_tree = FlatTree({
+            "a": {"parent": None, "value": 1},
+            "b": {"parent": "a", "value": 2},
+            "c": {"parent": "a"},
+            "d": {"parent": "b"},
+            "e": {"parent": "b"},
+            "f": {"parent": "c"},
+        })
+        self.tree = CompactFlatTree(self.flat_tree)
+
+    def test_round_trip(self):
+        self.assertEqual(len(self.tree), 6)
+        self.assertEqual(self.tree["b"], {"parent": "a", "value": 2})
+        self.assertEqual(self.tree.to_flattree(), FlatTree({
+            "a": {"parent": None, "value": 1},
+            "b": {"parent": "a", "value": 2},
+            "c": {"parent": "a"},
+            "d": {"parent": "b"},
+            "e": {"parent": "b"},
+            "f": {"parent": "c"},
+        }))
+        self.assertEqual(CompactFlatTree(self.tree.to_flattree()).to_dict(),
+                         self.tree.to_dict())
+
+    def test_child_keys(self):
+        self.assertEqual(self.tree.child_keys("a"), ["b", "c"])
+        self.assertEqual(self.tree.child_keys("b"), ["d", "e"])
+        self.assertEqual(self.tree.child_keys("f"), [])
+        with self.assertRaises(KeyError):
+            self.tree.child_keys("non_existing")
+
+    def test_mutation(self):
+        self.tree["g"] = {"parent": "c", "value": 7}
+        self.assertEqual(self.tree.child_keys("c"), ["f", "g"])
+        self.tree["g"] = {"parent": "b"}
+        self.assertEqual(self.tree.child_keys("c"), ["f"])
+        self.assertEqual(self.tree.child_keys("b"), ["d", "e", "g"])
+        self.assertEqual(self.tree["g"], {"parent": "b"})
+
+        del self.tree["b"]
+        self.assertNotIn("b", self.tree)
+        self.assertEqual(self.tree.child_keys("a"), ["c"])
+        # "b" is still the parent of "d", "e" and "g"
+        self.assertEqual(self.tree.child_keys("b"), ["d", "e", "g"])
+
+    def test_root(self):
+        self.assertEqual(self.tree.root_key, "a")
+        self.assertEqual(self.tree.root.name, "a")
+        self.tree["x"] = {}
+        self.assertEqual(self.tree.root_keys, ["a", "x"])
+        self.assertEqual([t.name for t in self.tree.forest], ["a", "x"])
+
+    def test_detach_and_prune(self):
+        detached = self.tree.detach("b")
+        self.assertEqual(detached.name, "b")
+        self.assertEqual(self.tree["b"]["parent"], FlatTree.DETACHED_KEY)
+        self.assertEqual(
+            [n.name for n in self.tree.detached.children], ["b"])
+
+        pruned = self.tree.prune("b")
+        self.assertCountEqual(pruned, ["b", "d", "e"])
+        self.assertEqual(list(self.tree), ["a", "c", "f"])
+        FlatTree.check_valid(self.tree)
+
+    def test_many_keys(self):
+        tree = CompactFlatTree({"": {}})
+        for i in range(1000):
+            tree[f"k{i}"] = {"parent": f"k{i // 10}" if i else ""}
+        tree["ключ"] = {"parent": "k5"}
+        self.assertEqual(len(tree), 1002)
+        self.assertEqual(tree["k123"], {"parent": "k12"})
+        self.assertEqual(tree.child_keys("k5"), [f"k{i}" for i in range(50, 60)] + ["ключ"])
+        self.assertNotIn("k1000", tree)
+        self.assertEqual(tree.root_key, "")
+
+        # unlinking from the front, middle and back of the siblings
+        for key in ("k50", "k55", "ключ", "k59"):
+            tree.detach(key)
+        self.assertEqual(tree.child_keys("k5"),
+                         ["k51", "k52", "k53", "k54", "k56", "k57", "k58"])
+        tree["k58"] = {"parent": "k5"}
+        tree["k1"] = {"parent": "k5"}
+        self.assertEqual(tree.child_keys("k5")[-2:], ["k58", "k1"])
+        FlatTree.check_valid(tree)
+        with self.assertRaises(TypeError):
+            tree[1] = {}
+
+    def test_memory(self):
+        n = 5000
+
+        def _items():
+            yield "n0", {}
+            for i in range(1, n):
+                yield f"n{i}", {"parent": f"n{(i - 1) // 4}"}
+
+        tracemalloc.start()
+        try:
+            tree = CompactFlatTree(_items())
+            used = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(len(tree), n)
+        # about 50 bytes per node (10M nodes in well under 1 GB), including
+        # the keys
+        self.assertLess(used / n, 80)
+
+    def test_node(self):
+        node_d = self.tree.node("d")
+        self.assertEqual(node_d.root.name, "a")
+        self.assertEqual(node_d.parent.name, "b")
+        self.assertEqual(depth(node_d), 2)
+        self.assertEqual(lca(node_d, self.tree.node("f")).name, "a")
+
+        subtree = self.tree.subtree("b")
+        self.assertIsNone(subtree.parent)
+        self.assertEqual([n.name for n in descendants(subtree)], ["d", "e"])
+        self.assertEqual([n.name for n in leaves(self.tree.root)],
+                         ["d", "e", "f"])
+        with self.assertRaises(KeyError):
+            self.tree.node("non_existing")
+
+
+class TestCompactFlatTreeNode(unittest.TestCase):
+    def setUp(self):
+        self.tree = CompactFlatTree({"root": {"data": 0}})
+        self.root = self.tree.root
+
+    def test_add_child(self):
+        child = self.root.add_child(name="child", data=1)
+        self.assertIsInstance(child, CompactFlatTreeNode)
+        self.assertEqual(child.parent, self.root)
+        self.assertEqual(self.tree["child"], {"parent": "root", "data": 1})
+        with self.assertRaises(KeyError):
+            self.root.add_child(name="child")
+
+    def test_payload(self):
+        self.assertEqual(self.root.payload, {"data": 0})
+        self.root["extra"] = 1
+        self.assertEqual(self.root.payload, {"data": 0, "extra": 1})
+        del self.root["data"]
+        self.root.payload = {"new": 2}
+        self.assertEqual(dict(self.root), {"new": 2})
+        self.assertEqual(len(self.root), 1)
+        with self.assertRaises(ValueError):
+            self.root.payload = {"parent": "x"}
+
+    def test_payload_attributes(self):
+        self.assertEqual(self.root.data, 0)
+        self.assertIsNone(self.root.missing)
+        self.assertEqual(self.root.name, "root")
+
+    def test_set_parent_and_children(self):
+        a = self.root.add_child(name="a")
+        b = self.root.add_child(name="b")
+        c = a.add_child(name="c")
+        c.parent = b
+        self.assertEqual(self.tree.child_keys("a"), [])
+        self.assertEqual(self.tree.child_keys("b"), ["c"])
+
+        b.children = [a]
+        self.assertEqual(self.tree.child_keys("b"), ["a"])
+        self.assertEqual(self.tree["c"]["parent"], FlatTree.DETACHED_KEY)
+
+    def test_set_parent_other_tree(self):
+        other = CompactFlatTree({"x": {}})
+        a = self.root.add_child(name="a", data=1)
+        a.parent = other.root
+        self.assertEqual(other["a"], {"parent": "x", "data": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
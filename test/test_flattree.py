@@ -1,3 +1,4 @@
+import copy
 import unittest
 
 from AlgoTree.flattree import FlatTree
@@ -82,6 +83,87 @@ class TestFlatTree(unittest.TestCase):
         with self.assertRaises(KeyError):
             FlatTree.check_valid(self.flat_tree)
 
+    def test_check_valid_collect(self):
+        self.assertEqual(FlatTree.check_valid(self.flat_tree, collect=True), [])
+
+        self.flat_tree["b"]["parent"] = "e"
+        self.flat_tree["c"] = "invalid"
+        self.flat_tree["g"] = {"parent": "non_existing"}
+        self.flat_tree["h"] = {}
+        self.flat_tree["i"] = {"parent": FlatTree.DETACHED_KEY}
+        violations = FlatTree.check_valid(self.flat_tree, collect=True)
+        self.assertEqual(
+            [(v["error"], v["keys"]) for v in violations],
+            [("cycle", ["b", "e"]),
+             ("invalid_node", ["c"]),
+             ("missing_parent", ["g", "non_existing"]),
+             ("multiple_roots", ["a", "h"])])
+
+        with self.assertRaises(ValueError):
+            FlatTree.check_valid(self.flat_tree)
+
+    def test_check_valid_deep(self):
+        n = 100000
+        tree = FlatTree({"n0": {}})
+        tree.update({f"n{i}": {"parent": f"n{i - 1}"} for i in range(1, n)})
+        FlatTree.check_valid(tree)
+
+        tree["n0"]["parent"] = f"n{n - 1}"
+        violations = FlatTree.check_valid(tree, collect=True)
+        self.assertEqual(len(violations), 1)
+        self.assertEqual(violations[0]["error"], "cycle")
+        self.assertEqual(len(violations[0]["keys"]), n)
+
+    def test_child_index(self):
+        self.flat_tree["g"] = {"parent": "c"}
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f", "g"])
+
+        self.flat_tree.update({"g": {"parent": "b"}, "h": {"parent": "g"}})
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f"])
+        self.assertEqual(self.flat_tree.child_keys("b"), ["d", "e", "g"])
+        self.assertEqual(self.flat_tree.child_keys("g"), ["h"])
+
+        del self.flat_tree["g"]
+        self.assertEqual(self.flat_tree.child_keys("b"), ["d", "e"])
+        # "g" is still the parent of "h", even though it is not a node
+        self.assertEqual(self.flat_tree.child_keys("g"), ["h"])
+
+        self.flat_tree.reparent("d", "c")
+        self.assertEqual(self.flat_tree["d"]["parent"], "c")
+        self.assertEqual(self.flat_tree.child_keys("b"), ["e"])
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f", "d"])
+
+        self.flat_tree.detach("e")
+        self.assertEqual(self.flat_tree.child_keys("b"), [])
+        self.assertEqual(
+            self.flat_tree.child_keys(FlatTree.DETACHED_KEY), ["e"])
+
+    def test_child_index_node_writes(self):
+        node_b = self.flat_tree.node("b")
+        node_c = self.flat_tree.node("c")
+        node_b.payload = {"value": 1}
+        self.assertEqual(self.flat_tree.child_keys("a"), ["b", "c"])
+
+        node_b.parent = node_c
+        self.assertEqual(self.flat_tree.child_keys("a"), ["c"])
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f", "b"])
+
+        node_b["parent"] = "a"
+        self.assertEqual(self.flat_tree.child_keys("a"), ["c", "b"])
+
+    def test_child_index_in_place_edit(self):
+        self.flat_tree["d"]["parent"] = "c"
+        self.flat_tree.reindex()
+        self.assertEqual(self.flat_tree.child_keys("c"), ["d", "f"])
+
+    def test_child_index_copy(self):
+        self.flat_tree.reparent("b", "c")
+        tree_copy = copy.deepcopy(self.flat_tree)
+        self.assertEqual(tree_copy, self.flat_tree)
+        self.assertEqual(tree_copy.child_keys("c"), ["f", "b"])
+        tree_copy.reparent("f", "b")
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f", "b"])
+
     def test_node(self):
         node_b = self.flat_tree.node("b")
         self.assertEqual(node_b._key, "b")
@@ -93,10 +175,261 @@ class TestFlatTree(unittest.TestCase):
         root_node = self.flat_tree.root
         self.assertEqual(root_node._key, "a")
 
+    def test_batch(self):
+        with self.flat_tree.batch() as tree:
+            tree.reparent("d", "c")
+            tree["g"] = {"parent": "d"}
+            del tree["e"]
+            self.assertIs(tree._undo, self.flat_tree._undo)
+        self.assertIsNone(self.flat_tree._undo)
+        self.assertEqual(self.flat_tree.child_keys("b"), [])
+        # the same order as outside a batch: "d" was attached after "f"
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f", "d"])
+        self.assertEqual(self.flat_tree.child_keys("d"), ["g"])
+
+    def test_batch_no_reindex(self):
+        for i in range(100):
+            self.flat_tree[f"n{i}"] = {"parent": "f"}
+        reindex = self.flat_tree.reindex
+        calls = []
+        self.flat_tree.reindex = lambda: (calls.append(1), reindex())
+        with self.flat_tree.batch():
+            for i in range(50):
+                self.flat_tree.detach(f"n{i}")
+                self.flat_tree.node(f"n{i + 50}")["parent"] = "e"
+                self.assertEqual(self.flat_tree.root_key, "a")
+        self.assertEqual(calls, [])
+        self.assertEqual(len(self.flat_tree.child_keys("e")), 50)
+        self.assertEqual(len(self.flat_tree.child_keys(FlatTree.DETACHED_KEY)), 50)
+
+    def test_batch_read_inside(self):
+        with self.flat_tree.batch():
+            self.flat_tree.reparent("f", "b")
+            self.assertEqual(self.flat_tree.child_keys("b"), ["d", "e", "f"])
+            self.flat_tree["h"] = {"parent": "f"}
+            self.assertEqual(self.flat_tree.child_keys("f"), ["h"])
+
+    def test_batch_rollback(self):
+        original = copy.deepcopy(self.flat_tree)
+        with self.assertRaises(RuntimeError):
+            with self.flat_tree.batch():
+                self.flat_tree.reparent("d", "c")
+                self.flat_tree.node("b")["value"] = 1
+                self.flat_tree["g"] = {"parent": "d"}
+                del self.flat_tree["e"]
+                self.flat_tree.child_keys("c")
+                raise RuntimeError("abort")
+        self.assertEqual(self.flat_tree, original)
+        self.assertEqual(self.flat_tree.child_keys("b"), ["d", "e"])
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f"])
+
+    def test_batch_validate(self):
+        with self.assertRaises(ValueError):
+            with self.flat_tree.batch(validate=True):
+                self.flat_tree.reparent("a", "f")
+        self.assertIsNone(self.flat_tree["a"]["parent"])
+        self.assertEqual(self.flat_tree.root_key, "a")
+
+    def test_root_keys(self):
+        self.assertEqual(self.flat_tree.root_key, "a")
+        self.assertEqual(self.flat_tree.root_keys, ["a"])
+
+        self.flat_tree["x"] = {}
+        self.assertEqual(self.flat_tree.root_keys, ["a", "x"])
+        self.assertEqual(
+            [root.name for root in self.flat_tree.forest], ["a", "x"])
+
+        del self.flat_tree["a"]
+        self.assertEqual(self.flat_tree.root_key, "x")
+        self.flat_tree.reparent("x", "b")
+        with self.assertRaises(ValueError):
+            self.flat_tree.root_key
+
+    def test_subtree(self):
+        self.assertEqual(self.flat_tree.subtree()._key, "a")
+        self.assertEqual(self.flat_tree.subtree("b")._root_key, "b")
+        with self.assertRaises(KeyError):
+            self.flat_tree.subtree("non_existing")
+
     def test_detached(self):
         detached_node = self.flat_tree.detached
         self.assertEqual(detached_node._key, FlatTree.DETACHED_KEY)
 
+    def test_fork(self):
+        self.flat_tree["b"]["value"] = 1
+        fork = self.flat_tree.fork()
+        self.assertEqual(fork, self.flat_tree)
+        self.assertIs(fork["c"], self.flat_tree["c"])
+
+        fork.node("b")["value"] = 2
+        fork.reparent("f", "b")
+        fork["g"] = {"parent": "d"}
+        del fork["e"]
+        self.assertEqual(self.flat_tree["b"], {"parent": "a", "value": 1})
+        self.assertEqual(fork["b"], {"parent": "a", "value": 2})
+        self.assertEqual(self.flat_tree.child_keys("b"), ["d", "e"])
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f"])
+        self.assertEqual(fork.child_keys("b"), ["d", "f"])
+        self.assertEqual(fork.child_keys("d"), ["g"])
+        self.assertNotIn("g", self.flat_tree)
+        self.assertIs(fork["c"], self.flat_tree["c"])
+
+        # writes to the original do not leak into the fork either
+        self.flat_tree.node("c")["value"] = 3
+        self.flat_tree.detach("d")
+        self.assertNotIn("value", fork["c"])
+        self.assertEqual(fork["d"]["parent"], "b")
+        self.assertEqual(fork.child_keys("b"), ["d", "f"])
+
+    def test_copy_fork(self):
+        snapshot = self.flat_tree.snapshot()
+        fork = snapshot.fork()
+        fork.node("b")["value"] = 1
+        copied = copy.copy(fork)
+        copied.node("c")["value"] = 2
+        copied.node("b")["value"] = 3
+        fork.node("b")["value"] = 4
+        self.assertEqual(snapshot, self.tree_data)
+        self.assertEqual(fork["b"]["value"], 4)
+        self.assertNotIn("value", fork["c"])
+        self.assertEqual(copied["b"]["value"], 3)
+        self.assertEqual(copied["c"]["value"], 2)
+
+    def test_fork_batch_rollback(self):
+        fork = self.flat_tree.fork()
+        with self.assertRaises(RuntimeError):
+            with fork.batch():
+                fork.reparent("b", "c")
+                fork.node("a")["value"] = 1
+                raise RuntimeError
+        self.assertEqual(fork, self.flat_tree)
+        self.assertEqual(fork.child_keys("a"), ["b", "c"])
+        self.assertEqual(self.flat_tree.child_keys("a"), ["b", "c"])
+        with fork.batch():
+            with self.assertRaises(RuntimeError):
+                fork.fork()
+
+    def test_snapshot(self):
+        snapshot = self.flat_tree.snapshot()
+        self.flat_tree.reparent("f", "b")
+        self.flat_tree.node("a")["value"] = 1
+        self.assertEqual(snapshot, self.tree_data)
+        self.assertEqual(snapshot.child_keys("c"), ["f"])
+        self.assertEqual([n.name for n in snapshot.root.children], ["b", "c"])
+        with self.assertRaises(TypeError):
+            snapshot["g"] = {}
+        with self.assertRaises(TypeError):
+            snapshot.node("b")["value"] = 1
+        with self.assertRaises(TypeError):
+            snapshot.reparent("f", "b")
+        with self.assertRaises(TypeError):
+            del snapshot["f"]
+        fork = snapshot.fork()
+        fork.reparent("f", "e")
+        self.assertEqual(fork.child_keys("e"), ["f"])
+        self.assertEqual(snapshot.child_keys("e"), [])
+
+    def test_from_edges(self):
+        edges = ((k, v.get("parent"), {"x": 1} if k == "c" else None)
+                 for k, v in self.tree_data.items())
+        tree = FlatTree.from_edges(edges, validate=True)
+        self.assertEqual(tree["c"], {"parent": "a", "x": 1})
+        self.assertEqual(tree.child_keys("a"), self.flat_tree.child_keys("a"))
+        self.assertEqual(tree.child_keys("c"), ["f"])
+        self.assertEqual(tree.root_key, "a")
+        self.assertEqual(FlatTree.from_edges([("a", ""), ("b", "a")]),
+                         {"a": {"parent": None}, "b": {"parent": "a"}})
+
+    def test_from_edges_duplicates(self):
+        edges = [("a", None), ("b", "a"), ("c", "a"), ("b", "c")]
+        tree = FlatTree.from_edges(edges)
+        self.assertEqual(tree.child_keys("a"), ["c"])
+        self.assertEqual(tree.child_keys("c"), ["b"])
+        with self.assertRaises(ValueError):
+            FlatTree.from_edges(edges, validate=True)
+        with self.assertRaises(ValueError):
+            FlatTree.from_edges([("a", "b"), ("b", "a"), ("c", None)],
+                                validate=True)
+
+    def test_from_records(self):
+        records = [
+            {"id": "r", "up": "", "size": "10"},
+            {"id": "s", "up": "r", "size": "20"},
+            {"id": "t", "up": "r"},
+        ]
+        tree = FlatTree.from_records(iter(records), key="id", parent="up",
+                                     validate=True)
+        self.assertEqual(tree["r"], {"parent": None, "size": "10"})
+        self.assertEqual(tree["s"], {"parent": "r", "size": "20"})
+        self.assertEqual(tree.child_keys("r"), ["s", "t"])
+        with self.assertRaises(KeyError):
+            FlatTree.from_records([{"parent": None}])
+
+    def test_reparent_many(self):
+        self.flat_tree.reparent_many({"f": "b", "d": "c", "e": "b"})
+        self.assertEqual(self.flat_tree.child_keys("b"), ["f", "e"])
+        self.assertEqual(self.flat_tree.child_keys("c"), ["d"])
+        self.assertEqual(self.flat_tree["d"]["parent"], "c")
+        FlatTree.check_valid(self.flat_tree)
+        self.flat_tree.reparent_many({"b": None, "c": FlatTree.DETACHED_KEY})
+        self.assertEqual(self.flat_tree.root_keys, ["a", "b"])
+        self.assertEqual(self.flat_tree.child_keys("a"), [])
+
+    def test_reparent_many_errors(self):
+        before = copy.deepcopy(self.flat_tree)
+        with self.assertRaises(ValueError):
+            self.flat_tree.reparent_many({"b": "f", "c": "d"})
+        with self.assertRaises(ValueError):
+            self.flat_tree.reparent_many({"a": "a"})
+        with self.assertRaises(KeyError):
+            self.flat_tree.reparent_many({"b": "c", "z": "a"})
+        self.assertEqual(self.flat_tree, before)
+        self.assertEqual(self.flat_tree.child_keys("a"), ["b", "c"])
+        # a cycle through nodes that are not moved
+        with self.assertRaises(ValueError):
+            self.flat_tree.reparent_many({"a": "e"})
+
+    def test_reparent_many_batch(self):
+        with self.assertRaises(RuntimeError):
+            with self.flat_tree.batch():
+                self.flat_tree.reparent_many({"d": "c", "f": "e"})
+                self.assertEqual(self.flat_tree.child_keys("c"), ["d"])
+                raise RuntimeError
+        self.assertEqual(self.flat_tree.child_keys("b"), ["d", "e"])
+        self.assertEqual(self.flat_tree.child_keys("c"), ["f"])
+
+    def test_graft(self):
+        self.flat_tree["d"]["x"] = [1]
+        key = self.flat_tree.graft("b", "f", rename="copy-")
+        self.assertEqual(key, "copy-b")
+        self.assertEqual(self.flat_tree.child_keys("f"), ["copy-b"])
+        self.assertEqual(self.flat_tree.child_keys("copy-b"), ["copy-d", "copy-e"])
+        self.assertEqual(self.flat_tree["copy-d"], {"parent": "copy-b", "x": [1]})
+        self.assertIs(self.flat_tree["copy-d"]["x"], self.flat_tree["d"]["x"])
+        self.assertEqual(self.flat_tree.child_keys("b"), ["d", "e"])
+        FlatTree.check_valid(self.flat_tree)
+
+        other = FlatTree({"r": {}})
+        key = other.graft("b", "r", source=self.flat_tree,
+                          rename={"b": "b2"}, deep=True)
+        self.assertEqual(key, "b2")
+        self.assertEqual(other.child_keys("b2"), ["d", "e"])
+        self.assertIsNot(other["d"]["x"], self.flat_tree["d"]["x"])
+        self.assertEqual(other.graft("c", None, source=self.flat_tree,
+                                     rename=str.upper), "C")
+        self.assertEqual(other.root_keys, ["r", "C"])
+
+    def test_graft_collisions(self):
+        with self.assertRaises(ValueError):
+            self.flat_tree.graft("b", "c")
+        with self.assertRaises(ValueError):
+            self.flat_tree.graft("b", "c", rename=lambda k: "x")
+        with self.assertRaises(KeyError):
+            self.flat_tree.graft("z", "c")
+        with self.assertRaises(KeyError):
+            self.flat_tree.graft("b", "z", rename="copy-")
+        self.assertEqual(len(self.flat_tree), 6)
+
 
 if __name__ == "__main__":
     unittest.main()
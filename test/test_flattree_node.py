@@ -72,6 +72,58 @@ class TestFlatTreeNode(unittest.TestCase):
         with self.assertRaises(KeyError):
             _ = self.node_a["key1"]
 
+    def test_payload_view(self):
+        self.node_b["x"] = 1
+        view = self.node_b.payload_view
+        self.assertEqual(view, {"x": 1})
+        self.assertEqual(list(view), ["x"])
+        self.assertNotIn("parent", view)
+        self.assertIsNone(view.get("parent"))
+        self.node_b["y"] = 2
+        self.assertEqual(len(view), 2)
+        self.assertEqual(len(self.node_b), 2)
+        self.assertEqual(FlatTreeNode.proxy(self.flat_tree, "z").payload_view, {})
+
+    def test_set_children(self):
+        d, e, f = (self.flat_tree.node(k) for k in "def")
+        self.node_b.children = [f, d]
+        self.assertEqual([c.name for c in self.node_b.children], ["f", "d"])
+        self.assertEqual(self.flat_tree["e"]["parent"], FlatTree.DETACHED_KEY)
+        self.assertEqual(self.node_c.children, [])
+        other = FlatTreeNode(name="x")
+        self.node_c.children = [e, other]
+        self.assertEqual([c.name for c in self.node_c.children], ["e", "x"])
+        node = FlatTreeNode(name="n", children=[d, f])
+        self.assertEqual([c.name for c in node.children], ["d", "f"])
+
+    def test_clone_and_graft(self):
+        clone = self.node_b.clone(clone_children=True)
+        self.assertIsNot(clone.tree, self.flat_tree)
+        self.assertEqual(clone.tree.root_key, "b")
+        self.assertEqual([c.name for c in clone.children], ["d", "e"])
+
+        copy_b = self.node_c.graft(self.node_b, rename="b.")
+        self.assertEqual(copy_b.name, "b.b")
+        self.assertEqual(copy_b.parent, self.node_c)
+        self.assertEqual([c.name for c in copy_b.children], ["b.d", "b.e"])
+        with self.assertRaises(ValueError):
+            self.node_c.graft(self.node_b)
+
+    def test_proxy_cache(self):
+        self.assertIsNot(self.flat_tree.node("b"), self.flat_tree.node("b"))
+        self.flat_tree.enable_proxy_cache()
+        b = self.flat_tree.node("b")
+        self.assertIs(self.flat_tree.node("b"), b)
+        self.assertIs(self.node_a.children[0], b)
+        self.assertIsNot(self.flat_tree.subtree("b"), b)
+        self.assertIs(b.children[0].parent, b)
+        self.assertEqual(len(self.flat_tree._proxies), 1)
+        del b
+        self.assertEqual(len(self.flat_tree._proxies), 0)
+        self.assertIsNone(self.flat_tree.fork()._proxies)
+        self.flat_tree.disable_proxy_cache()
+        self.assertIsNot(self.flat_tree.node("b"), self.flat_tree.node("b"))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,3 +1,4 @@
+import json
 import unittest
 
 from AlgoTree.flattree import FlatTree
@@ -18,6 +19,7 @@ from AlgoTree.utils import (
     is_sibling,
     leaves,
     map,
+    node_stats,
     siblings,
     visit,
     size
@@ -254,6 +256,14 @@ class TestTreeUtils(unittest.TestCase):
         self.assertEqual(size(self.node9.subtree()), 1)
         self.assertEqual(size(self.node9.tree.root), len(self.nodes))
 
+    def test_node_stats(self):
+        stats = node_stats(self.node3)
+        self.assertEqual(stats["node_info"]["payload"], {"data": 3})
+        self.assertEqual(stats["subtree_info"]["size"], 7)
+        json.dumps(stats)
+        stats["node_info"]["payload"]["data"] = 30
+        self.assertEqual(self.node3["data"], 3)
+
     def test_find_node(self):
         node = find_node(self.node0, lambda n, **_: n["data"] == 7)
         self.assertEqual(node.name, "node7")
@@ -86,3 +86,22 @@ class TestFlatTreeNodeEq(unittest.TestCase):
         self.assertNotEqual(self.flat_tree.node("b"), self.flat_tree.node("e"))
         self.assertNotEqual(self.flat_tree.node("d"), self.flat_tree.node("e"))
         self.assertEqual(self.flat_tree.subtree("b").node("d"), self.root_b_node_d)
+
+    def test_identity_eq_and_hash(self):
+        copied = FlatTree(self.tree_data)
+        self.assertNotEqual(copied.node("d"), self.flat_tree.node("d"))
+        self.assertTrue(copied.node("d").structurally_equal(self.flat_tree.node("d")))
+        self.assertFalse(copied.node("d").structurally_equal(self.root_b_node_d))
+
+        nodes = {self.flat_tree.node("d"), self.flat_tree.node("d"),
+                 self.root_b_node_d, copied.node("d")}
+        self.assertEqual(len(nodes), 3)
+        self.assertIn(self.flat_tree.subtree("b").node("d"), nodes)
+
+        FlatTreeNode.structural_eq = True
+        try:
+            self.assertEqual(copied.node("d"), self.flat_tree.node("d"))
+            self.assertEqual(len(nodes), 3)
+            self.assertEqual(len(set(list(nodes))), 2)
+        finally:
+            FlatTreeNode.structural_eq = False
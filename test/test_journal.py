@@ -0,0 +1,111 @@
+import copy
+import unittest
+
+from AlgoTree.flattree import FlatTree
+from AlgoTree.journal import Change, Journal
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.tree = FlatTree({
+            "a": {"parent": None},
+            "b": {"parent": "a", "x": 1},
+            "c": {"parent": "a"},
+        })
+        self.journal = self.tree.enable_journal()
+        self.seen = []
+        self.journal.subscribe(self.seen.append)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(FlatTree().journal)
+        self.assertIs(self.tree.enable_journal(), self.journal)
+        self.tree.disable_journal()
+        self.tree["d"] = {}
+        self.assertIsNone(self.tree.journal)
+        self.assertEqual(len(self.journal), 0)
+
+    def test_changes(self):
+        self.tree["d"] = {"parent": "c"}
+        self.tree.node("b")["x"] = 2
+        del self.tree.node("b")["x"]
+        self.tree.reparent("d", "b")
+        self.tree.reparent("d", "b")
+        self.tree.node("c").payload = {"y": 3}
+        self.tree.prune("d")
+        self.assertEqual(
+            [(c.seq, c.op, c.key, c.field, c.old, c.new) for c in self.journal],
+            [(1, "insert", "d", None, None, {"parent": "c"}),
+             (2, "set", "b", "x", 1, 2),
+             (3, "unset", "b", "x", 2, None),
+             (4, "reparent", "d", "parent", "c", "b"),
+             (5, "replace", "c", None, {"parent": "a"}, {"parent": "a", "y": 3}),
+             (6, "delete", "d", None, {"parent": "b"}, None)])
+        self.assertEqual(self.seen, list(self.journal))
+        self.assertIsInstance(self.seen[0], Change)
+
+    def test_old_payloads_are_copies(self):
+        b = self.tree["b"]
+        self.tree["b"] = {"parent": "a", "x": 2}
+        b["x"] = 3
+        c = self.tree.pop("c")
+        c["y"] = 4
+        self.tree._load([("b", {"parent": "a"})], validate=False)
+        self.tree["b"]["x"] = 5
+        self.assertEqual(
+            [(c.op, c.old) for c in self.journal],
+            [("replace", {"parent": "a", "x": 1}),
+             ("delete", {"parent": "a"}),
+             ("replace", {"parent": "a", "x": 2})])
+
+    def test_load(self):
+        self.tree._load([("d", {"parent": "a"}), ("b", {"parent": "c"})],
+                        validate=False)
+        self.assertEqual(
+            [(c.op, c.key, c.old, c.new) for c in self.journal],
+            [("insert", "d", None, {"parent": "a"}),
+             ("replace", "b", {"parent": "a", "x": 1}, {"parent": "c"})])
+        self.assertEqual(self.tree.child_keys("c"), ["b"])
+
+    def test_since(self):
+        for i in range(5):
+            self.tree[f"n{i}"] = {"parent": "a"}
+        self.assertEqual([c.key for c in self.journal.since(3)], ["n3", "n4"])
+        self.assertEqual(len(self.journal.since(0)), 5)
+        self.assertEqual(self.journal.since(5), [])
+
+        bounded = Journal(maxlen=2)
+        tree = FlatTree()
+        tree._journal = bounded
+        for i in range(5):
+            tree[f"n{i}"] = {}
+        self.assertEqual([c.seq for c in bounded.since(3)], [4, 5])
+        with self.assertRaises(ValueError):
+            bounded.since(2)
+
+    def test_batch(self):
+        with self.tree.batch():
+            self.tree.reparent("c", "b")
+            self.tree["d"] = {"parent": "c"}
+            self.assertEqual(self.seen, [])
+        self.assertEqual([c.op for c in self.seen], ["reparent", "insert"])
+
+        with self.assertRaises(RuntimeError):
+            with self.tree.batch():
+                self.tree.reparent("d", "a")
+                raise RuntimeError
+        self.assertEqual(len(self.journal), 2)
+        self.assertEqual(self.journal.seq, 2)
+
+    def test_copies_do_not_share_journal(self):
+        self.assertIsNone(self.tree.fork().journal)
+        self.assertIsNone(copy.deepcopy(self.tree).journal)
+
+    def test_unsubscribe(self):
+        self.journal.unsubscribe(self.seen.append)
+        self.tree["d"] = {}
+        self.assertEqual(self.seen, [])
+        self.assertEqual(len(self.journal), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
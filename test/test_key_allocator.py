@@ -0,0 +1,86 @@
+import unittest
+
+from AlgoTree.compact_flattree import CompactFlatTree
+from AlgoTree.flattree import FlatTree
+from AlgoTree.flattree_node import FlatTreeNode
+from AlgoTree.key_allocator import CounterKeys, PrefixKeys, UuidKeys
+from AlgoTree.tree_converter import TreeConverter
+from AlgoTree.utils import paths_to_tree
+
+
+class TestKeyAllocator(unittest.TestCase):
+    def test_uuid_keys(self):
+        keys = UuidKeys()
+        self.assertEqual(len(keys()), 36)
+        self.assertNotEqual(keys(), keys())
+
+    def test_counter_keys(self):
+        keys = CounterKeys()
+        tree = FlatTree({"1": {}, "3": {}})
+        self.assertEqual([keys(tree) for _ in range(3)], ["0", "2", "4"])
+        self.assertEqual(keys(FlatTree()), "0")
+        self.assertEqual([keys() for _ in range(17)][-1], "10")
+        self.assertEqual(CounterKeys("n")(tree), "n5")
+
+    def test_prefix_keys(self):
+        keys = PrefixKeys("x")
+        tree = FlatTree({"x1": {}})
+        self.assertEqual([keys(tree) for _ in range(2)], ["x0", "x2"])
+        self.assertEqual(keys(FlatTree()), "x3")
+
+    def test_tree_allocator(self):
+        tree = FlatTree({"r": {}})
+        tree.key_allocator = CounterKeys()
+        root = tree.node("r")
+        self.assertEqual([root.add_child().name for _ in range(2)], ["0", "1"])
+        self.assertEqual(len(FlatTreeNode().name), 36)
+
+        compact = CompactFlatTree({"r": {}})
+        compact.key_allocator = PrefixKeys("c")
+        self.assertEqual(compact.node("r").add_child().name, "c0")
+
+    def test_converter_and_paths(self):
+        allocator = TreeConverter.key_allocator
+        TreeConverter.key_allocator = PrefixKeys("k")
+        try:
+            self.assertEqual(TreeConverter.default_node_name(object()), "k0")
+        finally:
+            TreeConverter.key_allocator = allocator
+
+        # anonymous nodes copied into a tree get keys that are not in it
+        class Anonymous:
+            def __init__(self, *children):
+                self.children = list(children)
+                self.payload = {}
+
+        tree = FlatTree({"r": {}, "0": {"parent": "r"}})
+        TreeConverter.key_allocator = CounterKeys()
+        try:
+            TreeConverter.copy_under(Anonymous(Anonymous()), tree.node("r"))
+        finally:
+            TreeConverter.key_allocator = allocator
+        self.assertEqual(sorted(tree), ["0", "1", "2", "r"])
+        self.assertEqual(tree["2"]["parent"], "1")
+
+        root = paths_to_tree([["A", "B"], ["A", "C", "B"]], FlatTreeNode,
+                             key_allocator=PrefixKeys("dup-"))
+        self.assertEqual(sorted(root.tree), ["A", "B", "C", "dup-0"])
+        root = paths_to_tree([["A", "B"], ["A", "C", "B"]], FlatTreeNode)
+        self.assertEqual(sorted(root.tree), ["A", "B", "B_0", "C"])
+        with self.assertRaises(ValueError):
+            paths_to_tree([["A", "B"], ["A", "C", "B"]], FlatTreeNode,
+                          max_tries=0)
+
+    def test_paths_to_tree_names(self):
+        # nodes keep their own names; a suffix is only added to a name that
+        # is already taken (not "A_0", "B_0", ... for every node)
+        root = paths_to_tree([["A", "B", "D"], ["A", "C"]], FlatTreeNode)
+        self.assertEqual(sorted(root.tree), ["A", "B", "C", "D"])
+        root = paths_to_tree([["A", "B"], ["A", "C", "B"], ["A", "D", "B"]],
+                             FlatTreeNode)
+        self.assertEqual(sorted(root.tree), ["A", "B", "B_0", "B_1", "C", "D"])
+        self.assertEqual(root.tree["B_1"]["parent"], "D")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import struct
+import sys
+import tempfile
+import unittest
+
+from AlgoTree import mmap_flattree
+from AlgoTree.flattree import FlatTree
+from AlgoTree.mmap_flattree import MmapFlatTree
+from AlgoTree.tree_index import AncestorIndex, IntervalIndex
+from AlgoTree.treenode import TreeNode
+from AlgoTree.utils import batch_lca, depth, descendants, lca, leaves
+
+
+class TestMmapFlatTree(unittest.TestCase):
+    def setUp(self):
+        self.flat_tree = FlatTree({
+            "a": {"parent": None, "value": 1},
+            "b": {"parent": "a", "value": 2},
+            "c": {"parent": "a"},
+            "d": {"parent": "b", "tags": ["x", "y"]},
+            "e": {"parent": "b"},
+            "f": {"parent": "c"},
+        })
+        fd, self.path = tempfile.mkstemp(suffix=".tree")
+        os.close(fd)
+        MmapFlatTree.write(self.path, self.flat_tree)
+        self.tree = MmapFlatTree(self.path)
+
+    def tearDown(self):
+        self.tree.close()
+        os.remove(self.path)
+
+    def test_round_trip_flattree(self):
+        self.assertEqual(len(self.tree), 6)
+        self.assertEqual(self.tree["d"], {"parent": "b", "tags": ["x", "y"]})
+        self.assertEqual(self.tree.to_flattree(), self.flat_tree)
+        self.assertIn("e", self.tree)
+        self.assertNotIn("z", self.tree)
+        with self.assertRaises(KeyError):
+            self.tree["z"]
+
+    def test_round_trip_treenode(self):
+        root = TreeNode(name="r", value=0)
+        x = TreeNode(name="x", parent=root, value=1)
+        TreeNode(name="y", parent=x, value=2)
+        TreeNode(name="z", parent=root)
+        MmapFlatTree.write(self.path + ".2", root)
+        try:
+            with MmapFlatTree(self.path + ".2") as tree:
+                self.assertEqual(tree.child_keys("r"), ["x", "z"])
+                self.assertEqual(tree.to_treenode(), root)
+        finally:
+            os.remove(self.path + ".2")
+
+    def test_payload_named_name(self):
+        self.flat_tree.node("e")["name"] = "payload name"
+        MmapFlatTree.write(self.path + ".2", self.flat_tree)
+        try:
+            with MmapFlatTree(self.path + ".2") as tree:
+                root = tree.to_treenode()
+                e = root.node("e")
+                self.assertEqual(e.payload, {"name": "payload name"})
+                self.assertIs(e.parent, root.node("b"))
+        finally:
+            os.remove(self.path + ".2")
+
+    def test_byte_order(self):
+        # the byte-swapping path of big-endian machines round-trips
+        with open(self.path, "rb") as f:
+            native = f.read()
+        mmap_flattree._SWAP = True
+        try:
+            MmapFlatTree.write(self.path + ".2", self.flat_tree)
+            with open(self.path + ".2", "rb") as f:
+                swapped = f.read()
+            with MmapFlatTree(self.path + ".2") as tree:
+                self.assertEqual(tree.to_flattree(), self.flat_tree)
+                self.assertEqual(tree.child_keys("b"), ["d", "e"])
+        finally:
+            mmap_flattree._SWAP = sys.byteorder != "little"
+            os.remove(self.path + ".2")
+        # the parent section starts with the parents of "a" (none) and "b"
+        offset = MmapFlatTree._HEADER.unpack_from(native)[4]
+        self.assertEqual(struct.unpack_from("<2q", native, offset), (-1, 0))
+        if sys.byteorder == "little":
+            self.assertNotEqual(native, swapped)
+
+    def test_payload_attributes(self):
+        d = self.tree.node("d")
+        self.assertEqual(d.tags, ["x", "y"])
+        self.assertIsNone(d.missing)
+        self.assertEqual(d.name, "d")
+
+    def test_navigation(self):
+        self.assertEqual(self.tree.root_key, "a")
+        self.assertEqual(self.tree.child_keys("a"), ["b", "c"])
+        self.assertEqual(self.tree.child_keys("f"), [])
+        d = self.tree.node("d")
+        self.assertEqual(d.parent.name, "b")
+        self.assertEqual(d.root.name, "a")
+        self.assertEqual(d["tags"], ["x", "y"])
+        self.assertEqual(self.tree.subtree("b").parent, None)
+        self.assertEqual(depth(d), 2)
+        self.assertEqual(lca(d, self.tree.node("f")).name, "a")
+        self.assertCountEqual([n.name for n in leaves(self.tree.root)],
+                              ["d", "e", "f"])
+        self.assertCountEqual([n.name for n in descendants(self.tree.node("b"))],
+                              ["d", "e"])
+
+    def test_indexes(self):
+        # proxies are created on every access, so they are keyed by name
+        index = IntervalIndex(self.tree.root)
+        self.assertTrue(index.is_ancestor(self.tree.node("a"), self.tree.node("d")))
+        self.assertFalse(index.is_ancestor(self.tree.node("c"), self.tree.node("d")))
+        self.assertEqual(AncestorIndex(self.tree.root).lca(
+            self.tree.node("e"), self.tree.node("d")).name, "b")
+        self.assertEqual([n.name for n in batch_lca([
+            (self.tree.node("c"), self.tree.node("d")),
+            (self.tree.node("f"), self.tree.node("c"))])], ["a", "c"])
+
+    def test_detached(self):
+        self.flat_tree.detach("c")
+        MmapFlatTree.write(self.path + ".2", self.flat_tree)
+        try:
+            with MmapFlatTree(self.path + ".2") as tree:
+                self.assertEqual(len(tree), 6)
+                self.assertEqual(tree["c"]["parent"], FlatTree.DETACHED_KEY)
+                self.assertEqual(tree.child_keys(FlatTree.DETACHED_KEY), ["c"])
+                self.assertNotIn(FlatTree.DETACHED_KEY, tree)
+                self.assertEqual(tree.to_flattree(), self.flat_tree)
+        finally:
+            os.remove(self.path + ".2")
+
+    def test_cycle(self):
+        tree = FlatTree({"a": {"parent": "b"}, "b": {"parent": "a"},
+                         "c": {"parent": None}})
+        with self.assertRaises(ValueError):
+            MmapFlatTree.write(self.path + ".2", tree)
+
+    def test_not_a_tree_file(self):
+        with open(self.path + ".bad", "wb") as f:
+            f.write(bytes(128))
+        try:
+            with self.assertRaises(ValueError):
+                MmapFlatTree(self.path + ".bad")
+        finally:
+            os.remove(self.path + ".bad")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -70,5 +70,37 @@ class TestNodeHash(unittest.TestCase):
 
         #self.assertEqual(NodeHash.path_hash(self.tree_node_a), NodeHash.path_hash(self.node_a))
 
+    def test_cached_treenode_hash(self):
+        calls = []
+
+        def counting_hash(node):
+            calls.append(node)
+            return NodeHash.node_hash(node)
+
+        node = TreeNode(name="a", hash_fn=counting_hash, x=1)
+        h = hash(node)
+        self.assertEqual(hash(node), h)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(h, NodeHash.node_hash(TreeNode(name="a", x=1)))
+
+        for modify in (lambda: node.__setitem__("x", 2),
+                       lambda: node.update(y=3),
+                       lambda: node.pop("y"),
+                       lambda: node.setdefault("z", 4),
+                       lambda: node.__delitem__("z"),
+                       lambda: setattr(node, "payload", {"x": 5}),
+                       lambda: setattr(node, "name", "b")):
+            before = hash(node)
+            modify()
+            self.assertNotEqual(hash(node), before)
+        self.assertEqual(hash(node), NodeHash.node_hash(TreeNode(name="b", x=5)))
+
+    def test_unnamed_treenode_hash(self):
+        node = TreeNode(x=1)
+        self.assertEqual(node.name, hash(node))
+        self.assertEqual(node.name, TreeNode(x=1).name)
+        node["x"] = 2
+        self.assertNotEqual(node.name, TreeNode(x=1).name)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import unittest
+
+from AlgoTree.flattree import FlatTree
+from AlgoTree.flattree_node import FlatTreeNode
+from AlgoTree.pretty_tree import pretty_tree
+from AlgoTree.sqlite_flattree import SqliteFlatTree
+from AlgoTree.utils import depth, descendants, lca, leaves, size
+
+
+class TestSqliteFlatTree(unittest.TestCase):
+    def setUp(self):
+        """
+        Create a sample tree for testing::
+
+          a
+          ├── b
+          │   ├── d
+          │   └── e
+          └── c
+              └── f
+        """
+        self.data = {
+            "a": {"parent": None, "value": 1},
+            "b": {"parent": "a", "value": 2},
+            "c": {"parent": "a"},
+            "d": {"parent": "b", "tags": ["x", "y"]},
+            "e": {"parent": "b"},
+            "f": {"parent": "c"},
+        }
+        self.tree = SqliteFlatTree(":memory:", self.data)
+
+    def tearDown(self):
+        self.tree.close()
+
+    def test_mapping(self):
+        self.assertEqual(len(self.tree), 6)
+        self.assertEqual(list(self.tree), ["a", "b", "c", "d", "e", "f"])
+        self.assertEqual(self.tree["d"], {"parent": "b", "tags": ["x", "y"]})
+        self.assertEqual(self.tree, self.data)
+        self.assertEqual(self.tree.to_flattree(), FlatTree(self.data))
+        self.assertNotIn("z", self.tree)
+        with self.assertRaises(KeyError):
+            self.tree["z"]
+        with self.assertRaises(ValueError):
+            self.tree["z"] = "invalid"
+
+    def test_write_through(self):
+        self.tree["b"]["value"] = 3
+        self.assertEqual(self.tree["b"]["value"], 3)
+        self.tree["f"]["parent"] = "b"
+        self.assertEqual(self.tree.child_keys("b"), ["d", "e", "f"])
+        self.assertEqual(self.tree.child_keys("c"), [])
+
+    def test_child_and_descendant_keys(self):
+        self.assertEqual(self.tree.child_keys("a"), ["b", "c"])
+        self.assertEqual(self.tree.descendant_keys("a"), ["b", "c", "d", "e", "f"])
+        self.assertEqual(self.tree.subtree_size("b"), 3)
+        self.assertEqual(self.tree.descendant_keys("a", order="pre"),
+                         ["b", "d", "e", "c", "f"])
+        with self.assertRaises(KeyError):
+            self.tree.child_keys("z")
+        with self.assertRaises(ValueError):
+            self.tree.descendant_keys("a", order="post")
+
+    def test_descendants_query(self):
+        statements = []
+        self.tree._conn.set_trace_callback(statements.append)
+        root = self.tree.root
+        del statements[:]
+        self.assertEqual([n.name for n in descendants(root)],
+                         [n.name for n in descendants(FlatTree(self.data).root)])
+        self.assertEqual(size(root.node("b")), 3)
+        self.assertEqual(size(self.tree.node(FlatTree.DETACHED_KEY)), 1)
+        # one recursive query each, instead of one per node
+        self.assertEqual(sum("WITH RECURSIVE" in s for s in statements), 3)
+        self.assertFalse([s for s in statements if "parent = ? ORDER BY ord" in s])
+        # a cycle (not reachable from the root) still terminates
+        self.tree["b"]["parent"] = "e"
+        self.assertEqual(self.tree.descendant_keys("b", order="pre"), ["d", "e"])
+
+    def test_clone_and_graft(self):
+        source = FlatTree({"x": {"v": [1]}, "y": {"parent": "x"}})
+        copy = source.node("x").clone(parent=self.tree.node("f"),
+                                      clone_children=True)
+        self.assertEqual(self.tree.child_keys("f"), ["x"])
+        self.assertEqual(self.tree["y"]["parent"], "x")
+        self.assertEqual(copy["v"], [1])
+        b2 = self.tree.node("c").graft(self.tree.node("b"), rename="new-")
+        self.assertEqual(b2.name, "new-b")
+        self.assertEqual(self.tree.descendant_keys("new-b", order="pre"),
+                         ["new-d", "new-e"])
+        self.assertEqual(self.tree["new-d"]["tags"], ["x", "y"])
+        flat = self.tree.node("b").clone(clone_children=True)
+        self.assertEqual(sorted(flat.tree), ["b", "d", "e"])
+        with self.assertRaises(ValueError):
+            self.tree.node("c").graft(self.tree.node("b"))
+        self.assertEqual(len(self.tree), 11)
+        FlatTree.check_valid(self.tree)
+
+    def test_journal(self):
+        self.assertFalse(hasattr(self.tree, "enable_journal"))
+        self.assertFalse(hasattr(self.tree, "journal"))
+
+    def test_flattree_node(self):
+        root = self.tree.root
+        self.assertIsInstance(root, FlatTreeNode)
+        g = root.node("e").add_child(name="g", value=7)
+        self.assertEqual(self.tree["g"], {"parent": "e", "value": 7})
+        g["value"] = 8
+        self.assertEqual(self.tree["g"]["value"], 8)
+        g.parent = root.node("c")
+        self.assertEqual(self.tree.child_keys("c"), ["f", "g"])
+        self.assertEqual(depth(g), 2)
+        self.assertEqual(size(root), 7)
+        self.assertEqual(lca(root.node("d"), g).name, "a")
+        self.assertCountEqual([n.name for n in leaves(root)], ["d", "e", "f", "g"])
+        self.assertCountEqual([n.name for n in descendants(root.node("c"))],
+                              ["f", "g"])
+        self.assertEqual(pretty_tree(root), pretty_tree(
+            FlatTree(self.tree.to_dict()).root))
+
+    def test_detach_and_prune(self):
+        self.tree.detach("c")
+        self.assertEqual(self.tree["c"]["parent"], FlatTree.DETACHED_KEY)
+        self.assertEqual(self.tree.child_keys(FlatTree.DETACHED_KEY), ["c"])
+        self.assertEqual(self.tree.prune("b"), ["e", "d", "b"])
+        self.assertEqual(list(self.tree), ["a", "c", "f"])
+
+    def test_reparent_many(self):
+        self.tree.reparent_many({"f": "b", "d": "c"})
+        self.assertEqual(self.tree.child_keys("b"), ["e", "f"])
+        self.assertEqual(self.tree.child_keys("c"), ["d"])
+        with self.assertRaises(ValueError):
+            self.tree.reparent_many({"e": "a", "b": "f"})
+        self.assertEqual(self.tree["e"]["parent"], "b")
+
+    def test_batch_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with self.tree.batch():
+                self.tree.reparent("b", "f")
+                del self.tree["e"]
+                raise RuntimeError
+        self.assertEqual(self.tree, self.data)
+        with self.assertRaises(ValueError):
+            with self.tree.batch(validate=True):
+                self.tree.reparent("a", "d")
+        self.assertEqual(self.tree, self.data)
+        FlatTree.check_valid(self.tree)
+
+    def test_persistence(self):
+        fd, path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        try:
+            with SqliteFlatTree(path, self.data) as tree:
+                tree.root.add_child(name="g")
+            with SqliteFlatTree(path) as tree:
+                self.assertEqual(tree.child_keys("a"), ["b", "c", "g"])
+                tree.reparent("b", "g")
+                self.assertEqual(tree.child_keys("a"), ["c", "g"])
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
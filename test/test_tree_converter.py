@@ -133,6 +133,15 @@ class TestTreeConverter(unittest.TestCase):
         # logging.debug(json.dumps(tree_dict, indent=2))
         self.verify_tree_structure(tree_dict)
 
+    def test_default_extract(self):
+        payload = TreeConverter.default_extract(self.child1)
+        self.assertEqual(payload, {"value": "child1_value"})
+        payload["value"] = "changed"
+        self.assertEqual(self.child1["value"], "child1_value")
+        flat = FlatTreeNode(name="a", value=1)
+        self.assertEqual(TreeConverter.default_extract(flat), {"value": 1})
+        self.assertIs(type(TreeConverter.default_extract(flat)), dict)
+
     def test_copy_under(self):
         # Test copying a subtree under another node
         new_root = TreeNode(name="new_root", value="new_root_value")
@@ -142,6 +151,17 @@ class TestTreeConverter(unittest.TestCase):
         tree_dict = TreeConverter.to_dict(root)
         self.verify_tree_structure(tree_dict)
 
+    def test_copy_under_payloads(self):
+        # payloads are read through their views and deep copied once
+        source = TreeNode(name="s", tags=["x"])
+        new_root = TreeNode(name="new_root")
+        TreeConverter.copy_under(source, new_root)
+        copied = new_root.children[0]
+        self.assertIs(type(copied.payload), dict)
+        self.assertEqual(copied.payload, {"tags": ["x"]})
+        copied["tags"].append("y")
+        self.assertEqual(source["tags"], ["x"])
+
     def test_convert_to_treenode(self):
         # Test converting TreeNode to TreeNode (identity transformation)
         new_tree = TreeConverter.convert(self.root, TreeNode)
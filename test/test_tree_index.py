@@ -0,0 +1,197 @@
+import unittest
+
+from AlgoTree.flattree import FlatTree
+from AlgoTree.tree_index import AncestorIndex, IntervalIndex
+from AlgoTree.treenode import TreeNode
+from AlgoTree.utils import (
+    depth,
+    distance,
+    is_ancestor,
+    is_descendant,
+    lca,
+    size,
+    subtree_rooted_at,
+)
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def setUp(self):
+        self.tree = FlatTree({
+            "a": {"parent": None},
+            "b": {"parent": "a"},
+            "c": {"parent": "a"},
+            "d": {"parent": "b"},
+            "e": {"parent": "b"},
+            "f": {"parent": "c"},
+            "g": {"parent": "f"},
+        })
+        self.index = IntervalIndex(self.tree.root)
+
+    def node(self, name):
+        return self.tree.node(name)
+
+    def test_ancestor_descendant(self):
+        self.assertTrue(self.index.is_ancestor(self.node("a"), self.node("g")))
+        self.assertTrue(self.index.is_ancestor(self.node("b"), self.node("e")))
+        self.assertFalse(self.index.is_ancestor(self.node("b"), self.node("f")))
+        self.assertFalse(self.index.is_ancestor(self.node("b"), self.node("b")))
+        self.assertTrue(self.index.is_descendant(self.node("g"), self.node("c")))
+        self.assertFalse(self.index.is_descendant(self.node("a"), self.node("c")))
+        self.assertTrue(self.index.in_subtree(self.node("b"), self.node("b")))
+
+        self.assertTrue(is_ancestor(self.node("c"), self.node("g"),
+                                    index=self.index))
+        self.assertFalse(is_descendant(self.node("c"), self.node("g"),
+                                       index=self.index))
+
+    def test_size_and_depth(self):
+        self.assertEqual(len(self.index), 7)
+        self.assertEqual(self.index.size(self.node("a")), 7)
+        self.assertEqual(self.index.size(self.node("b")), 3)
+        self.assertEqual(size(self.node("c"), index=self.index), 3)
+        self.assertEqual(self.index.depth(self.node("g")), 3)
+        self.assertEqual([n.name for n in self.index.descendants(self.node("b"))],
+                         ["d", "e"])
+
+    def test_rebuilds_after_structural_change(self):
+        self.tree.reparent("f", "d")
+        self.assertTrue(self.index.is_ancestor(self.node("b"), self.node("g")))
+        self.assertEqual(self.index.size(self.node("c")), 1)
+
+        self.tree["h"] = {"parent": "g"}
+        self.assertEqual(self.index.depth(self.node("h")), 5)
+
+    def test_unknown_node(self):
+        with self.assertRaises(KeyError):
+            self.index.size(FlatTree({"x": {}}).root)
+
+    def test_treenode(self):
+        root = TreeNode(name="a")
+        b = root.add_child(name="b")
+        c = b.add_child(name="c")
+        d = root.add_child(name="d")
+        index = IntervalIndex(root)
+        self.assertTrue(index.is_ancestor(root, c))
+        self.assertTrue(index.is_descendant(c, b))
+        self.assertFalse(index.is_descendant(d, b))
+        self.assertEqual(index.size(b), 2)
+
+        e = d.add_child(name="e")
+        self.assertTrue(index.is_ancestor(d, e))
+
+    def test_treenode_version_per_tree(self):
+        root = TreeNode(name="a")
+        b = root.add_child(name="b")
+        index = IntervalIndex(root)
+        version = root.structure_version
+        builds = []
+        build = index._build
+        index._build = lambda: (builds.append(1), build())
+
+        other = TreeNode(name="x")
+        other.add_child(name="y")
+        TreeNode(name="z", parent=None)
+        self.assertEqual(root.structure_version, version)
+        self.assertEqual(index.size(root), 2)
+        self.assertEqual(builds, [])
+
+        # moving a node between trees changes the versions of both
+        other_version = other.structure_version
+        other.children[0].parent = b
+        self.assertNotEqual(other.structure_version, other_version)
+        self.assertEqual(index.size(root), 3)
+        self.assertEqual(builds, [1])
+        self.assertEqual(b.structure_version, root.structure_version)
+
+    def test_treenode_version_clock(self):
+        root = TreeNode(name="a")
+        node = root
+        for i in range(100):
+            node = node.add_child(name=str(i))
+        # every node of the tree reads the same version
+        self.assertEqual(node.structure_version, root.structure_version)
+        version = root.structure_version
+        other = TreeNode(name="x")
+        other.add_child(name="y")
+        self.assertEqual(root.structure_version, version)
+
+        # detaching and re-attaching changes the version of the tree
+        sub = root.children[0].children[0]
+        sub.parent = None
+        self.assertNotEqual(root.structure_version, version)
+        version = root.structure_version
+        other.parent = root.children[0]
+        self.assertNotEqual(root.structure_version, version)
+        self.assertEqual(other.children[0].structure_version,
+                         root.structure_version)
+        with self.assertRaises(ValueError):
+            root.parent = other.children[0]
+        with self.assertRaises(ValueError):
+            other.parent = other
+
+    def test_subtree_rooted_at(self):
+        sub = subtree_rooted_at(self.node("c"), 1, index=self.index)
+        self.assertEqual(sub.name, "c")
+        self.assertEqual([n.name for n in sub.children], ["f"])
+        self.assertEqual(sub.node("f").children, [])
+
+
+class TestAncestorIndex(unittest.TestCase):
+    def setUp(self):
+        # a chain a0 - a1 - ... - a20 with a branch b1 - b2 under a10
+        data = {"a0": {"parent": None}}
+        for i in range(1, 21):
+            data[f"a{i}"] = {"parent": f"a{i - 1}"}
+        data["b1"] = {"parent": "a10"}
+        data["b2"] = {"parent": "b1"}
+        self.tree = FlatTree(data)
+        self.index = AncestorIndex(self.tree.root)
+
+    def node(self, name):
+        return self.tree.node(name)
+
+    def test_depth(self):
+        self.assertEqual(self.index.depth(self.node("a0")), 0)
+        self.assertEqual(self.index.depth(self.node("a20")), 20)
+        self.assertEqual(depth(self.node("b2"), index=self.index), 12)
+
+    def test_kth_ancestor(self):
+        self.assertEqual(self.index.kth_ancestor(self.node("a20"), 0).name, "a20")
+        self.assertEqual(self.index.kth_ancestor(self.node("a20"), 13).name, "a7")
+        self.assertEqual(self.index.kth_ancestor(self.node("b2"), 3).name, "a9")
+        self.assertEqual(self.index.kth_ancestor(self.node("b2"), 12).name, "a0")
+        self.assertIsNone(self.index.kth_ancestor(self.node("b2"), 13))
+
+    def test_lca_and_distance(self):
+        self.assertEqual(self.index.lca(self.node("a20"), self.node("b2")).name, "a10")
+        self.assertEqual(self.index.lca(self.node("a3"), self.node("a17")).name, "a3")
+        self.assertEqual(self.index.lca(self.node("b1"), self.node("b1")).name, "b1")
+        self.assertEqual(lca(self.node("a11"), self.node("b1"),
+                             index=self.index).name, "a10")
+        self.assertEqual(self.index.distance(self.node("a20"), self.node("b2")), 12)
+        self.assertEqual(distance(self.node("a0"), self.node("a20"),
+                                  index=self.index), 20)
+        self.assertEqual(self.index.distance(self.node("a5"), self.node("a5")), 0)
+
+    def test_matches_utils(self):
+        names = ["a0", "a4", "a10", "a15", "b1", "b2"]
+        for x in names:
+            for y in names:
+                self.assertEqual(self.index.lca(self.node(x), self.node(y)).name,
+                                 lca(self.node(x), self.node(y)).name)
+                self.assertEqual(self.index.distance(self.node(x), self.node(y)),
+                                 distance(self.node(x), self.node(y)))
+
+    def test_treenode(self):
+        root = TreeNode(name="a")
+        b = root.add_child(name="b")
+        c = b.add_child(name="c")
+        d = root.add_child(name="d")
+        index = AncestorIndex(root)
+        self.assertIs(index.lca(c, d), root)
+        self.assertIs(index.kth_ancestor(c, 1), b)
+        self.assertEqual(index.distance(c, d), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
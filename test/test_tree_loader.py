@@ -0,0 +1,102 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from AlgoTree.flattree import FlatTree
+from AlgoTree.sqlite_flattree import SqliteFlatTree
+from AlgoTree.tree_loader import (iter_mapping, iter_ndjson, load_mapping,
+                                  load_ndjson)
+
+
+class TestTreeLoader(unittest.TestCase):
+    def setUp(self):
+        self.tree = FlatTree({
+            "a": {"parent": None, "value": 1},
+            "b": {"parent": "a", "value": 2.5, "name": "β-node"},
+            "c": {"parent": "a", "tags": ["x", {"y": [1, 2]}]},
+            "d": {"parent": "b", "value": 12345678},
+            "e": {"parent": "b"},
+        })
+        self.ndjson = "\n".join(
+            json.dumps({"key": k, **v}, ensure_ascii=False)
+            for k, v in self.tree.items()) + "\n\n"
+        self.mapping = json.dumps(
+            {"meta": {"mapping": 1}, "mapping": dict(self.tree), "more": [1]},
+            ensure_ascii=False, indent=2)
+
+    def test_ndjson(self):
+        for buffer_size in (1, 7, 1 << 16):
+            for f in (io.StringIO(self.ndjson),
+                      io.BytesIO(self.ndjson.encode("utf-8"))):
+                tree = load_ndjson(f, buffer_size=buffer_size, validate=True)
+                self.assertEqual(tree, self.tree)
+                self.assertEqual(tree.child_keys("b"), ["d", "e"])
+
+    def test_ndjson_progress(self):
+        calls = []
+        records = list(iter_ndjson(io.StringIO(self.ndjson), buffer_size=16,
+                                   progress=lambda n, size: calls.append((n, size))))
+        self.assertEqual(len(records), 5)
+        self.assertEqual(calls[-1][1], len(self.ndjson))
+        self.assertEqual([n for n, _ in calls], sorted(n for n, _ in calls))
+        self.assertGreater(len(calls), 5)
+
+    def test_mapping(self):
+        for buffer_size in (1, 5, 1 << 16):
+            for f in (io.StringIO(self.mapping),
+                      io.BytesIO(self.mapping.encode("utf-8"))):
+                tree = load_mapping(f, mapping_key="mapping",
+                                    buffer_size=buffer_size, validate=True)
+                self.assertEqual(tree, self.tree)
+        flat = json.dumps(dict(self.tree))
+        self.assertEqual(list(iter_mapping(io.StringIO(flat), buffer_size=3)),
+                         list(self.tree.items()))
+        self.assertEqual(list(iter_mapping(io.StringIO(" { } "))), [])
+
+    def test_mapping_errors(self):
+        with self.assertRaises(ValueError):
+            list(iter_mapping(io.StringIO(self.mapping), mapping_key="missing"))
+        with self.assertRaises(ValueError):
+            list(iter_mapping(io.StringIO('{"a": {}, "b": {}')))
+        with self.assertRaises(ValueError):
+            list(iter_mapping(io.StringIO('["a"]')))
+        # like `json.load`, data after the top-level object is an error
+        for data, mapping_key in (('{"a": {}} x', None),
+                                  ('{"m": {"a": {}}, "n": 1}}', "m"),
+                                  ('{"m": {"a": {}}, "n": [1}', "m")):
+            with self.assertRaises(ValueError):
+                list(iter_mapping(io.StringIO(data), mapping_key=mapping_key))
+        self.assertEqual(list(iter_mapping(io.StringIO('{"m": {"a": {}}, "n": 1}\n'),
+                                           mapping_key="m")), [("a", {})])
+
+    def test_truncated_character(self):
+        # the file ends with the first byte of "β"
+        data = self.ndjson.encode("utf-8") + "β".encode("utf-8")[:1]
+        for buffer_size in (1, 1 << 16):
+            with self.assertRaises(UnicodeDecodeError):
+                list(iter_ndjson(io.BytesIO(data), buffer_size=buffer_size))
+
+    def test_validate(self):
+        with self.assertRaises(ValueError):
+            load_ndjson(io.StringIO('{"key": "a"}\n{"key": "a"}\n'),
+                        validate=True)
+        with self.assertRaises(KeyError):
+            load_mapping(io.StringIO('{"a": {"parent": "z"}}'), validate=True)
+
+    def test_into_existing_tree(self):
+        fd, path = tempfile.mkstemp(suffix=".ndjson")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.ndjson)
+        try:
+            with SqliteFlatTree() as tree:
+                load_ndjson(path, tree=tree, buffer_size=8, validate=True)
+                self.assertEqual(tree, self.tree)
+                self.assertEqual(tree.child_keys("a"), ["b", "c"])
+        finally:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -57,5 +57,12 @@ class TestTreePrettyPrinter(unittest.TestCase):
         )
         self.assertEqual(out, expected_output, msg="Marked nodes are not displayed correctly")
 
+    def test_payload_details(self):
+        from AlgoTree.treenode import TreeNode
+        root = TreeNode(name="root", x=1, children=[TreeNode(name="a")])
+        printer = PrettyTree(node_details=PrettyTree.payload_details)
+        self.assertEqual(printer(root), "root ◄ {'x': 1}\n└───── a ◄ {}\n")
+        self.assertEqual(PrettyTree.payload_details(self.Node("n", payload={"y": 2})), "{'y': 2}")
+
 if __name__ == "__main__":
     unittest.main()
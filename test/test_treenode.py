@@ -1,3 +1,4 @@
+import copy
 import unittest
 
 from AlgoTree.treenode import TreeNode
@@ -45,6 +46,85 @@ class TestTreeNode(unittest.TestCase):
         self.assertEqual(root["new_data"], "new_value")
         self.assertNotIn("extra", root)
 
+    def test_move_children(self):
+        a = TreeNode(name="a")
+        b = TreeNode(name="b")
+        # equal siblings are told apart by identity
+        kids = [TreeNode(parent=a, x=i % 2) for i in range(10)]
+        for i in (0, 1, 9, 5, 2, 3):
+            kids[i].parent = b
+        self.assertEqual([k["x"] for k in b.children], [0, 1, 1, 1, 0, 1])
+        self.assertTrue(all(c is k for c, k in zip(
+            a.children, [kids[4], kids[6], kids[7], kids[8]])))
+        self.assertIs(kids[0].parent, b)
+
+        # the children list was modified directly
+        a.children.reverse()
+        kids[6].parent = None
+        self.assertTrue(all(c is k for c, k in zip(
+            a.children, [kids[8], kids[7], kids[4]])))
+        self.assertIsNone(kids[6].parent)
+
+        # children assigned through the setter
+        c = TreeNode(name="c")
+        c.children = [kids[6], {"y": 1}]
+        kids[6]._parent = c
+        kids[6].parent = a
+        self.assertEqual(len(c.children), 1)
+        self.assertIs(a.children[-1], kids[6])
+
+    def test_lazy(self):
+        data = {"__name__": "root", "x": 1, "children": [
+            {"__name__": "a", "children": [{"__name__": "a1"}]},
+            {"__name__": "b", "children": [{"__name__": "b1"}]},
+        ]}
+        root = TreeNode.lazy(data)
+        self.assertEqual(root.name, "root")
+        self.assertEqual(root.payload, {"x": 1})
+        raw = dict.__getitem__(root, "children")
+        self.assertFalse(any(isinstance(c, TreeNode) for c in raw))
+
+        a = root.children[0]
+        self.assertIsInstance(a, TreeNode)
+        self.assertIs(a.parent, root)
+        self.assertIs(root.children[0], a)
+        self.assertIs(root["children"][1].parent, root)
+        b = root.children[1]
+        self.assertNotIsInstance(dict.__getitem__(b, "children")[0], TreeNode)
+        self.assertEqual(a.children[0].name, "a1")
+        self.assertIs(a.children[0].root, root)
+
+        # the input is not modified, and the lazy tree equals an eager one
+        self.assertNotIsInstance(data["children"][0], TreeNode)
+        self.assertEqual(root, TreeNode(data))
+        self.assertEqual(root.to_dict(), data)
+
+        a.parent = None
+        self.assertEqual([c.name for c in root.children], ["b"])
+        b.children = [{"__name__": "c"}]
+        self.assertNotIsInstance(dict.__getitem__(b, "children")[0], TreeNode)
+        self.assertIs(b.children[0].parent, b)
+
+    def test_payload_view(self):
+        root = TreeNode(name="root", value=10, children=[{"value": 1}])
+        view = root.payload_view
+        self.assertEqual(view, {"value": 10})
+        self.assertEqual(len(view), 1)
+        self.assertNotIn("children", view)
+        self.assertNotIn(TreeNode.NAME_KEY, view)
+        with self.assertRaises(KeyError):
+            view["children"]
+        with self.assertRaises(TypeError):
+            view["value"] = 1
+        root["value"] = 20
+        self.assertEqual(view["value"], 20)
+        self.assertEqual(view.copy(), root.payload)
+        root["tags"] = ["x"]
+        copied = copy.deepcopy(view)
+        self.assertEqual(copied, {"value": 20, "tags": ["x"]})
+        self.assertIs(type(copied), dict)
+        self.assertIsNot(copied["tags"], root["tags"])
+
     def test_node_method(self):
         children = [
             {TreeNode.NAME_KEY: "child1", "value": 1},